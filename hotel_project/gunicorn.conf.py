@@ -0,0 +1,24 @@
+"""
+gunicorn settings, read from the working directory:
+
+    gunicorn hotel_project.wsgi --workers 4 --worker-class gthread --threads 8
+
+The application is loaded once in the master process (``preload_app``), where
+``hotel_project/wsgi.py`` warms the catalog and the rendered bodies (see ``hotels.warmup``).
+The workers are forked from the warm master and share that memory copy-on-write. Database
+connections are per thread, so every request thread of a worker connects on its first
+request and keeps the connection (``CONN_MAX_AGE``).
+"""
+
+import gc
+
+preload_app = True
+
+
+def pre_fork(server, worker):
+    # A SQLite connection must not be carried into another process.
+    from hotels.warmup import close_connections
+    close_connections()
+    # Move the warm objects out of the collected generations: collections in the workers
+    # would otherwise write to, and so copy, the shared pages.
+    gc.freeze()
@@ -1,22 +1,59 @@
-import React, { useState } from "react"; // Import React and useState hook
+import React, { useState, useEffect } from "react"; // Import React and hooks
 
-export function CitySelectPage({ cities, error, onSelectCity }) {
+// Server-side autocomplete endpoint, queried as `${CITY_SEARCH_URL}?q=<term>`
+const CITY_SEARCH_URL = "http://127.0.0.1:8000/hotels/api/cities/search";
+// Wait this long after the last keystroke before querying the server
+const SEARCH_DELAY_MS = 150;
+
+export function CitySelectPage({ error, onSelectCity }) {
   // State to store the current search term input by the user
   const [searchTerm, setSearchTerm] = useState("");
+  // State to store the cities suggested by the server for the current search term
+  const [suggestions, setSuggestions] = useState([]);
+  // State to track any errors that occur while searching
+  const [searchError, setSearchError] = useState(null);
+
+  // Query the server for suggestions each time the search term changes
+  useEffect(() => {
+    if (!searchTerm) {
+      setSuggestions([]);
+      return undefined;
+    }
+    // Abort the request of a previous keystroke so stale results never overwrite newer ones
+    const controller = new AbortController();
+    const timer = setTimeout(async () => {
+      try {
+        const response = await fetch(
+          `${CITY_SEARCH_URL}?q=${encodeURIComponent(searchTerm)}`,
+          { signal: controller.signal }
+        );
+        if (!response.ok) {
+          throw new Error("Error searching cities");
+        }
+        setSuggestions(await response.json());
+        setSearchError(null);
+      } catch (err) {
+        if (err.name !== "AbortError") {
+          console.error("Error searching cities:", err);
+          setSearchError("Failed to load cities. Please try again later.");
+        }
+      }
+    }, SEARCH_DELAY_MS);
+
+    return () => {
+      clearTimeout(timer);
+      controller.abort();
+    };
+  }, [searchTerm]);
 
   // Update state when the user types in the search input
   const handleInputChange = (e) => {
     setSearchTerm(e.target.value);
   };
 
-  // Filter the cities based on search term (case insensitive match)
-  const filteredCities = cities.filter((city) =>
-    city.name.toLowerCase().includes(searchTerm.toLowerCase())
-  );
-
   // When a city is clicked in the autocomplete list, select it via the passed callback
   const handleCityClick = (city) => {
-    onSelectCity(city.code);
+    onSelectCity(city);
     // Optionally update the search term to display the selected city's name
     setSearchTerm(city.name);
   };
@@ -25,7 +62,7 @@ export function CitySelectPage({ cities, error, onSelectCity }) {
     <div className="container">
       <h1 className="header">Select a City</h1>
       {/* Display error message if there's an error */}
-      {error && <p className="error">{error}</p>}
+      {(error || searchError) && <p className="error">{error || searchError}</p>}
       <div style={{ position: "relative" }}>
         <label htmlFor="city-search" className="label">
           Type a city name:
@@ -40,9 +77,9 @@ export function CitySelectPage({ cities, error, onSelectCity }) {
           placeholder="Search for a city..."
         />
         {/* Display autocomplete suggestions if there is a search term and at least one matching city */}
-        {searchTerm && filteredCities.length > 0 && (
+        {searchTerm && suggestions.length > 0 && (
           <ul className="autocomplete-list">
-            {filteredCities.map((city) => (
+            {suggestions.map((city) => (
               <li
                 key={city.code}
                 className="autocomplete-item"
@@ -58,4 +95,4 @@ export function CitySelectPage({ cities, error, onSelectCity }) {
   );
 }
 
-export default CitySelectPage;
\ No newline at end of file
+export default CitySelectPage;
@@ -1,5 +1,5 @@
 import React from "react";
-import { render, screen, fireEvent } from "@testing-library/react";
+import { render, screen, fireEvent, waitFor } from "@testing-library/react";
 import CitySelectPage from "../components/CitySelectPage";
 
 // Mock cities array used for testing.
@@ -9,10 +9,31 @@ const cities = [
   { code: "SF", name: "San Francisco" },
 ];
 
+// Preserve the original global.fetch to restore later
+const originalFetch = global.fetch;
+
 describe("CitySelectPage", () => {
+  beforeEach(() => {
+    // Mock global.fetch to simulate the server-side search endpoint
+    global.fetch = jest.fn((url) => {
+      const query = new URL(url).searchParams.get("q").toLowerCase();
+      return Promise.resolve({
+        ok: true,
+        json: () =>
+          Promise.resolve(cities.filter((city) => city.name.toLowerCase().includes(query))),
+      });
+    });
+  });
+
+  afterEach(() => {
+    // Restore original fetch and clear mocks
+    global.fetch = originalFetch;
+    jest.clearAllMocks();
+  });
+
   test("renders header, label and input", () => {
     // Render the CitySelectPage component with mock cities and no error.
-    render(<CitySelectPage cities={cities} error={null} onSelectCity={() => {}}/>);
+    render(<CitySelectPage error={null} onSelectCity={() => {}}/>);
 
     // Assert that the header text "Select a City" is in the document.
     expect(screen.getByText("Select a City")).toBeInTheDocument();
@@ -28,15 +49,15 @@ describe("CitySelectPage", () => {
     // Define the expected error message.
     const errorMessage = "Failed to load cities!";
     // Render the component with an error passed to the error prop.
-    render(<CitySelectPage cities={cities} error={errorMessage} onSelectCity={() => {}} />);
+    render(<CitySelectPage error={errorMessage} onSelectCity={() => {}} />);
 
     // Assert that the provided error message is visible on the screen.
     expect(screen.getByText(errorMessage)).toBeInTheDocument();
   });
 
-  test("filters cities based on search input", () => {
+  test("filters cities based on search input", async () => {
     // Render the component with the mock cities and without an error.
-    render(<CitySelectPage cities={cities} error={null} onSelectCity={() => {}} />);
+    render(<CitySelectPage error={null} onSelectCity={() => {}} />);
 
     // Select the input element by its placeholder.
     const input = screen.getByPlaceholderText("Search for a city...");
@@ -44,19 +65,25 @@ describe("CitySelectPage", () => {
     // Simulate typing "new" into the input field.
     fireEvent.change(input, { target: { value: "new" } });
 
-    // Expect the suggestion "New York City" to appear in the list.
-    expect(screen.getByText("New York City")).toBeInTheDocument();
+    // Expect the suggestion "New York City" returned by the server to appear in the list.
+    expect(await screen.findByText("New York City")).toBeInTheDocument();
+    await waitFor(() => {
+      expect(global.fetch).toHaveBeenCalledWith(
+        "http://127.0.0.1:8000/hotels/api/cities/search?q=new",
+        expect.anything()
+      );
+    });
 
     // Since the user typed "new", suggestions for "Los Angeles" and "San Francisco" should not be visible.
     expect(screen.queryByText("Los Angeles")).toBeNull();
     expect(screen.queryByText("San Francisco")).toBeNull();
   });
 
-  test("clicking on a suggestion calls onSelectCity and updates input", () => {
+  test("clicking on a suggestion calls onSelectCity and updates input", async () => {
     // Create a mock function to simulate the onSelectCity callback.
     const mockSelectCity = jest.fn();
     // Render the component with the mock onSelectCity callback.
-    render(<CitySelectPage cities={cities} error={null} onSelectCity={mockSelectCity} />);
+    render(<CitySelectPage error={null} onSelectCity={mockSelectCity} />);
 
     // Select the input element.
     const input = screen.getByPlaceholderText("Search for a city...");
@@ -65,14 +92,14 @@ describe("CitySelectPage", () => {
     fireEvent.change(input, { target: { value: "los" } });
 
     // Ensure that the suggestion for "Los Angeles" appears.
-    const suggestion = screen.getByText("Los Angeles");
+    const suggestion = await screen.findByText("Los Angeles");
     expect(suggestion).toBeInTheDocument();
 
     // Simulate a click on the "Los Angeles" suggestion.
     fireEvent.click(suggestion);
 
-    // The mock onSelectCity function should be called with the city code "LA".
-    expect(mockSelectCity).toHaveBeenCalledWith("LA");
+    // The mock onSelectCity function should be called with the selected city.
+    expect(mockSelectCity).toHaveBeenCalledWith({ code: "LA", name: "Los Angeles" });
 
     // The input field should be updated to display "Los Angeles" after the suggestion is clicked.
     expect(input.value).toBe("Los Angeles");
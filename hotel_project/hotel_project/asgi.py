@@ -8,9 +8,30 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
 """
 
 import os
+import threading
 
+from django.conf import settings
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotel_project.settings')
+# Route the read API to the native async views; set HOTELS_ASYNC_API=0 to use the sync ones.
+os.environ.setdefault('HOTELS_ASYNC_API', '1')
 
 application = get_asgi_application()
+
+# Load the catalog and render the busiest bodies before the first request (see hotels.warmup).
+# uvicorn imports the application inside its event loop, where Django refuses database
+# queries, so the warm-up runs in a thread of its own. Connections belong to a thread, so that
+# thread does not open any for the requests and closes the ones it used.
+if settings.HOTELS_WARMUP:
+    from hotels.warmup import close_connections, warm_up
+
+    def warm_up_process():
+        try:
+            warm_up(connect=False)
+        finally:
+            close_connections()
+
+    warmup = threading.Thread(target=warm_up_process, name='hotels-warmup')
+    warmup.start()
+    warmup.join()
@@ -31,6 +31,42 @@ ALLOWED_HOSTS = []
 CSV_IMPORT_USERNAME = os.environ.get("CSV_IMPORT_USERNAME", "python-demo")
 CSV_IMPORT_PASSWORD = os.environ.get("CSV_IMPORT_PASSWORD", "claw30_bumps")
 
+# Serve the read API from native async views (hotels.async_views). Enabled by asgi.py.
+HOTELS_ASYNC_API = os.environ.get("HOTELS_ASYNC_API", "0") == "1"
+
+# Opt-in profiling (hotels.profiling): cProfile a fraction of the requests, and keep the stack
+# samples of requests slower than a threshold (seconds). Both disabled by default.
+HOTELS_PROFILE_SAMPLE_RATE = float(os.environ.get("HOTELS_PROFILE_SAMPLE_RATE", 0))
+HOTELS_PROFILE_SLOW_SECONDS = (
+    float(os.environ["HOTELS_PROFILE_SLOW_SECONDS"]) if os.environ.get("HOTELS_PROFILE_SLOW_SECONDS") else None
+)
+HOTELS_PROFILE_DIR = os.environ.get("HOTELS_PROFILE_DIR", BASE_DIR / "profiles")
+HOTELS_PROFILE_KEEP = int(os.environ.get("HOTELS_PROFILE_KEEP", 200))
+
+# Warm the catalog, the rendered bodies, the routes and the connections when the WSGI/ASGI
+# application is loaded, within a time budget in seconds (see hotels.warmup).
+HOTELS_WARMUP = os.environ.get("HOTELS_WARMUP", "1") == "1"
+HOTELS_WARMUP_SECONDS = float(os.environ.get("HOTELS_WARMUP_SECONDS", 5))
+
+# Imports (import_csv and the admin uploads) write one at a time, under a lock file in
+# HOTELS_IMPORT_DIR (hotels.imports). Uploads wait at most HOTELS_IMPORT_WAIT_SECONDS for it,
+# and uploads of at most HOTELS_IMPORT_COALESCE_ROWS rows are written together.
+HOTELS_IMPORT_DIR = os.environ.get("HOTELS_IMPORT_DIR", BASE_DIR / "imports")
+HOTELS_IMPORT_WAIT_SECONDS = float(os.environ.get("HOTELS_IMPORT_WAIT_SECONDS", 30))
+HOTELS_IMPORT_COALESCE_ROWS = int(os.environ.get("HOTELS_IMPORT_COALESCE_ROWS", 200))
+
+# Rate limiting and load shedding of the API (hotels.throttling): every client may send
+# HOTELS_THROTTLE_RATE requests per second (bursts of HOTELS_THROTTLE_BURST) before getting a
+# 429, and a process serving HOTELS_SHED_MAX_IN_FLIGHT requests, or seeing queries slower than
+# HOTELS_SHED_DB_SECONDS on average, answers 503. 0 (or no value) disables a limit.
+HOTELS_THROTTLE_RATE = float(os.environ.get("HOTELS_THROTTLE_RATE", 20))
+HOTELS_THROTTLE_BURST = int(os.environ.get("HOTELS_THROTTLE_BURST", 40))
+HOTELS_THROTTLE_CLIENT_HEADER = os.environ.get("HOTELS_THROTTLE_CLIENT_HEADER") or None
+HOTELS_SHED_MAX_IN_FLIGHT = int(os.environ.get("HOTELS_SHED_MAX_IN_FLIGHT", 64))
+HOTELS_SHED_DB_SECONDS = (
+    float(os.environ["HOTELS_SHED_DB_SECONDS"]) if os.environ.get("HOTELS_SHED_DB_SECONDS") else None
+)
+
 # Application definition
 
 INSTALLED_APPS = [
@@ -46,6 +82,10 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    # First, so the recorded latency covers the other middleware (see hotels.metrics).
+    'hotels.metrics.MetricsMiddleware',
+    # Left out of the chain unless profiling is enabled below (see hotels.profiling).
+    'hotels.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -54,6 +94,8 @@ MIDDLEWARE = [
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'corsheaders.middleware.CorsMiddleware',
+    # After CORS, so the 429 and 503 responses can be read by the frontend (see hotels.throttling).
+    'hotels.throttling.LoadSheddingMiddleware',
 ]
 
 ROOT_URLCONF = 'hotel_project.urls'
@@ -80,11 +122,41 @@ WSGI_APPLICATION = 'hotel_project.wsgi.application'
 # Database
 # https://docs.djangoproject.com/en/5.1/ref/settings/#databases
 
+# Writes go to "default"; reads of the hotels models go to "replica" (see hotels.routers).
+# By default the replica is a second, read-only connection to the same file: in WAL mode its
+# readers are not blocked by a long import on "default". Point DJANGO_REPLICA_DB_NAME at a
+# copy of the database to read from a separate file.
+DB_NAME = os.environ.get('DJANGO_DB_NAME', BASE_DIR / 'db.sqlite3')
+
+# Keep connections open between requests (seconds), so the per-connection PRAGMAs and the
+# SQLite page cache survive. 0 reconnects on every request.
+CONN_MAX_AGE = int(os.environ.get('DJANGO_CONN_MAX_AGE', 600))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': BASE_DIR / 'db.sqlite3',
-    }
+        'NAME': DB_NAME,
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+    },
+    'replica': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': os.environ.get('DJANGO_REPLICA_DB_NAME', DB_NAME),
+        'CONN_MAX_AGE': CONN_MAX_AGE,
+        'CONN_HEALTH_CHECKS': True,
+        'TEST': {
+            'MIRROR': 'default',
+        },
+    },
+}
+
+DATABASE_ROUTERS = ['hotels.routers.ReadReplicaRouter']
+
+# PRAGMA profile applied to new SQLite connections, per alias (see hotels.pragmas).
+# HOTELS_SQLITE_PRAGMAS = {'serving': {'cache_size': -262144}} overrides single pragmas.
+HOTELS_SQLITE_PROFILES = {
+    'default': 'serving',
+    'replica': 'reader',
 }
 
 
@@ -127,6 +199,9 @@ STATICFILES_DIRS = [
     BASE_DIR / "static",
 ]
 
+# The tests run with a temporary HOTELS_IMPORT_DIR (see hotels.tests.runner).
+TEST_RUNNER = "hotels.tests.runner.TestRunner"
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
 
@@ -16,9 +16,12 @@ Including another URLconf
 """
 from django.contrib import admin
 from django.urls import path, include
+from hotels.metrics import metrics_view
 
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('hotels/', include('hotels.urls')),
+    # Prometheus scrape endpoint of this process (see hotels.metrics).
+    path('metrics', metrics_view, name='metrics'),
 ]
@@ -9,8 +9,15 @@ https://docs.djangoproject.com/en/5.1/howto/deployment/wsgi/
 
 import os
 
+from django.conf import settings
 from django.core.wsgi import get_wsgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'hotel_project.settings')
 
 application = get_wsgi_application()
+
+# Load the catalog and render the busiest bodies before the first request (see hotels.warmup).
+# Under gunicorn's preload_app this runs once in the master (see gunicorn.conf.py).
+if settings.HOTELS_WARMUP:
+    from hotels.warmup import warm_up
+    warm_up()
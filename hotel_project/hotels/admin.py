@@ -7,20 +7,45 @@ CSV File Formats:
     - City: CITY_CODE;NAME
     - Hotel: CITY_CODE;HOTEL_CODE;NAME
     
-Error messages and import status are reported through Django's messages framework.
+Error messages and import status are reported through Django's messages framework. Uploads
+are written under the import lock, one import at a time, and the upload page shows the
+running and queued imports (see ``hotels.imports``).
+
+The hotel changelist is built for millions of rows: it loads the city of every row in the
+same query, filters by city through an autocomplete box, estimates its counts and pages by
+key instead of by offset.
 
 Classes:
     - CsvImportForm: Form class for CSV file upload.
     - CityAdmin: Admin class for the City model.
+    - CityAutocompleteFilter: Changelist filter that searches cities instead of listing them.
+    - HotelChangeList: Hotel changelist with estimated counts and keyset paging.
     - HotelAdmin: Admin class for the Hotel model.
 """
 
 from django import forms
 from django.contrib import admin, messages
+from django.contrib.admin.options import IncorrectLookupParameters
+from django.contrib.admin.views.main import ALL_VAR, ChangeList
+from django.contrib.admin.widgets import AutocompleteSelect
+from django.core.exceptions import PermissionDenied, ValidationError
 from django.shortcuts import render, redirect
+from django.db import connections
+from django.db.models import BooleanField
+from django.db.models.expressions import RawSQL
+from . import fulltext, imports, summary
 from .models import City, Hotel
 from django.urls import path
 
+# Query string parameters of the keyset paging: the hotel code a page starts after or ends before.
+AFTER_VAR = 'after'
+BEFORE_VAR = 'before'
+# The hotel changelist order, served by the hotel_citycode_name_code_idx index. The hotel code
+# is unique, so the order is total and every hotel is a key of it.
+KEYSET = ('city_code', 'name', 'code')
+# Filtered and searched changelists count at most this many hotels.
+COUNT_LIMIT = 10000
+
 @admin.register(City)
 class CityAdmin(admin.ModelAdmin):
     """
@@ -35,8 +60,9 @@ class CityAdmin(admin.ModelAdmin):
     feedback to the user.
     """
     list_display = ('code', 'name')  # Fields to display in the list view
-    search_fields = ('name', 'code')  # Fields to enable searching
+    search_fields = ('name', 'code')  # Fields to enable searching (and the hotel city autocomplete)
     ordering = ('name',)  # Default ordering
+    show_full_result_count = False  # Search results do not count every city again
     
     def get_urls(self):
         """
@@ -64,7 +90,8 @@ class CityAdmin(admin.ModelAdmin):
         the file is read and each line is split by semicolons. The format required is:
             CITY_CODE;NAME
             
-        Rows not meeting the criteria(invalid format, missing values, duplicate city code) are skipped.
+        Rows not meeting the criteria (invalid format, invalid or missing values, duplicate city code or name)
+        are skipped. Rows are validated in batches with one query each (see ``hotels.validation``).
         The number of imported and skipped rows are reported back to the user.
         
         args:
@@ -73,6 +100,9 @@ class CityAdmin(admin.ModelAdmin):
         Returns:
             HttpResponse: A rendered template with a CSV import form and help text.
         """
+        # The page shows the running imports, and a POST takes the import lock.
+        if not self.has_add_permission(request):
+            raise PermissionDenied
         if request.method == "POST":
             csv_file = request.FILES.get("csv_upload")
             
@@ -89,36 +119,25 @@ class CityAdmin(admin.ModelAdmin):
                     return redirect("..")
                     
                 csv_data = file_data.split("\n")
-                row_errors = []
-                imported_count = 0
-                skipped_count = 0
+                invalid = []
+                rows = []
 
                 for idx, row in enumerate(csv_data, start=1):
                     row = row.strip()
                     # Skip empty rows
                     if not row:
                         continue
-                        
-                    try:
-                        fields = row.split(";")
-                        # Check for correct number of columns
-                        if len(fields) != 2:
-                            raise ValueError(f"Row {idx}: Expected 2 columns, found {len(fields)}")
-                            
-                        code, name = fields
-                        if not code or not name:
-                            raise ValueError(f"Row {idx}: Missing required values")
-                            
-                        # Check for existing city code
-                        if City.objects.filter(code=code).exists():
-                            raise ValueError(f"Row {idx}: City code {code} already exists")
-                            
-                        City.objects.create(code=code, name=name)
-                        imported_count += 1
-                        
-                    except Exception as e:
-                        skipped_count += 1
-                        row_errors.append(f"- Row {idx}: {str(e)}")
+                    fields = row.split(";")
+                    # Check for correct number of columns
+                    if len(fields) != 2:
+                        invalid.append((idx, f"Expected 2 columns, found {len(fields)}"))
+                        continue
+                    rows.append((idx, *fields))
+
+                # Validate and write the rows in batches, under the import lock (see hotels.imports)
+                imported_count, rejected = imports.import_rows('cities', rows, f"City upload {csv_file.name}")
+                row_errors = [f"- Row {idx}: {message}" for idx, message in sorted(invalid + rejected)]
+                skipped_count = len(row_errors)
 
                 status_message = [
                     f"Successfully imported {imported_count} cities",
@@ -130,34 +149,213 @@ class CityAdmin(admin.ModelAdmin):
                 else:
                     messages.success(request, status_message[0])
 
+            except imports.ImportBusy as e:
+                messages.error(request, f"{e}. Nothing was imported, upload the file again once it is done.")
             except Exception as e:
                 messages.error(request, f"Critical error processing file: {str(e)}")
 
         return render(request, 'admin/csv_upload.html', context={
             'form': CsvImportForm(),
-            'help_text': "CSV format: CITY_CODE;NAME"
+            'help_text': "CSV format: CITY_CODE;NAME",
+            'import_status': imports.status(),
         })
     
 
+class CityAutocompleteFilter(admin.SimpleListFilter):
+    """
+    Filter hotels by city with a search box instead of a link per city.
+
+    The box queries the admin autocomplete view (``CityAdmin.search_fields``), so rendering
+    the filter loads at most the selected city, however many cities there are. The query
+    string parameter is the one of the default related-field filter, so existing links
+    keep working.
+    """
+    title = 'city'
+    parameter_name = 'city__id__exact'
+    template = 'admin/hotels/hotel/city_filter.html'
+    city = None
+
+    def lookups(self, request, model_admin):
+        return ()
+
+    def has_output(self):
+        return True
+
+    def queryset(self, request, queryset):
+        if self.value() is None:
+            return queryset
+        try:
+            self.city = City.objects.filter(pk=self.value()).order_by('pk').first()
+        except (ValueError, ValidationError) as error:
+            # As the default related-field filter: the changelist redirects to ?e=1.
+            raise IncorrectLookupParameters(error)
+        if self.city is None:
+            return queryset.none()
+        # By the denormalized city code, the hotels of the city are a range of the KEYSET index.
+        return queryset.filter(city_code=self.city.code)
+
+    def choices(self, changelist):
+        yield {
+            'selected': self.city is not None,
+            'city': self.city,
+            'parameter_name': self.parameter_name,
+            'query_string': changelist.get_query_string(remove=[self.parameter_name]),
+        }
+
+
+class HotelChangeList(ChangeList):
+    """
+    Hotel changelist with estimated counts and keyset paging.
+
+    Hotels are listed in KEYSET order and a page is a range of its index: the next page
+    starts after the last hotel of the current one (``?after=<hotel code>``) and the
+    previous page ends before the first one (``?before=<hotel code>``). Every page costs
+    one index seek however deep it is, where ``OFFSET`` reads and discards all the rows
+    before it.
+
+    Without filter or search the number of hotels is the sum of the per-city counts (see
+    ``hotels.summary``); filtered results are counted up to COUNT_LIMIT and shown as
+    "10000+" beyond. The unfiltered total is never counted a second time.
+    """
+
+    def get_filters_params(self, params=None):
+        lookup_params = super().get_filters_params(params)
+        for name in (AFTER_VAR, BEFORE_VAR):
+            lookup_params.pop(name, None)
+        return lookup_params
+
+    def get_query_string(self, new_params=None, remove=None):
+        # Filter, search and paging links start from the first page unless they set a key.
+        return super().get_query_string(new_params, [*(remove or ()), AFTER_VAR, BEFORE_VAR])
+
+    def get_ordering(self, request, queryset):
+        return list(KEYSET)
+
+    def count_results(self):
+        """
+        Return the number of matching hotels, and whether it is a lower bound.
+        """
+        if not self.has_active_filters and not self.query:
+            return summary.total_hotels(self.queryset.db), False
+        count = self.queryset.order_by()[:COUNT_LIMIT + 1].count()
+        return min(count, COUNT_LIMIT), count > COUNT_LIMIT
+
+    def key_filter(self, code, operator):
+        """
+        Return the condition selecting the hotels after (``>``) or before (``<``) a hotel.
+
+        Raises:
+            IncorrectLookupParameters: If the hotel does not exist (any more).
+        """
+        key = list(self.queryset.model._default_manager.using(self.queryset.db)
+                   .filter(code=code).order_by().values_list(*KEYSET))
+        if not key:
+            raise IncorrectLookupParameters(f'Unknown hotel {code}')
+        quote = connections[self.queryset.db].ops.quote_name
+        opts = self.queryset.model._meta
+        columns = ', '.join(f'{quote(opts.db_table)}.{quote(opts.get_field(name).column)}' for name in KEYSET)
+        placeholders = ', '.join(['%s'] * len(KEYSET))
+        # A row value comparison is a single range of the index, unlike the equivalent ORs.
+        return RawSQL(f'({columns}) {operator} ({placeholders})', key[0], output_field=BooleanField())
+
+    def get_results(self, request):
+        self.result_count, self.result_count_is_estimate = self.count_results()
+        self.full_result_count = None
+        self.show_full_result_count = False
+        self.show_admin_actions = True
+        self.can_show_all = not self.result_count_is_estimate and self.result_count <= self.list_max_show_all
+        self.first_url = self.previous_url = self.next_url = None
+
+        if self.show_all and self.can_show_all:
+            self.result_list = self.queryset._clone()
+            self.multi_page = self.result_count > self.list_per_page
+        else:
+            self.result_list = self.get_page(request)
+            self.multi_page = bool(self.previous_url or self.next_url)
+        self.show_all_url = None
+        if self.can_show_all and self.multi_page and not self.show_all:
+            self.show_all_url = self.get_query_string({ALL_VAR: ''})
+
+    def get_page(self, request):
+        """
+        Return the hotels of the requested page and set the links to its neighbours.
+        """
+        after, before = request.GET.get(AFTER_VAR), request.GET.get(BEFORE_VAR)
+        queryset = self.queryset
+        if after:
+            queryset = queryset.filter(self.key_filter(after, '>'))
+        elif before:
+            # Walk the index backwards from the key, then restore the order.
+            queryset = queryset.filter(self.key_filter(before, '<')).reverse()
+        rows = list(queryset[:self.list_per_page + 1])
+        more = len(rows) > self.list_per_page
+        rows = rows[:self.list_per_page]
+        if before:
+            rows.reverse()
+
+        if after or before:
+            self.first_url = self.get_query_string()
+        if rows and (more if before else after):
+            self.previous_url = self.get_query_string({BEFORE_VAR: rows[0].code})
+        if rows and (before or more):
+            self.next_url = self.get_query_string({AFTER_VAR: rows[-1].code})
+        return rows
+
+
 @admin.register(Hotel)
 class HotelAdmin(admin.ModelAdmin):
     """
     Admin configuration for the Hotel model.
     
     This class provides:
-        - A list display of hotel code, name, and city
-        - Filter functionality by city
-        - Search functionality by name and code
+        - A list display of hotel code, name, and city, with the city loaded in the same query
+        - Filter functionality by city through an autocomplete box
+        - Estimated counts and keyset paging (see ``HotelChangeList``)
+        - Indexed full-text search by name, code and city name (see ``hotels.fulltext``)
         - A custom URL for uploading CSV files to import hotels
         
     During upload, the code checks that the associated city exists and that the hotel
-    code is unique within that city.
+    code is unique, for a whole batch of rows at once.
     """
     list_display = ('code', 'name', 'city')  # Fields to display in the list view
-    list_filter = ('city',)  # Filter hotels by city
+    list_select_related = ('city',)  # Join the city instead of one query per row
+    list_filter = (CityAutocompleteFilter,)  # Filter hotels by city
     search_fields = ('name', 'code')  # Fields to enable searching
-    ordering = ('city', 'name')  # Default ordering
+    ordering = KEYSET  # Default ordering (code makes it total, see test_query_plans)
+    sortable_by = ()  # Pages are ranges of the KEYSET index, so the order is fixed
+    autocomplete_fields = ('city',)  # The change form searches cities instead of listing them all
+
+    @property
+    def media(self):
+        # The changelist city filter is an autocomplete box (see CityAutocompleteFilter).
+        city_select = AutocompleteSelect(self.model._meta.get_field('city'), self.admin_site)
+        return super().media + city_select.media
+
+    def get_changelist(self, request, **kwargs):
+        return HotelChangeList
     
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Search hotels through the full-text index instead of ``LIKE '%term%'`` scans.
+
+        Every word of the search term matches a prefix of the hotel name, code or city name.
+        Falls back to the default search on databases without the index.
+
+        Args:
+            request (HttpRequest): The changelist request.
+            queryset (QuerySet): The hotels to search.
+            search_term (str): The text entered in the search box.
+
+        Returns:
+            tuple: The filtered queryset, and whether it may contain duplicates (never).
+        """
+        if not search_term or not fulltext.is_available(queryset.db):
+            return super().get_search_results(request, queryset, search_term)
+        match = fulltext.matching_ids_sql(search_term)
+        if match is None:
+            return queryset.none(), False
+        return queryset.filter(id__in=RawSQL(*match)), False
+
     def get_urls(self):
         """
         Extend default admin URLs with a URL for hotel CSV uploads.
@@ -166,7 +364,7 @@ class HotelAdmin(admin.ModelAdmin):
             list: A list of URL patterns including the CSV upload endpoint.
         """
         urls = super().get_urls()
-        new_urls = [path('upload-csv/', self.upload_csv, name='hotels_hotel_upload_csv',)]
+        new_urls = [path('upload-csv/', self.admin_site.admin_view(self.upload_csv), name='hotels_hotel_upload_csv')]
         return new_urls + urls
     
     def upload_csv(self, request):
@@ -177,7 +375,8 @@ class HotelAdmin(admin.ModelAdmin):
         Each line must have exactly 3 columns in the format:
             CITY_CODE;HOTEL_CODE;NAME
             
-        The method verifies that the city exists and that the hotel code is unique for that city.
+        The method verifies, per batch of rows (see ``hotels.validation``), that the city exists and that
+        the hotel code is unique.
         Errors are recorded and communicated through the message framework.
         
         Args:
@@ -186,6 +385,9 @@ class HotelAdmin(admin.ModelAdmin):
         Returns:
             HttpResponse: A rendered response with the upload form and instructions.
         """
+        # The page shows the running imports, and a POST takes the import lock.
+        if not self.has_add_permission(request):
+            raise PermissionDenied
         if request.method == "POST":
             csv_file = request.FILES.get("csv_upload")
             
@@ -196,40 +398,25 @@ class HotelAdmin(admin.ModelAdmin):
 
             try:
                 file_data = csv_file.read().decode("utf-8").strip()
-                row_errors = []
-                imported_count = 0
-                skipped_count = 0
+                invalid = []
+                rows = []
 
                 for idx, row in enumerate(file_data.split("\n"), start=1):
                     row = row.strip()
                     # Skip empty rows
                     if not row:
                         continue
+                    fields = row.split(";")
+                    if len(fields) != 3:
+                        invalid.append((idx, "Expected 3 columns (City Code, Hotel Code, Name)"))
+                        continue
+                    rows.append((idx, *fields))
 
-                    try:
-                        fields = row.split(";")
-                        if len(fields) != 3:
-                            raise ValueError("Expected 3 columns (City Code, Hotel Code, Name)")
-
-                        city_code, hotel_code, name = fields
-                        
-                        city = City.objects.get(code=city_code)
-                        
-                        if not hotel_code or not name:
-                            raise ValueError("Missing hotel code or name")
-                            
-                        if Hotel.objects.filter(code=hotel_code, city=city).exists():
-                            raise ValueError("Hotel code already exists for this city")
-                            
-                        Hotel.objects.create(code=hotel_code, name=name, city=city)
-                        imported_count +=1
-                        
-                    except City.DoesNotExist:
-                        row_errors.append(f"- Row {idx}: City {city_code} not found")
-                        skipped_count +=1
-                    except Exception as e:
-                        row_errors.append(f"- Row {idx}: {str(e)}")
-                        skipped_count +=1
+                # Resolve the cities and check the codes set-wise per batch, then write the batches,
+                # under the import lock (see hotels.imports)
+                imported_count, rejected = imports.import_rows('hotels', rows, f"Hotel upload {csv_file.name}")
+                row_errors = [f"- Row {idx}: {message}" for idx, message in sorted(invalid + rejected)]
+                skipped_count = len(row_errors)
 
                 status_message = [
                     f"Imported {imported_count} hotels",
@@ -241,12 +428,15 @@ class HotelAdmin(admin.ModelAdmin):
                 else:
                     messages.success(request, status_message[0])
 
+            except imports.ImportBusy as e:
+                messages.error(request, f"{e}. Nothing was imported, upload the file again once it is done.")
             except Exception as e:
                 messages.error(request, f"File processing error: {str(e)}")
 
         return render(request, 'admin/csv_upload.html', context={
             'form': CsvImportForm(),
-            'help_text': "CSV format: CITY_CODE;HOTEL_CODE;NAME"
+            'help_text': "CSV format: CITY_CODE;HOTEL_CODE;NAME",
+            'import_status': imports.status(),
         })
     
 class CsvImportForm(forms.Form):
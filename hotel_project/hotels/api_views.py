@@ -1,13 +1,291 @@
-from rest_framework.decorators import api_view
+import gzip
+import zlib
+
+from rest_framework import status
+from rest_framework.authentication import BasicAuthentication, SessionAuthentication
+from rest_framework.decorators import api_view, authentication_classes, permission_classes
+from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
-from .models import City, Hotel
+from .catalog import get_catalog
+from .changelog import changes_since, latest_version
+from .fulltext import search_hotels
+from .imports import ImportBusy
+from .ingest import Ingest, parse_csv, parse_ndjson, read_lines
+from .models import Hotel
+from .renderers import (
+    JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE, change_fragment, city_stats_fragment, hotel_fragment, json_array, json_object,
+    json_response, quote, stream_json_array, stream_ndjson, streaming_response,
+)
+from .summary import city_counts
+from .validation import normalize_code
+
+CITY_SEARCH_DEFAULT_LIMIT = 10
+CITY_SEARCH_MAX_LIMIT = 50
+HOTEL_BATCH_MAX_CODES = 100
+CHANGES_DEFAULT_LIMIT = 1000
+CHANGES_MAX_LIMIT = 10000
+EXPORT_CHUNK_SIZE = 2000
+EXPORT_FORMATS = {
+    'json': (JSON_CONTENT_TYPE, stream_json_array),
+    'ndjson': (NDJSON_CONTENT_TYPE, stream_ndjson),
+}
+INGEST_PARSERS = {
+    NDJSON_CONTENT_TYPE: parse_ndjson,
+    'text/csv': parse_csv,
+}
+INGEST_PERMISSIONS = ('hotels.add_city', 'hotels.add_hotel')
+# Seconds a client is asked to wait before retrying an ingest that found the import lock busy.
+INGEST_RETRY_AFTER = 30
+
+def search_params(params):
+    """
+    Parse the query string of the city and hotel search endpoints.
+
+    Args:
+        params (QueryDict): The GET parameters.
+
+    Returns:
+        tuple: The query and the clamped result limit.
+    """
+    try:
+        limit = int(params.get('limit', CITY_SEARCH_DEFAULT_LIMIT))
+    except ValueError:
+        limit = CITY_SEARCH_DEFAULT_LIMIT
+    return params.get('q', ''), max(1, min(limit, CITY_SEARCH_MAX_LIMIT))
+
+def batch_codes(params):
+    """
+    Parse the city codes of the hotel batch endpoint.
+
+    Args:
+        params (QueryDict): The GET parameters.
+
+    Returns:
+        tuple: The unique city codes, normalised as stored, in request order, and an error
+        message or None.
+    """
+    codes = list(dict.fromkeys(filter(None, map(normalize_code, params.get('codes', '').split(',')))))
+    if not codes:
+        return codes, 'Provide one or more city codes: ?codes=AMS,BCN'
+    if len(codes) > HOTEL_BATCH_MAX_CODES:
+        return codes, f'At most {HOTEL_BATCH_MAX_CODES} city codes per request'
+    return codes, None
+
+def hotel_search_json(query, limit):
+    """
+    Return the encoded JSON array of the hotels matching a full-text query.
+    """
+    return json_array(hotel_fragment(code, name, quote(city_code)) for code, name, city_code in search_hotels(query, limit))
+
+def city_stats_json():
+    """
+    Return the encoded JSON object with the hotel count of every city and the totals.
+
+    The counts are read from the summary table (see hotels.summary).
+    """
+    rows = city_counts()
+    return json_object((
+        ('cities', json_array(city_stats_fragment(code, name, count) for code, name, count in rows)),
+        ('total_cities', b'%d' % len(rows)),
+        ('total_hotels', b'%d' % sum(count for _code, _name, count in rows)),
+    ))
+
+def changes_params(params):
+    """
+    Parse the query string of the change-log endpoint.
+
+    Args:
+        params (QueryDict): The GET parameters.
+
+    Returns:
+        tuple: The version to start after, the clamped page size, and an error message or None.
+    """
+    try:
+        since = int(params.get('since', 0))
+        limit = int(params.get('limit', CHANGES_DEFAULT_LIMIT))
+    except ValueError:
+        return 0, 0, 'since and limit must be integers'
+    if since < 0:
+        return 0, 0, 'since must not be negative'
+    return since, max(1, min(limit, CHANGES_MAX_LIMIT)), None
+
+def changes_json(since, limit):
+    """
+    Return the encoded JSON object with a page of the changes recorded after a version.
+
+    ``version`` is the version to pass as ``since`` for the next page, and ``more`` tells
+    whether that page has changes already.
+    """
+    rows = changes_since(since, limit + 1)
+    more = len(rows) > limit
+    rows = rows[:limit]
+    version = rows[-1][0] if rows else max(since, 0)
+    return json_object((
+        ('version', b'%d' % version),
+        ('latest', b'%d' % max(latest_version(), version)),
+        ('more', b'true' if more else b'false'),
+        ('changes', json_array(change_fragment(*row) for row in rows)),
+    ))
+
+def export_query(last_id, chunk_size):
+    """
+    Return the query for the next chunk of the hotel export.
+
+    The export pages through the table by primary key (keyset pagination): every chunk is
+    a short, index-backed query, so no read transaction is held open while the response
+    is streamed to a slow client.
+
+    Args:
+        last_id (int): Primary key of the last hotel of the previous chunk (0 for the first).
+        chunk_size (int): Maximum number of hotels per chunk.
 
-@api_view(['GET'])
+    Returns:
+        QuerySet: (id, fragment fields...) rows of the chunk.
+    """
+    return (
+        Hotel.objects.filter(id__gt=last_id)
+        .order_by('id')
+        .values_list('id', 'code', 'name', 'city_code')[:chunk_size]
+    )
+
+def export_fragments(rows):
+    """
+    Return the JSON fragments of a chunk of export rows.
+    """
+    return [hotel_fragment(code, name, quote(city_code)) for _id, code, name, city_code in rows]
+
+def export_chunks(chunk_size=None):
+    """
+    Yield the JSON fragments of every hotel, one list per chunk.
+
+    Args:
+        chunk_size (int): Hotels per chunk; defaults to EXPORT_CHUNK_SIZE.
+
+    Yields:
+        list: The fragments of one chunk, ordered by primary key.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    last_id = 0
+    while True:
+        rows = list(export_query(last_id, chunk_size))
+        if not rows:
+            return
+        yield export_fragments(rows)
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+# The list endpoints return pre-rendered JSON bodies from the catalog (see hotels.renderers)
+# in the representation of CitySerializer/HotelSerializer.
+
+@api_view(['GET', 'HEAD'])
 def city_list(request):
-    cities = City.objects.values()
-    return Response(cities)
+    return json_response(request, get_catalog().cities_json())
+
+@api_view(['GET', 'HEAD'])
+def city_search(request):
+    """
+    Autocomplete cities by name or code: ``?q=<text>&limit=<n>``.
+    """
+    query, limit = search_params(request.query_params)
+    return json_response(request, get_catalog().search_cities_json(query, limit))
+
+@api_view(['GET', 'HEAD'])
+def city_stats(request):
+    """
+    Hotel count per city, ordered by city name, plus the number of cities and hotels.
+    """
+    return json_response(request, city_stats_json())
+
+@api_view(['GET', 'HEAD'])
+def changes(request):
+    """
+    Changes to cities and hotels after a version: ``?since=<version>&limit=<n>``.
+
+    Mirrors start with ``since=0`` (which returns the whole catalog as inserts), apply the
+    changes in order and continue from the returned ``version`` while ``more`` is true.
+    """
+    since, limit, error = changes_params(request.query_params)
+    if error:
+        return Response({'detail': error}, status=status.HTTP_400_BAD_REQUEST)
+    return json_response(request, changes_json(since, limit))
 
-@api_view(['GET'])
+@api_view(['GET', 'HEAD'])
+def hotel_search(request):
+    """
+    Full-text search of hotels by name, code and city name: ``?q=<text>&limit=<n>``.
+
+    Every word of the query matches as a prefix; the best matches come first.
+    """
+    query, limit = search_params(request.query_params)
+    return json_response(request, hotel_search_json(query, limit))
+
+@api_view(['GET', 'HEAD'])
 def hotel_list(request, code):
-    hotels = Hotel.objects.filter(city__code=code).values()
-    return Response(hotels)
\ No newline at end of file
+    return json_response(request, get_catalog().hotels_json(code))
+
+@api_view(['GET', 'HEAD'])
+def hotel_batch(request):
+    """
+    Hotels of several cities in one request: ``?codes=AMS,BCN,PAR``.
+
+    The response maps every requested city code to its hotels; unknown codes map to an
+    empty list.
+    """
+    codes, error = batch_codes(request.query_params)
+    if error:
+        return Response({'detail': error}, status=status.HTTP_400_BAD_REQUEST)
+    snapshot = get_catalog()
+    return json_response(request, json_object((code, snapshot.hotels_json(code)) for code in codes))
+
+@api_view(['GET', 'HEAD'])
+def hotel_export(request):
+    """
+    Stream every hotel: ``?output=json`` (a JSON array, the default) or ``?output=ndjson``.
+
+    The body is produced chunk by chunk while it is sent, so memory use does not depend on
+    the size of the catalog. (``format`` is reserved by DRF for renderer negotiation.)
+    """
+    export_format = request.query_params.get('output', 'json')
+    if export_format not in EXPORT_FORMATS:
+        return Response({'detail': f'Unknown output, use one of: {", ".join(EXPORT_FORMATS)}'}, status=status.HTTP_400_BAD_REQUEST)
+    content_type, encode = EXPORT_FORMATS[export_format]
+    return streaming_response(request, encode(export_chunks()), content_type)
+
+@api_view(['POST'])
+@authentication_classes([BasicAuthentication, SessionAuthentication])
+@permission_classes([IsAuthenticated])
+def ingest(request):
+    """
+    Bulk ingest of cities and hotels: an NDJSON (``application/x-ndjson``) or ``;``-separated
+    CSV (``text/csv``) body, optionally with ``Content-Encoding: gzip`` (see hotels.ingest).
+
+    The body is parsed while it is read and written in batches, so it may be of any size.
+    The response counts, per category (cities, hotels and invalid lines), the rows received,
+    imported and rejected, with the first errors. When a batch waits too long for the import
+    lock the response is a 503 with the same counts: the batches written before stay written.
+    """
+    if not request.user.has_perms(INGEST_PERMISSIONS):
+        return Response({'detail': 'Adding cities and hotels is not permitted'}, status=status.HTTP_403_FORBIDDEN)
+    parse = INGEST_PARSERS.get(request.content_type.split(';')[0].strip())
+    if parse is None:
+        return Response({'detail': f'Unsupported content type, use one of: {", ".join(INGEST_PARSERS)}'},
+                        status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+    # The Django request reads the body as it arrives; request.data would load all of it first.
+    stream = request._request
+    content_encoding = request.META.get('HTTP_CONTENT_ENCODING', 'identity')
+    if content_encoding == 'gzip':
+        stream = gzip.GzipFile(fileobj=stream, mode='rb')
+    elif content_encoding != 'identity':
+        return Response({'detail': 'Unsupported content encoding, use gzip or none'},
+                        status=status.HTTP_415_UNSUPPORTED_MEDIA_TYPE)
+
+    ingest = Ingest(f'API ingest by {request.user.get_username()}')
+    try:
+        ingest.run(parse(read_lines(stream)))
+    except ImportBusy as error:
+        return Response({'detail': str(error), **ingest.summary()}, status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                        headers={'Retry-After': str(INGEST_RETRY_AFTER)})
+    except (gzip.BadGzipFile, EOFError, zlib.error):
+        return Response({'detail': 'Invalid gzip body', **ingest.summary()}, status=status.HTTP_400_BAD_REQUEST)
+    return Response(ingest.summary())
@@ -1,6 +1,45 @@
 from django.apps import AppConfig
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_migrate, pre_migrate
 
 
 class HotelsConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'hotels'
+
+    def ready(self):
+        # Register the signal receivers that keep the read catalog in sync.
+        from . import signals  # noqa: F401
+        from .metrics import instrument_connection
+        from .pragmas import configure_connection
+        connection_created.connect(configure_connection)
+        connection_created.connect(instrument_connection)
+        pre_migrate.connect(drop_derived_triggers, sender=self)
+        post_migrate.connect(install_derived_tables, sender=self)
+
+
+def drop_derived_triggers(sender, using, **kwargs):
+    """
+    Drop the triggers of the derived data before migrating.
+
+    SQLite validates the triggers that reference a table when a migration rebuilds it, and
+    fails if they reference the table being rebuilt. install_derived_tables() recreates
+    them and repairs the derived data afterwards.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(r"SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'hotels\_%' ESCAPE '\'")
+        for (name,) in cursor.fetchall():
+            cursor.execute(f'DROP TRIGGER IF EXISTS "{name}"')
+
+
+def install_derived_tables(sender, using, **kwargs):
+    """Create the trigger-maintained data (city_code copies, full-text index, city statistics, change-log) after migrating."""
+    from . import changelog, denormalize, fulltext, summary
+    denormalize.install(using)
+    fulltext.install(using)
+    summary.install(using)
+    changelog.install(using)
@@ -0,0 +1,161 @@
+"""
+Module: async_views
+
+Native async variants of the read API views in ``hotels.api_views``.
+
+Under an ASGI server, sync views are each run in a worker thread. These views run on the
+event loop instead and answer from the in-memory catalog, so hundreds of concurrent
+keep-alive clients are served without a thread per request. The work that can block runs in
+a worker thread: the check of the catalog data version, which reads a database connection,
+together with the loading of the catalog and the rendering of a body on first request (see
+``catalog_body``), and the database queries of the search, statistics and changes. The
+views are routed in place of the DRF views when ``settings.HOTELS_ASYNC_API`` is enabled,
+which ``hotel_project/asgi.py`` does by default.
+
+GET and HEAD requests get the same status codes and bodies as from the DRF views, without
+the ``Allow`` and ``Vary: Accept`` headers that DRF adds. Any other method is answered by the
+DRF view itself, so OPTIONS and the 405 responses are those of DRF (see ``api_methods``).
+"""
+
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.http import JsonResponse
+
+from . import api_views
+from .api_views import (
+    EXPORT_CHUNK_SIZE, batch_codes, changes_json, changes_params, city_stats_json, export_fragments, export_query, hotel_search_json,
+    search_params,
+)
+from .catalog import CatalogSnapshot, get_catalog
+from .renderers import (
+    JSON_CONTENT_TYPE, NDJSON_CONTENT_TYPE, ajson_response, astream_json_array, astream_ndjson,
+    json_object, streaming_response,
+)
+
+EXPORT_FORMATS = {
+    'json': (JSON_CONTENT_TYPE, astream_json_array),
+    'ndjson': (NDJSON_CONTENT_TYPE, astream_ndjson),
+}
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+def api_methods(view):
+    """
+    Serve GET and HEAD with an async view and any other method with the DRF view of the same
+    name, run in a worker thread.
+
+    Args:
+        view (coroutine function): The async view.
+
+    Returns:
+        coroutine function: The view answering every method as ``hotels.api_views`` does.
+    """
+    sync_view = getattr(api_views, view.__name__)
+
+    def render(request, *args, **kwargs):
+        return sync_view(request, *args, **kwargs).render()
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method in SAFE_METHODS:
+            return await view(request, *args, **kwargs)
+        return await sync_to_async(render)(request, *args, **kwargs)
+    return wrapper
+
+
+async def catalog_body(render, *args):
+    """
+    Render a body from the current catalog snapshot in a worker thread.
+
+    The version check, the loading of a stale catalog and the rendering of a body that is not
+    cached yet all block, so they run in the same thread hop; the event loop never waits for
+    the database or the encoding of a body.
+
+    Args:
+        render (callable): Called with the snapshot and ``args``; returns the body.
+        *args: Further arguments of ``render``.
+
+    Returns:
+        bytes: The body.
+    """
+    return await sync_to_async(lambda: render(get_catalog(), *args))()
+
+
+def batch_body(snapshot, codes):
+    return json_object((code, snapshot.hotels_json(code)) for code in codes)
+
+
+@api_methods
+async def city_list(request):
+    body = await catalog_body(CatalogSnapshot.cities_json)
+    return await ajson_response(request, body)
+
+
+@api_methods
+async def city_search(request):
+    query, limit = search_params(request.GET)
+    body = await catalog_body(CatalogSnapshot.search_cities_json, query, limit)
+    return await ajson_response(request, body)
+
+
+@api_methods
+async def city_stats(request):
+    body = await sync_to_async(city_stats_json)()
+    return await ajson_response(request, body)
+
+
+@api_methods
+async def changes(request):
+    since, limit, error = changes_params(request.GET)
+    if error:
+        return JsonResponse({'detail': error}, status=400)
+    body = await sync_to_async(changes_json)(since, limit)
+    return await ajson_response(request, body)
+
+
+@api_methods
+async def hotel_search(request):
+    query, limit = search_params(request.GET)
+    body = await sync_to_async(hotel_search_json)(query, limit)
+    return await ajson_response(request, body)
+
+
+@api_methods
+async def hotel_list(request, code):
+    body = await catalog_body(CatalogSnapshot.hotels_json, code)
+    return await ajson_response(request, body)
+
+
+@api_methods
+async def hotel_batch(request):
+    codes, error = batch_codes(request.GET)
+    if error:
+        return JsonResponse({'detail': error}, status=400)
+    body = await catalog_body(batch_body, codes)
+    return await ajson_response(request, body)
+
+
+async def export_chunks(chunk_size=None):
+    """
+    Async variant of api_views.export_chunks(), reading every chunk with the async ORM.
+    """
+    chunk_size = chunk_size or EXPORT_CHUNK_SIZE
+    last_id = 0
+    while True:
+        rows = [row async for row in export_query(last_id, chunk_size)]
+        if not rows:
+            return
+        yield export_fragments(rows)
+        if len(rows) < chunk_size:
+            return
+        last_id = rows[-1][0]
+
+
+@api_methods
+async def hotel_export(request):
+    export_format = request.GET.get('output', 'json')
+    if export_format not in EXPORT_FORMATS:
+        return JsonResponse({'detail': f'Unknown output, use one of: {", ".join(EXPORT_FORMATS)}'}, status=400)
+    content_type, encode = EXPORT_FORMATS[export_format]
+    return streaming_response(request, encode(export_chunks()), content_type)
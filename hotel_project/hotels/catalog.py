@@ -0,0 +1,402 @@
+"""
+Module: catalog
+
+This module keeps an in-process, read-only copy of the City and Hotel tables so that the
+read API can be answered without touching the database.
+
+The whole catalog is loaded into compact, array-backed tables:
+    - Cities are stored as parallel columns ordered by name, with dicts mapping a city
+      code or primary key to its row number.
+    - Hotels are stored as parallel columns grouped per city and ordered by name, with an
+      offset index (start/end row per city) and a dict mapping a hotel code to its row.
+
+The snapshot also renders the public JSON representation of the API (see
+``hotels.renderers``) and keeps the rendered bodies until the data changes.
+
+The data version of the catalog is the version of the last change of a city and of a
+hotel in the change log (see ``hotels.changelog``), which is written by triggers in the
+same transaction as the change. It lives in the database, so a process sees the writes of
+every other process, including imports and bulk writes that send no signal. Readers compare
+the version of their snapshot with the current version and reload only the table that
+changed.
+
+Reading the version on every request would cost a query. On SQLite, a thread first asks
+its read connection for ``PRAGMA data_version``, which only changes when another connection
+commits and is answered from the shared memory of the WAL without reading the database; the
+log is read again only when it changed. The writes a process makes through the read
+connection itself, such as the reads routed to "default" inside a transaction (see
+``hotels.routers``), do not change it: ``bump_data_version()``, called by the signal
+receivers and the bulk insert helpers, makes the threads of the process read the log again.
+The pragma runs on the DB-API connection, so it is not counted as a query.
+
+Snapshots are read through the read alias, which only sees committed rows. A write inside a
+transaction therefore bumps again when the transaction commits, so that a snapshot loaded
+during the transaction is checked against the committed version.
+
+Functions:
+    - get_catalog: Return an up-to-date snapshot of the catalog.
+    - get_data_version: Return the current data version as a string.
+    - bump_data_version: Make the threads of this process read the data version again.
+    - invalidate: Drop the snapshot held by this process.
+"""
+
+import itertools
+import threading
+from array import array
+
+from django.db import connections, router, transaction
+
+from . import changelog
+from .metrics import record_cache
+from .models import City, Hotel
+from .renderers import CachedBody, city_fragment, hotel_fragment, json_array, quote
+from .search import CitySearchIndex
+
+_snapshot = None
+_lock = threading.Lock()
+# Incremented by bump_data_version(); part of what a thread remembers of its last version read.
+_generations = itertools.count(1)
+_generation = 0
+_local = threading.local()
+
+
+def _current_versions():
+    """
+    Read the current (city, hotel) version pair, from the change log when it may have changed.
+
+    Returns:
+        tuple: The city and hotel table versions.
+    """
+    using = router.db_for_read(Hotel)
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return changelog.kind_versions(using)
+    connection.ensure_connection()
+    state = (connection.connection, connection.connection.execute('PRAGMA data_version').fetchone()[0], _generation)
+    if getattr(_local, 'state', None) != state:
+        _local.versions = changelog.kind_versions(using)
+        _local.state = state
+    return _local.versions
+
+
+def get_data_version():
+    """
+    Return the current data version of the catalog.
+
+    The value changes whenever a City or Hotel is written and can be used as part of a
+    cache key for anything derived from the catalog.
+
+    Returns:
+        str: The data version, formatted as "<city version>.<hotel version>".
+    """
+    return '%d.%d' % _current_versions()
+
+
+def bump_data_version():
+    """
+    Make every thread of this process read the data version again, now and, inside a
+    transaction, once it commits.
+
+    Only needed for the writes made through a connection the catalog is read from; the
+    writes of other connections and processes are noticed by themselves.
+    """
+    _bump()
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        # Consecutive writes of a transaction share one callback: a savepoint rollback that
+        # discards it also discards the writes made after it.
+        if not connection.run_on_commit or connection.run_on_commit[-1][1] is not _bump:
+            transaction.on_commit(_bump)
+
+
+def _bump():
+    global _generation
+    _generation = next(_generations)
+
+
+def invalidate():
+    """
+    Drop the snapshot held by this process. The next call to get_catalog() reads the data
+    version and reloads it.
+    """
+    global _snapshot
+    with _lock:
+        _snapshot = None
+    _bump()
+
+
+def get_catalog():
+    """
+    Return a snapshot of the catalog that matches the current data version.
+
+    The snapshot is shared by all threads of the process and is never mutated, so it can
+    be used without locking. When the data version has changed, only the tables whose
+    version moved are reloaded.
+
+    Returns:
+        CatalogSnapshot: The current snapshot.
+    """
+    global _snapshot
+    versions = _current_versions()
+    snapshot = _snapshot
+    if snapshot is not None and snapshot.versions == versions:
+        record_cache('catalog', True)
+        return snapshot
+
+    record_cache('catalog', False)
+    with _lock:
+        snapshot = _snapshot
+        if snapshot is None or snapshot.versions != versions:
+            snapshot = CatalogSnapshot.load(versions, previous=snapshot)
+            _snapshot = snapshot
+    return snapshot
+
+
+class CityTable:
+    """
+    Column store for all cities, ordered by name.
+
+    Attributes:
+        ids (array): Primary keys, one per row.
+        codes (list): City codes, one per row.
+        names (list): City names, one per row.
+        row_by_code (dict): Maps a city code to its row number.
+        row_by_id (dict): Maps a city primary key to its row number.
+    """
+    __slots__ = ('ids', 'codes', 'names', 'row_by_code', 'row_by_id', '_search_index', '_fragments')
+
+    def __init__(self):
+        self.ids = array('q')
+        self.codes = []
+        self.names = []
+        self.row_by_code = {}
+        self.row_by_id = {}
+        self._search_index = None
+        self._fragments = None
+
+    @classmethod
+    def load(cls):
+        """
+        Read every city from the database.
+
+        Returns:
+            CityTable: The loaded table.
+        """
+        table = cls()
+        rows = City.objects.order_by('name').values_list('id', 'code', 'name')
+        for row, (pk, code, name) in enumerate(rows.iterator(chunk_size=2000)):
+            table.ids.append(pk)
+            table.codes.append(code)
+            table.names.append(name)
+            table.row_by_code[code] = row
+            table.row_by_id[pk] = row
+        return table
+
+    def __len__(self):
+        return len(self.codes)
+
+    @property
+    def search_index(self):
+        """
+        The autocomplete index over the city names and codes, built on first use.
+
+        Returns:
+            CitySearchIndex: The index.
+        """
+        if self._search_index is None:
+            self._search_index = CitySearchIndex(self.codes, self.names)
+        return self._search_index
+
+    @property
+    def fragments(self):
+        """
+        The public JSON representation of every city, built on first use.
+
+        Returns:
+            list: One JSON object (str) per row.
+        """
+        if self._fragments is None:
+            self._fragments = [city_fragment(code, name) for code, name in zip(self.codes, self.names)]
+        return self._fragments
+
+
+class HotelTable:
+    """
+    Column store for all hotels, grouped per city and ordered by name within a city.
+
+    The hotels of the city at row ``r`` of the CityTable are the rows
+    ``starts[r]:ends[r]`` of this table.
+
+    Attributes:
+        ids (array): Primary keys, one per row.
+        city_rows (array): Row number of the hotel's city in the CityTable.
+        codes (list): Hotel codes, one per row.
+        names (list): Hotel names, one per row.
+        starts (array): First hotel row per city row.
+        ends (array): End (exclusive) hotel row per city row.
+        row_by_code (dict): Maps a hotel code to its row number.
+    """
+    __slots__ = ('ids', 'city_rows', 'codes', 'names', 'starts', 'ends', 'row_by_code')
+
+    def __init__(self, city_count):
+        self.ids = array('q')
+        self.city_rows = array('l')
+        self.codes = []
+        self.names = []
+        self.starts = array('l', [0]) * city_count
+        self.ends = array('l', [0]) * city_count
+        self.row_by_code = {}
+
+    @classmethod
+    def load(cls, cities):
+        """
+        Read every hotel from the database.
+
+        Hotels are read ordered by (city_id, name), so the hotels of one city form a single
+        contiguous run; only the boundaries of each run have to be recorded.
+
+        Args:
+            cities (CityTable): The table used to resolve city primary keys to rows.
+
+        Returns:
+            HotelTable: The loaded table.
+        """
+        table = cls(len(cities))
+        rows = Hotel.objects.order_by('city_id', 'name').values_list('id', 'city_id', 'code', 'name')
+        current_city_id = None
+        city_row = -1
+        row = 0
+        for pk, city_id, code, name in rows.iterator(chunk_size=2000):
+            if city_id != current_city_id:
+                current_city_id = city_id
+                city_row = cities.row_by_id.get(city_id, -1)
+                if city_row >= 0:
+                    table.starts[city_row] = row
+            if city_row < 0:
+                # The city was added after the city table was read; it is picked up by
+                # the next reload.
+                continue
+            table.ids.append(pk)
+            table.city_rows.append(city_row)
+            table.codes.append(code)
+            table.names.append(name)
+            table.row_by_code[code] = row
+            row += 1
+            table.ends[city_row] = row
+        return table
+
+    def __len__(self):
+        return len(self.codes)
+
+
+class CatalogSnapshot:
+    """
+    Immutable view of the whole catalog at a given data version.
+
+    Attributes:
+        versions (tuple): The (city, hotel) versions the snapshot was loaded at.
+        cities (CityTable): All cities.
+        hotels (HotelTable): All hotels.
+    """
+    __slots__ = ('versions', 'cities', 'hotels', '_cities_json', '_hotels_json')
+
+    def __init__(self, versions, cities, hotels):
+        self.versions = versions
+        self.cities = cities
+        self.hotels = hotels
+        self._cities_json = None
+        self._hotels_json = {}
+
+    @classmethod
+    def load(cls, versions, previous=None):
+        """
+        Build a snapshot for the given versions, reusing tables of a previous snapshot
+        whose version did not change.
+
+        The hotel table references city rows, so a city change reloads both tables.
+
+        Args:
+            versions (tuple): The (city, hotel) versions to load.
+            previous (CatalogSnapshot): An older snapshot, if any.
+
+        Returns:
+            CatalogSnapshot: The new snapshot.
+        """
+        if previous is not None and previous.versions[0] == versions[0]:
+            cities = previous.cities
+        else:
+            cities = CityTable.load()
+            previous = None
+        if previous is not None and previous.versions[1] == versions[1]:
+            hotels = previous.hotels
+        else:
+            hotels = HotelTable.load(cities)
+        return cls(versions, cities, hotels)
+
+    def cities_json(self):
+        """
+        Return all cities as an encoded JSON array, ordered by name.
+
+        The body is rendered once per snapshot.
+
+        Returns:
+            CachedBody: The JSON array.
+        """
+        record_cache('body', self._cities_json is not None)
+        if self._cities_json is None:
+            self._cities_json = CachedBody(json_array(self.cities.fragments))
+        return self._cities_json
+
+    def search_cities_json(self, query, limit=10):
+        """
+        Return the cities best matching an autocomplete query as an encoded JSON array.
+
+        Args:
+            query (str): The text typed by the user.
+            limit (int): Maximum number of cities to return.
+
+        Returns:
+            bytes: The JSON array, best match first.
+        """
+        fragments = self.cities.fragments
+        return json_array(fragments[row] for row in self.cities.search_index.search(query, limit))
+
+    def hotel_rows(self, city_code):
+        """
+        Return the hotel rows of a city.
+
+        Args:
+            city_code (str): The code of the city.
+
+        Returns:
+            range: The rows in the HotelTable, empty if the city does not exist.
+        """
+        city_row = self.cities.row_by_code.get(city_code)
+        if city_row is None:
+            return range(0)
+        return range(self.hotels.starts[city_row], self.hotels.ends[city_row])
+
+    def hotels_json(self, city_code):
+        """
+        Return the hotels of a city as an encoded JSON array, ordered by name.
+
+        The body of a city is rendered on first request and kept for the lifetime of the
+        snapshot.
+
+        Args:
+            city_code (str): The code of the city.
+
+        Returns:
+            bytes: The JSON array (a CachedBody), empty if the city does not exist.
+        """
+        body = self._hotels_json.get(city_code)
+        record_cache('body', body is not None)
+        if body is None:
+            rows = self.hotel_rows(city_code)
+            if not rows:
+                return b'[]'
+            codes, names = self.hotels.codes, self.hotels.names
+            quoted_city_code = quote(city_code)
+            body = CachedBody(json_array(hotel_fragment(codes[row], names[row], quoted_city_code) for row in rows))
+            self._hotels_json[city_code] = body
+        return body
@@ -0,0 +1,191 @@
+"""
+Module: changelog
+
+Append-only change-log of the catalog, for mirrors that sync incrementally.
+
+Every insert, update and delete of a city or hotel appends a row to ``hotels_change_log``
+with a monotonically increasing version (an AUTOINCREMENT key, which SQLite never reuses).
+The rows are written by triggers, created after migrations like the other derived data
+(see ``hotels.fulltext``), so bulk imports, ``QuerySet.update`` and ``clear_db`` are
+recorded as well.
+
+Each entry carries the public representation of the row after the change (city:
+code and name; hotel: code, name and city code), so a mirror applies it without reading
+anything else. A change of code is recorded as a delete of the old code followed by an
+insert of the new one, because mirrors identify rows by code.
+
+When the log is created, it is seeded with an insert for every existing city and hotel, so
+a mirror that syncs from version 0 receives the whole catalog.
+
+The last version of each kind is also the data version of the in-process catalog (see
+``hotels.catalog``): it lives in the database, so every process sees the writes of the others.
+
+Functions:
+    - install: Create the log table and its triggers.
+    - latest_version: The version of the last recorded change.
+    - kind_versions: The version of the last change of a city and of a hotel.
+    - changes_since: A page of changes after a given version.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, connections, router
+
+from .models import Hotel
+
+LOG_TABLE = 'hotels_change_log'
+
+_CREATE_TABLE = f"""
+    CREATE TABLE {LOG_TABLE} (
+        version INTEGER PRIMARY KEY AUTOINCREMENT,
+        kind TEXT NOT NULL,
+        op TEXT NOT NULL,
+        code TEXT NOT NULL,
+        name TEXT,
+        city_code TEXT
+    )
+"""
+
+# The last change of a kind is found without reading the changes of the other kind.
+_CREATE_INDEX = f'CREATE INDEX IF NOT EXISTS {LOG_TABLE}_kind ON {LOG_TABLE} (kind, version)'
+
+_SEED = (
+    f"INSERT INTO {LOG_TABLE} (kind, op, code, name) SELECT 'city', 'insert', code, name FROM hotels_city ORDER BY id",
+    f"""
+    INSERT INTO {LOG_TABLE} (kind, op, code, name, city_code)
+    SELECT 'hotel', 'insert', h.code, h.name, c.code FROM hotels_hotel h JOIN hotels_city c ON c.id = h.city_id
+    ORDER BY h.id
+    """,
+)
+
+
+def _log(kind, op, row):
+    # The columns recorded for a row ("new" or "old") of the given kind.
+    if op == 'delete':
+        return f"INSERT INTO {LOG_TABLE} (kind, op, code) VALUES ('{kind}', 'delete', {row}.code);"
+    if kind == 'city':
+        return f"INSERT INTO {LOG_TABLE} (kind, op, code, name) VALUES ('city', '{op}', {row}.code, {row}.name);"
+    # Read the city code from the city: a new row may not carry its city_code yet.
+    return (
+        f"INSERT INTO {LOG_TABLE} (kind, op, code, name, city_code) "
+        f"SELECT 'hotel', '{op}', {row}.code, {row}.name, code FROM hotels_city WHERE id = {row}.city_id;"
+    )
+
+
+def _triggers(kind, table, columns, changed):
+    prefix = f'{LOG_TABLE}_{kind}'
+    return (
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_insert AFTER INSERT ON {table} BEGIN
+            {_log(kind, 'insert', 'new')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_update AFTER UPDATE OF {', '.join(columns)} ON {table}
+        WHEN old.code = new.code AND ({changed}) BEGIN
+            {_log(kind, 'update', 'new')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_recode AFTER UPDATE OF code ON {table}
+        WHEN old.code != new.code BEGIN
+            {_log(kind, 'delete', 'old')}
+            {_log(kind, 'insert', 'new')}
+        END
+        """,
+        f"""
+        CREATE TRIGGER IF NOT EXISTS {prefix}_delete AFTER DELETE ON {table} BEGIN
+            {_log(kind, 'delete', 'old')}
+        END
+        """,
+    )
+
+
+# Updates are logged only if a public field actually changed, since save() writes every
+# column. The city code of a hotel changes with city_id, or when its city gets a new code
+# (applied to city_code by the denormalization triggers). Filling in the empty city_code of
+# a new row is not a change.
+_TRIGGERS = _triggers(
+    'city', 'hotels_city', ('code', 'name'),
+    'old.name IS NOT new.name',
+) + _triggers(
+    'hotel', 'hotels_hotel', ('code', 'name', 'city_id', 'city_code'),
+    "old.name IS NOT new.name OR old.city_id IS NOT new.city_id"
+    " OR (old.city_code IS NOT new.city_code AND old.city_code != '')",
+)
+
+_KIND_VERSIONS = f"""
+    SELECT (SELECT COALESCE(MAX(version), 0) FROM {LOG_TABLE} WHERE kind = 'city'),
+           (SELECT COALESCE(MAX(version), 0) FROM {LOG_TABLE} WHERE kind = 'hotel')
+"""
+
+_CHANGES = f"""
+    SELECT version, kind, op, code, name, city_code FROM {LOG_TABLE}
+    WHERE version > %s ORDER BY version LIMIT %s
+"""
+
+
+def install(using=DEFAULT_DB_ALIAS):
+    """
+    Create the log table and its triggers if they do not exist yet.
+
+    A newly created log is seeded with the current catalog. Does nothing on other backends.
+
+    Args:
+        using (str): The database alias.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [LOG_TABLE])
+        if cursor.fetchone() is None:
+            cursor.execute(_CREATE_TABLE)
+            for statement in _SEED:
+                cursor.execute(statement)
+        cursor.execute(_CREATE_INDEX)
+        for trigger in _TRIGGERS:
+            cursor.execute(trigger)
+
+
+def latest_version(using=None):
+    """
+    Return the version of the last recorded change (0 if there is none).
+    """
+    using = using or router.db_for_read(Hotel)
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'SELECT COALESCE(MAX(version), 0) FROM {LOG_TABLE}')
+        return cursor.fetchone()[0]
+
+
+def kind_versions(using=None):
+    """
+    Return the versions of the last recorded change of a city and of a hotel.
+
+    Args:
+        using (str): The database alias. Defaults to the alias hotels are read from.
+
+    Returns:
+        tuple: The (city, hotel) versions; 0 for a kind without changes.
+    """
+    using = using or router.db_for_read(Hotel)
+    with connections[using].cursor() as cursor:
+        cursor.execute(_KIND_VERSIONS)
+        return cursor.fetchone()
+
+
+def changes_since(version, limit, using=None):
+    """
+    Return the changes recorded after a version, oldest first.
+
+    Args:
+        version (int): The last version the caller has applied.
+        limit (int): Maximum number of changes.
+        using (str): The database alias. Defaults to the alias hotels are read from.
+
+    Returns:
+        list: (version, kind, op, code, name, city code) tuples; name is None for deletes
+            and city code is None for cities and deletes.
+    """
+    using = using or router.db_for_read(Hotel)
+    with connections[using].cursor() as cursor:
+        cursor.execute(_CHANGES, [version, limit])
+        return cursor.fetchall()
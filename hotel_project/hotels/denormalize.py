@@ -0,0 +1,80 @@
+"""
+Module: denormalize
+
+Keeps ``Hotel.city_code``, a copy of the code of the hotel's city, consistent.
+
+``Hotel.save()`` copies the code of the assigned city. Writes that bypass ``save()``
+(``bulk_create``, ``QuerySet.update``, raw SQL) and changes of a city's code are covered by
+triggers on ``hotels_hotel`` and ``hotels_city``, created after migrations like the other
+derived tables (see ``hotels.fulltext`` and ``hotels.summary``). The hotel triggers only
+write when the copy is actually wrong, so inserts that already carry the right code (the
+importers, ``save()``) cost one primary-key lookup of the city.
+
+On other database backends, ``sync_city_code()`` is called when a city is saved.
+
+Functions:
+    - install: Create the triggers and repair every stale copy.
+    - sync_city_code: Copy a city's code to its hotels (backends without the triggers).
+"""
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+from .models import Hotel
+
+_CITY_CODE = '(SELECT code FROM hotels_city WHERE id = {}.city_id)'
+
+_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS hotels_hotel_city_code_insert AFTER INSERT ON hotels_hotel
+    WHEN new.city_code IS NOT {_CITY_CODE.format('new')} BEGIN
+        UPDATE hotels_hotel SET city_code = {_CITY_CODE.format('new')} WHERE id = new.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS hotels_hotel_city_code_update AFTER UPDATE OF city_id, city_code ON hotels_hotel
+    WHEN new.city_code IS NOT {_CITY_CODE.format('new')} BEGIN
+        UPDATE hotels_hotel SET city_code = {_CITY_CODE.format('new')} WHERE id = new.id;
+    END
+    """,
+    """
+    CREATE TRIGGER IF NOT EXISTS hotels_city_code_update AFTER UPDATE OF code ON hotels_city BEGIN
+        UPDATE hotels_hotel SET city_code = new.code WHERE city_id = new.id;
+    END
+    """,
+)
+
+_REPAIR = f"""
+    UPDATE hotels_hotel SET city_code = {_CITY_CODE.format('hotels_hotel')}
+    WHERE city_code IS NOT {_CITY_CODE.format('hotels_hotel')}
+"""
+
+
+def install(using=DEFAULT_DB_ALIAS):
+    """
+    Create the triggers if they do not exist yet and repair every stale ``city_code``.
+
+    Does nothing on other backends.
+
+    Args:
+        using (str): The database alias.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return
+    with connection.cursor() as cursor:
+        for trigger in _TRIGGERS:
+            cursor.execute(trigger)
+        cursor.execute(_REPAIR)
+
+
+def sync_city_code(city, using=DEFAULT_DB_ALIAS):
+    """
+    Copy the code of a city to its hotels, where the triggers do not.
+
+    Args:
+        city (City): The saved city.
+        using (str): The database alias.
+    """
+    if connections[using].vendor == 'sqlite':
+        return
+    Hotel.objects.using(using).filter(city=city).exclude(city_code=city.code).update(city_code=city.code)
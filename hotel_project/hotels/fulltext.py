@@ -0,0 +1,288 @@
+"""
+Module: fulltext
+
+Indexed full-text search of hotels, built on an SQLite FTS5 virtual table.
+
+The table ``hotels_hotel_fts`` holds one row per hotel (``rowid`` is the hotel id) with the
+hotel name, the hotel code and the name of its city. It is created after migrations (see
+``HotelsConfig.ready``) and kept in sync by triggers on ``hotels_hotel`` and
+``hotels_city``, so every write path is covered, including ``bulk_create`` and
+``QuerySet.update`` which bypass model signals. The importers insert hotels in batches
+within ``deferred_indexing()``, which indexes a whole batch with one statement: feeding
+FTS5 one row at a time from the trigger costs several times more.
+
+Matching is case- and accent-insensitive and every word of the query is a prefix, so
+``"ams hot"`` finds "Amstel Hotel" in Amsterdam. Prefixes of up to five characters are
+indexed, so short prefixes that match much of the table are read incrementally instead
+of merging the posting lists of every matching word.
+
+Results are ranked by where the words match: an exact hotel code first, then an exact hotel
+name, then hotels whose name matches more of the words, then by name. The exact codes and
+names are looked up by index; the other candidates are the RANK_CANDIDATES best matches by
+BM25, weighing a match in the name above one in the code and in the city name. BM25 scores
+every matching hotel, so a query costs time proportional to the number of hotels it
+matches: a selective query stays fast however large the table, while a word common to every
+hotel, such as "hotel", costs tens of milliseconds per 100 000 hotels.
+
+On other database backends, or SQLite builds without FTS5, ``is_available()`` is false:
+``search_hotels`` then falls back to substring lookups and the admin to its default search.
+
+Functions:
+    - install: Create the FTS table, its triggers and the name index, filling it when it is new.
+    - is_available: Whether the FTS table exists on a database.
+    - deferred_indexing: Index the hotels inserted in a block at once.
+    - match_query: Translate user input into an FTS5 query.
+    - search_hotels: Ranked (code, name, city code) rows of the hotels matching a query.
+    - matching_ids_sql: SQL selecting the ids of matching hotels, for use in a filter.
+"""
+
+import heapq
+import re
+from contextlib import contextmanager
+
+from django.db import DEFAULT_DB_ALIAS, OperationalError, connections, router, transaction
+from django.db.models import Q
+
+from .models import Hotel
+from .search import fold
+
+FTS_TABLE = 'hotels_hotel_fts'
+# While it holds a row, the insert trigger leaves new hotels to deferred_indexing().
+DEFERRED_TABLE = 'hotels_hotel_fts_deferred'
+# Maximum number of matches that are ranked per query, best by BM25 first.
+RANK_CANDIDATES = 500
+# BM25 weights of the name, code and city name columns.
+RANK_WEIGHTS = (10.0, 5.0, 1.0)
+
+_WORD = re.compile(r'\w+')
+
+_CREATE_TABLE = f"""
+    CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(
+        name, code, city_name,
+        tokenize = 'unicode61 remove_diacritics 2',
+        prefix = '1 2 3 4 5'
+    )
+"""
+
+_INDEX_HOTELS = f"""
+    INSERT INTO {FTS_TABLE} (rowid, name, code, city_name)
+    SELECT h.id, h.name, h.code, c.name FROM hotels_hotel h JOIN hotels_city c ON c.id = h.city_id
+"""
+
+_CREATE_DEFERRED_TABLE = f'CREATE TABLE IF NOT EXISTS {DEFERRED_TABLE} (id INTEGER PRIMARY KEY)'
+
+_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_insert AFTER INSERT ON hotels_hotel
+    WHEN NOT EXISTS (SELECT 1 FROM {DEFERRED_TABLE}) BEGIN
+        INSERT INTO {FTS_TABLE} (rowid, name, code, city_name)
+        SELECT new.id, new.name, new.code, name FROM hotels_city WHERE id = new.city_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_update AFTER UPDATE OF name, code, city_id ON hotels_hotel BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+        INSERT INTO {FTS_TABLE} (rowid, name, code, city_name)
+        SELECT new.id, new.name, new.code, name FROM hotels_city WHERE id = new.city_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_delete AFTER DELETE ON hotels_hotel BEGIN
+        DELETE FROM {FTS_TABLE} WHERE rowid = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {FTS_TABLE}_city_rename AFTER UPDATE OF name ON hotels_city BEGIN
+        UPDATE {FTS_TABLE} SET city_name = new.name
+        WHERE rowid IN (SELECT id FROM hotels_hotel WHERE city_id = new.id);
+    END
+    """,
+)
+
+# Exact name lookups of the search, which FTS5 cannot express.
+_NAME_INDEX = 'CREATE INDEX IF NOT EXISTS hotels_hotel_name_nocase ON hotels_hotel (name COLLATE NOCASE)'
+
+# The RANK_CANDIDATES best matches by BM25 are ranked. The hotels that rank first, with a
+# word as code or the query as name, are looked up on their own, so they are found whatever
+# their BM25 score.
+_CANDIDATES = f"""
+    SELECT h.code, h.name, h.city_code FROM hotels_hotel h
+    WHERE h.code IN ({{codes}}) AND EXISTS (SELECT 1 FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = h.id)
+    UNION ALL
+    SELECT * FROM (
+        SELECT code, name, city_code FROM hotels_hotel WHERE name = %s COLLATE NOCASE LIMIT {RANK_CANDIDATES}
+    ) AS e
+    UNION ALL
+    SELECT h.code, h.name, h.city_code
+    FROM (
+        SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s
+        ORDER BY bm25({FTS_TABLE}, {', '.join(map(str, RANK_WEIGHTS))}) LIMIT {RANK_CANDIDATES}
+    ) AS m
+    JOIN hotels_hotel h ON h.id = m.rowid
+"""
+
+# Aliases on which the FTS table is known to exist.
+_available = set()
+
+
+def _table_exists(cursor):
+    cursor.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = %s", [FTS_TABLE])
+    return cursor.fetchone() is not None
+
+
+def install(using=DEFAULT_DB_ALIAS):
+    """
+    Create the FTS table and its triggers if they do not exist yet.
+
+    A newly created table is filled from the existing hotels, and an existing one is
+    rebuilt if its row count differs from the hotels table. Does nothing on other
+    backends or when SQLite was built without FTS5.
+
+    Args:
+        using (str): The database alias.
+
+    Returns:
+        bool: Whether full-text search is available on the database.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite':
+        return False
+    with connection.cursor() as cursor:
+        if not _table_exists(cursor):
+            try:
+                cursor.execute(_CREATE_TABLE)
+            except OperationalError:
+                return False
+            cursor.execute(_INDEX_HOTELS)
+        else:
+            # Hotels written while the triggers were dropped (during migrations) are missing.
+            cursor.execute(f'SELECT (SELECT COUNT(*) FROM hotels_hotel) != (SELECT COUNT(*) FROM {FTS_TABLE})')
+            if cursor.fetchone()[0]:
+                cursor.execute(f'DELETE FROM {FTS_TABLE}')
+                cursor.execute(_INDEX_HOTELS)
+        cursor.execute(_NAME_INDEX)
+        cursor.execute(_CREATE_DEFERRED_TABLE)
+        for trigger in _TRIGGERS:
+            cursor.execute(trigger)
+    _available.add(using)
+    return True
+
+
+def is_available(using=DEFAULT_DB_ALIAS):
+    """
+    Return whether the FTS table exists on the database.
+    """
+    if using not in _available:
+        connection = connections[using]
+        if connection.vendor != 'sqlite':
+            return False
+        with connection.cursor() as cursor:
+            if not _table_exists(cursor):
+                return False
+        _available.add(using)
+    return True
+
+
+@contextmanager
+def deferred_indexing(using=DEFAULT_DB_ALIAS):
+    """
+    Index the hotels inserted in the block with one statement when it ends, instead of one
+    by one from the insert trigger.
+
+    The block runs in a transaction, which writes and removes the row that turns the trigger
+    off: other connections never see it, and a failed block leaves nothing behind. Hotels
+    are told apart by their id, which only grows. Does nothing when full-text search is not
+    available.
+
+    Args:
+        using (str): The database alias hotels are written to.
+    """
+    if not is_available(using):
+        yield
+        return
+    # No savepoint: writes under one are many times slower with temp_store=memory (see
+    # hotels.pragmas), and a failed block is undone with the enclosing transaction anyway.
+    with transaction.atomic(using=using, savepoint=False), connections[using].cursor() as cursor:
+        # Written first, so that no other writer inserts a hotel after MAX(id) is read.
+        cursor.execute(f'INSERT INTO {DEFERRED_TABLE} DEFAULT VALUES')
+        cursor.execute('SELECT COALESCE(MAX(id), 0) FROM hotels_hotel')
+        # fetchall() finishes the statement: one left open on the table would slow down
+        # every insert of the block.
+        [(last_id,)] = cursor.fetchall()
+        yield
+        cursor.execute(f'{_INDEX_HOTELS} WHERE h.id > %s', [last_id])
+        cursor.execute(f'DELETE FROM {DEFERRED_TABLE}')
+
+
+def match_query(text):
+    """
+    Translate user input into an FTS5 query in which every word is a prefix.
+
+    Words are quoted, so FTS5 operators and punctuation in the input have no effect.
+
+    Args:
+        text (str): The search text.
+
+    Returns:
+        str: The FTS5 query, or None if the text contains no words.
+    """
+    words = _WORD.findall(fold(text))
+    if not words:
+        return None
+    return ' '.join(f'"{word}"*' for word in words)
+
+
+def search_hotels(text, limit, using=None):
+    """
+    Return the hotels matching a search text, best match first.
+
+    Args:
+        text (str): The search text.
+        limit (int): Maximum number of results.
+        using (str): The database alias. Defaults to the alias hotels are read from.
+
+    Returns:
+        list: (hotel code, hotel name, city code) tuples.
+    """
+    using = using or router.db_for_read(Hotel)
+    if not is_available(using):
+        words = text.split()
+        if not words:
+            return []
+        hotels = Hotel.objects.using(using)
+        for word in words:
+            hotels = hotels.filter(Q(name__icontains=word) | Q(code__icontains=word) | Q(city__name__icontains=word))
+        return list(hotels.order_by('name').values_list('code', 'name', 'city_code')[:limit])
+    query = match_query(text)
+    if query is None:
+        return []
+    words = _WORD.findall(fold(text))
+    codes = [word.upper() for word in words]
+    with connections[using].cursor() as cursor:
+        cursor.execute(_CANDIDATES.format(codes=', '.join(['%s'] * len(codes))), [*codes, query, ' '.join(text.split()), query])
+        # A hotel may come from several sources.
+        candidates = {row[0]: row for row in cursor.fetchall()}.values()
+
+    def rank(row):
+        code, name, _city_code = row
+        name_words = _WORD.findall(fold(name))
+        name_matches = sum(any(name_word.startswith(word) for name_word in name_words) for word in words)
+        return code.lower() not in words, name_words != words, -name_matches, name
+
+    return heapq.nsmallest(limit, candidates, key=rank)
+
+
+def matching_ids_sql(text):
+    """
+    Return SQL and parameters selecting the ids of the hotels matching a search text.
+
+    Args:
+        text (str): The search text.
+
+    Returns:
+        tuple: The SQL and its parameters, or None if the text contains no words.
+    """
+    query = match_query(text)
+    if query is None:
+        return None
+    return f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', (query,)
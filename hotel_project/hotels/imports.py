@@ -0,0 +1,417 @@
+"""
+Module: imports
+
+Coordination of the imports, so that only one of them writes at a time.
+
+import_csv (run by hand or by cron) and the admin CSV uploads write to the same SQLite
+database, which allows a single writer. Imports running side by side used to wait for each
+other's write transactions batch after batch, and failed with "database is locked" once the
+busy timeout ran out. Every import now takes the import lock first and holds it until it is
+done:
+    - The lock is an exclusive ``flock()`` on ``import.lock`` in HOTELS_IMPORT_DIR, shared by
+      every process of the host (SQLite is a local database). The operating system releases
+      it when its holder exits, even if the holder crashed.
+    - An import waiting for the lock is queued: it writes a ticket (what it imports, how
+      many rows, which process) to the ``queue`` directory, and removes it once it holds the
+      lock. The holder describes itself in ``holder.json``. ``status()`` reads both, and
+      ignores the holders and tickets of processes that no longer exist.
+    - Small uploads (at most HOTELS_IMPORT_COALESCE_ROWS rows) are coalesced: the uploads of
+      a kind waiting in the same process are validated and written together, as one batch
+      in one transaction (group commit). The first of them waits for the lock on behalf of
+      all, and writes the uploads that arrive while it holds it, up to MAX_GROUPS batches.
+      A batch that fails is written again upload by upload, so that only the upload at fault
+      fails. The leader then recounts the per-city statistics once, if rows were written,
+      and releases the lock, and the oldest upload still waiting leads the next hold, so no
+      request writes uploads indefinitely.
+
+Without ``fcntl`` (Windows) the lock only coordinates the threads of one process.
+
+Settings:
+    - HOTELS_IMPORT_DIR: Directory of the lock, the holder and the queue (default imports/).
+    - HOTELS_IMPORT_WAIT_SECONDS: How long an upload waits for the lock (default 30).
+    - HOTELS_IMPORT_COALESCE_ROWS: Uploads of at most this many rows are coalesced (default 200).
+
+Functions:
+    - writer: Context manager holding the import lock, queued until it is free.
+    - import_rows: Validate and write rows of cities or hotels under the import lock.
+    - status: The holder of the import lock and the queued imports.
+
+Classes:
+    - ImportBusy: Raised when the import lock was not acquired in time.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+from concurrent.futures import Future
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None
+
+from django.conf import settings
+
+from . import summary
+from .validation import BATCH_SIZE, batches, clean_city_rows, clean_hotel_rows, insert_city_rows, insert_hotel_rows
+
+WAIT_SECONDS = 30
+COALESCE_ROWS = 200
+# Batches of small uploads a leader writes under one hold of the lock before handing over.
+MAX_GROUPS = 5
+# Seconds between two attempts to take the lock, when waiting with a timeout.
+POLL_INTERVAL = 0.05
+LOCK_FILE = 'import.lock'
+HOLDER_FILE = 'holder.json'
+QUEUE_DIR = 'queue'
+
+# Kind of rows: (batch validator, batch writer), see hotels.validation.
+KINDS = {
+    'cities': (clean_city_rows, insert_city_rows),
+    'hotels': (clean_hotel_rows, insert_hotel_rows),
+}
+
+
+class ImportBusy(TimeoutError):
+    """
+    The import lock was not acquired in time: another import is still running.
+    """
+
+
+def import_dir():
+    """
+    Return the directory of the import lock, holder and queue.
+    """
+    return Path(getattr(settings, 'HOTELS_IMPORT_DIR', None) or Path(settings.BASE_DIR) / 'imports')
+
+
+def _process():
+    return {'pid': os.getpid(), 'host': socket.gethostname()}
+
+
+def _alive(info):
+    """
+    Return whether the process that wrote a holder or a ticket still exists.
+    """
+    if fcntl is None or info.get('host') != socket.gethostname():
+        return True
+    try:
+        os.kill(info['pid'], 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _read(path):
+    try:
+        return json.loads(path.read_text())
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def _write(path, data):
+    # Written aside and renamed, so that status() never reads half a file.
+    temporary = path.with_name(f'.{path.name}.tmp')
+    temporary.write_text(json.dumps(data))
+    os.replace(temporary, path)
+
+
+def _enqueue(label, rows):
+    """
+    Write the ticket of an import waiting for the lock, and return its path.
+    """
+    directory = import_dir() / QUEUE_DIR
+    directory.mkdir(parents=True, exist_ok=True)
+    # The names start with the time, so they sort by arrival.
+    path = directory / f'{time.time():017.6f}-{uuid.uuid4().hex[:8]}.json'
+    _write(path, {'label': label, 'rows': rows, 'queued': datetime.now().isoformat(timespec='seconds'), **_process()})
+    return path
+
+
+def _set_holder(label, rows):
+    _write(import_dir() / HOLDER_FILE,
+           {'label': label, 'rows': rows, 'started': datetime.now().isoformat(timespec='seconds'), **_process()})
+
+
+def _busy_message():
+    holder = status()['holder']
+    if holder is None:
+        return 'Another import is running'
+    return f"Another import is running: {holder['label']} (pid {holder['pid']}, since {holder['started']})"
+
+
+_local_lock = threading.Lock()
+
+
+@contextmanager
+def _locked(timeout):
+    """
+    Hold the import lock for the duration of a block.
+
+    Args:
+        timeout (float): Seconds to wait for the lock, or None to wait as long as it takes.
+
+    Raises:
+        ImportBusy: If the lock was not acquired in time.
+    """
+    directory = import_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    if fcntl is None:
+        if not _local_lock.acquire(timeout=-1 if timeout is None else timeout):
+            raise ImportBusy(_busy_message())
+        try:
+            yield
+        finally:
+            (directory / HOLDER_FILE).unlink(missing_ok=True)
+            _local_lock.release()
+        return
+
+    with open(directory / LOCK_FILE, 'a') as lock_file:
+        if timeout is None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        else:
+            deadline = time.monotonic() + timeout
+            while True:
+                try:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                    break
+                except BlockingIOError:
+                    if time.monotonic() >= deadline:
+                        raise ImportBusy(_busy_message()) from None
+                    time.sleep(POLL_INTERVAL)
+        try:
+            yield
+        finally:
+            (directory / HOLDER_FILE).unlink(missing_ok=True)
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+@contextmanager
+def writer(label, rows=None, timeout=None):
+    """
+    Hold the import lock for the duration of a block, queued until it is free.
+
+    Args:
+        label (str): What is imported, shown by status(), e.g. the command line.
+        rows (int): The number of rows imported, if known.
+        timeout (float): Seconds to wait for the lock, or None to wait as long as it takes.
+
+    Raises:
+        ImportBusy: If the lock was not acquired in time.
+    """
+    ticket = _enqueue(label, rows)
+    try:
+        with _locked(timeout):
+            ticket.unlink(missing_ok=True)
+            _set_holder(label, rows)
+            yield
+    finally:
+        ticket.unlink(missing_ok=True)
+
+
+def status():
+    """
+    Return the holder of the import lock and the queued imports, for every process of the host.
+
+    Returns:
+        dict: ``holder``: the label, rows, start time, pid and host of the running import, or
+            None. ``queue``: the waiting imports, oldest first, with their label, rows, queue
+            time, pid and host. ``queued_rows``: the number of rows they import, where known.
+    """
+    directory = import_dir()
+    holder = _read(directory / HOLDER_FILE)
+    if holder is not None and not _alive(holder):
+        holder = None
+    queue = []
+    for path in sorted((directory / QUEUE_DIR).glob('*.json')):
+        ticket = _read(path)
+        if ticket is None:
+            continue
+        if not _alive(ticket):
+            path.unlink(missing_ok=True)
+            continue
+        queue.append(ticket)
+    return {'holder': holder, 'queue': queue, 'queued_rows': sum(ticket['rows'] or 0 for ticket in queue)}
+
+
+class _Upload:
+    """
+    A small upload waiting to be written with the others of its kind.
+    """
+
+    def __init__(self, rows, ticket):
+        self.rows = rows
+        self.ticket = ticket
+        self.future = Future()
+        # Set when the upload is written (or failed), or when it is to lead the next hold.
+        self.turn = threading.Event()
+        self.future.add_done_callback(lambda future: self.turn.set())
+
+
+_pending = defaultdict(list)
+_leaders = set()
+_pending_lock = threading.Lock()
+
+
+def _take(kind):
+    """
+    Remove the oldest pending uploads of a kind that fit in a batch (at least one, if any).
+    """
+    with _pending_lock:
+        pending = _pending[kind]
+        count = size = 0
+        while count < len(pending) and (not count or size + len(pending[count].rows) <= BATCH_SIZE):
+            size += len(pending[count].rows)
+            count += 1
+        group = pending[:count]
+        del pending[:count]
+    return group
+
+
+def _write_group(kind, group):
+    """
+    Validate and write a group of uploads as one batch.
+
+    Returns:
+        list: The (rows written, rejected rows) of every upload of the group.
+    """
+    clean, insert = KINDS[kind]
+    # The row numbers carry the upload, so that the results can be told apart.
+    rows = [((index, number), *fields) for index, upload in enumerate(group) for number, *fields in upload.rows]
+    valid, rejected = clean(rows)
+    insert(valid)
+    imported = Counter(index for (index, _number), *_fields in valid)
+    rejections = defaultdict(list)
+    for (index, number), message in rejected:
+        rejections[index].append((number, message))
+    return [(imported[index], rejections[index]) for index in range(len(group))]
+
+
+def _write_uploads(kind, group):
+    """
+    Write a group of uploads as one batch, or one by one if the batch fails, so that only the
+    upload that makes it fail gets the error.
+
+    Returns:
+        list: The (rows written, rejected rows) of every upload of the group, or the
+            exception that failed it.
+    """
+    try:
+        return _write_group(kind, group)
+    except Exception as error:
+        if len(group) == 1:
+            return [error]
+    results = []
+    for upload in group:
+        try:
+            results += _write_group(kind, [upload])
+        except Exception as error:
+            results.append(error)
+    return results
+
+
+def _lead(kind, timeout):
+    """
+    Take the lock, write up to MAX_GROUPS groups of pending uploads of a kind, and recount the
+    statistics if rows were written; then hand the lead over to the oldest upload still
+    pending, if any.
+    """
+    group, written = [], []
+    try:
+        with _locked(timeout):
+            for _ in range(MAX_GROUPS):
+                group = _take(kind)
+                if not group:
+                    break
+                for upload in group:
+                    upload.ticket.unlink(missing_ok=True)
+                _set_holder(f'{kind} uploads', sum(len(upload.rows) for upload in group))
+                written.append((group, _write_uploads(kind, group)))
+                group = []
+            if any(not isinstance(result, Exception) and result[0] for _group, results in written for result in results):
+                summary.refresh()
+    except BaseException as error:
+        # The lock was not acquired, the statistics were not recounted, or the leader was
+        # interrupted: fail the uploads of this hold and every waiting upload.
+        with _pending_lock:
+            waiting = _pending.pop(kind, [])
+            _leaders.discard(kind)
+        for upload in [*group, *(upload for group, _results in written for upload in group), *waiting]:
+            upload.ticket.unlink(missing_ok=True)
+            if not upload.future.done():
+                upload.future.set_exception(error)
+        return
+    for group, results in written:
+        for upload, result in zip(group, results):
+            if isinstance(result, Exception):
+                upload.future.set_exception(result)
+            else:
+                upload.future.set_result(result)
+    # Leadership passes on once the lock is released, so that the next leader does not wait
+    # for it; the uploads that arrived in the meantime are written under a new hold.
+    with _pending_lock:
+        pending = _pending[kind]
+        if pending:
+            pending[0].turn.set()
+        else:
+            _leaders.discard(kind)
+
+
+def import_rows(kind, rows, label, timeout=None):
+    """
+    Validate and write rows of cities or hotels under the import lock.
+
+    Uploads of at most HOTELS_IMPORT_COALESCE_ROWS rows are coalesced with the other small
+    uploads of the process; larger ones hold the lock for all of their batches. The per-city
+    statistics are recounted (see ``hotels.summary``) once per hold, before the lock is released.
+
+    Args:
+        kind (str): 'cities' or 'hotels'.
+        rows (list): The parsed rows: (row number, code, name) tuples for cities, (row number,
+            city code, hotel code, name) tuples for hotels.
+        label (str): What is imported, shown by status().
+        timeout (float): Seconds to wait for the lock. Defaults to HOTELS_IMPORT_WAIT_SECONDS.
+
+    Returns:
+        tuple: The number of rows written, and the rejected rows as (row number, message)
+            tuples in input order.
+
+    Raises:
+        ImportBusy: If the lock was not acquired in time.
+    """
+    if not rows:
+        return 0, []
+    if timeout is None:
+        timeout = getattr(settings, 'HOTELS_IMPORT_WAIT_SECONDS', WAIT_SECONDS)
+    if len(rows) <= getattr(settings, 'HOTELS_IMPORT_COALESCE_ROWS', COALESCE_ROWS):
+        upload = _Upload(rows, _enqueue(label, len(rows)))
+        with _pending_lock:
+            _pending[kind].append(upload)
+            if kind not in _leaders:
+                _leaders.add(kind)
+                upload.turn.set()
+        upload.turn.wait()
+        if not upload.future.done():
+            # The first upload of a kind, or the oldest one left by the previous leader.
+            _lead(kind, timeout)
+        return upload.future.result()
+
+    clean, insert = KINDS[kind]
+    imported, rejected = 0, []
+    with writer(label, len(rows), timeout):
+        for batch in batches(rows):
+            valid, batch_rejected = clean(batch)
+            insert(valid)
+            imported += len(valid)
+            rejected.extend(batch_rejected)
+        summary.refresh()
+    return imported, rejected
@@ -0,0 +1,251 @@
+"""
+Module: ingest
+
+Bulk ingestion of cities and hotels pushed by partners (see ``api_views.ingest``).
+
+The body is one of:
+    - NDJSON (``application/x-ndjson``): one object per line, in the representation of the
+      read API (see ``hotels.renderers``): ``{"code": "AMS", "name": "Amsterdam"}`` is a
+      city, ``{"code": "AMS01", "name": "Hotel", "city": "AMS"}`` a hotel. The hotel export
+      (``?output=ndjson``) can be ingested as it is.
+    - ``;``-separated CSV (``text/csv``), without a header or quoting, as in the CSV files of
+      import_csv: ``CITY_CODE;NAME`` is a city, ``CITY_CODE;HOTEL_CODE;NAME`` a hotel.
+
+Cities and hotels may be mixed, and a hotel may refer to a city sent earlier in the same
+body. The body is read in chunks and parsed line by line as it arrives (``read_lines``), so
+memory use depends on the batch size, not on the size of the body. Rows are collected per
+category and written in batches of BATCH_SIZE rows by the import engine: validated
+set-wise and inserted in bulk (see ``hotels.validation``), each batch in one transaction
+under the import lock (see ``hotels.imports``), so that other imports interleave with a long
+ingest instead of waiting for all of it. Pending cities are written before any hotel batch.
+An ingest runs in a process that serves the API, so it keeps the ``serving`` connection
+profile (WAL, ``synchronous=NORMAL``, see ``hotels.pragmas``); the ``bulk_import`` profile
+is left to import_csv.
+
+Throughput is bounded by the database, while the parsers read a few hundred thousand lines
+per second. The commit of a batch writes every index page the batch touched, about as many
+for 1000 rows as for 10000, so ingest batches are ten times those of the other importers, and
+the hotels of a batch are added to the full-text table in one statement (see
+``fulltext.deferred_indexing``). ``python manage.py benchmark ingest`` measures it: on one
+core, with 100 000 hotels, about 12 000 hotel rows per second through the endpoint.
+
+Functions:
+    - read_lines: Split a byte stream into lines, reading it in chunks.
+    - parse_ndjson: Parse NDJSON lines into rows.
+    - parse_csv: Parse ``;``-separated lines into rows.
+
+Classes:
+    - Ingest: Write parsed rows in batches and summarise the result per category.
+"""
+
+import json
+import time
+
+from django.conf import settings
+
+from . import imports, summary
+
+# Rows per batch and category, each written in one transaction under the import lock.
+BATCH_SIZE = 10000
+# Bytes read from the request stream at a time.
+CHUNK_SIZE = 64 * 1024
+# Longer lines are rejected without being buffered.
+MAX_LINE_LENGTH = 64 * 1024
+# Rejected rows listed per category in the summary; the others are only counted.
+MAX_ERRORS = 100
+CATEGORIES = ('cities', 'hotels', 'invalid')
+
+
+def read_lines(stream, chunk_size=CHUNK_SIZE, max_line_length=MAX_LINE_LENGTH):
+    """
+    Yield the lines of a byte stream, reading it ``chunk_size`` bytes at a time.
+
+    Args:
+        stream: A file-like object with ``read(size)``, e.g. the request.
+        chunk_size (int): Bytes per read.
+        max_line_length (int): Longest line kept, in bytes.
+
+    Yields:
+        bytes: Every line, without its line break; None for a line longer than
+            ``max_line_length``, which is skipped.
+    """
+    pending = b''
+    skipping = False
+    while chunk := stream.read(chunk_size):
+        lines = (pending + chunk).split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            if skipping:
+                skipping = False
+            elif len(line) > max_line_length:
+                yield None
+            else:
+                yield line
+        if len(pending) > max_line_length:
+            if not skipping:
+                yield None
+            pending = b''
+            skipping = True
+    if pending and not skipping:
+        yield pending
+
+
+def parse_ndjson(lines):
+    """
+    Parse NDJSON lines into rows.
+
+    Yields:
+        tuple: (category, line number, fields): ('cities', number, (code, name)),
+            ('hotels', number, (city code, hotel code, name)), or ('invalid', number,
+            error message). Blank lines are skipped.
+    """
+    for number, line in enumerate(lines, start=1):
+        if line is None:
+            yield 'invalid', number, 'Line too long'
+            continue
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except ValueError:
+            yield 'invalid', number, 'Invalid JSON'
+            continue
+        if not isinstance(record, dict) or not isinstance(record.get('code'), str) or not isinstance(record.get('name'), str):
+            yield 'invalid', number, 'Expected an object with a code and a name'
+        elif 'city' not in record:
+            yield 'cities', number, (record['code'], record['name'])
+        elif isinstance(record['city'], str):
+            yield 'hotels', number, (record['city'], record['code'], record['name'])
+        else:
+            yield 'invalid', number, 'The city of a hotel must be a city code'
+
+
+def parse_csv(lines):
+    """
+    Parse ``;``-separated lines into rows: two columns are a city, three a hotel.
+
+    Yields:
+        tuple: (category, line number, fields), as parse_ndjson().
+    """
+    for number, line in enumerate(lines, start=1):
+        if line is None:
+            yield 'invalid', number, 'Line too long'
+            continue
+        try:
+            line = line.decode('utf-8').strip()
+        except UnicodeDecodeError:
+            yield 'invalid', number, 'Invalid UTF-8'
+            continue
+        if not line:
+            continue
+        fields = line.split(';')
+        if len(fields) == 2:
+            yield 'cities', number, fields
+        elif len(fields) == 3:
+            yield 'hotels', number, fields
+        else:
+            yield 'invalid', number, f'Expected 2 columns (city) or 3 columns (hotel), found {len(fields)}'
+
+
+class CategoryResult:
+    """
+    The rows of one category: received, written and rejected, with the first errors.
+    """
+
+    def __init__(self):
+        self.received = 0
+        self.imported = 0
+        self.rejected = 0
+        self.errors = []
+
+    def reject(self, rows):
+        self.rejected += len(rows)
+        for number, message in rows[:MAX_ERRORS - len(self.errors)]:
+            self.errors.append({'line': number, 'error': message})
+
+    def as_dict(self):
+        return {'received': self.received, 'imported': self.imported, 'rejected': self.rejected, 'errors': self.errors}
+
+
+class Ingest:
+    """
+    Write parsed rows in batches under the import lock, and summarise the result per category.
+
+    Usage::
+
+        ingest = Ingest('API ingest by partner')
+        ingest.run(parse_ndjson(read_lines(request)))
+        ingest.summary()
+
+    Args:
+        label (str): What is ingested, shown by ``imports.status()``.
+        timeout (float): Seconds each batch waits for the import lock. Defaults to
+            HOTELS_IMPORT_WAIT_SECONDS.
+        batch_size (int): Rows per batch and category.
+    """
+
+    def __init__(self, label, timeout=None, batch_size=BATCH_SIZE):
+        self.label = label
+        self.timeout = timeout if timeout is not None else getattr(settings, 'HOTELS_IMPORT_WAIT_SECONDS', imports.WAIT_SECONDS)
+        self.batch_size = batch_size
+        self.results = {category: CategoryResult() for category in CATEGORIES}
+        self.pending = {kind: [] for kind in imports.KINDS}
+        self.started = time.perf_counter()
+
+    def run(self, rows):
+        """
+        Write the rows of an iterable as they come, then the incomplete batches.
+
+        Args:
+            rows (iterable): (category, line number, fields) tuples, see parse_ndjson().
+
+        Raises:
+            ImportBusy: If a batch did not get the import lock in time. The batches written
+                before stay written, and are counted in the summary.
+        """
+        for category, number, fields in rows:
+            result = self.results[category]
+            result.received += 1
+            if category == 'invalid':
+                result.reject([(number, fields)])
+                continue
+            pending = self.pending[category]
+            pending.append((number, *fields))
+            if len(pending) >= self.batch_size:
+                if category == 'hotels':
+                    # The hotels of the batch may belong to cities that are still pending.
+                    self.flush('cities')
+                self.flush(category)
+        self.flush('cities')
+        self.flush('hotels')
+        if self.results['cities'].imported or self.results['hotels'].imported:
+            # Repair the per-city statistics, as the other importers do when they finish.
+            with imports.writer(self.label, timeout=self.timeout):
+                summary.refresh()
+
+    def flush(self, kind):
+        """
+        Validate and write the pending rows of a kind, under the import lock.
+        """
+        rows = self.pending[kind]
+        if not rows:
+            return
+        clean, insert = imports.KINDS[kind]
+        with imports.writer(self.label, len(rows), self.timeout):
+            valid, rejected = clean(rows)
+            insert(valid)
+        self.pending[kind] = []
+        self.results[kind].imported += len(valid)
+        self.results[kind].reject(rejected)
+
+    def summary(self):
+        """
+        Return the result per category, the duration, and the rows received per second.
+        """
+        seconds = time.perf_counter() - self.started
+        received = sum(result.received for result in self.results.values())
+        return {
+            **{category: result.as_dict() for category, result in self.results.items()},
+            'seconds': round(seconds, 3),
+            'rows_per_second': round(received / seconds) if seconds else 0,
+        }
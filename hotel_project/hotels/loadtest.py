@@ -0,0 +1,295 @@
+"""
+Module: loadtest
+
+Local HTTP load generation for benchmarks.
+
+The module starts the project under a real application server in a subprocess and drives
+it with many concurrent keep-alive clients implemented on plain asyncio streams, so no
+external service or extra HTTP client library is needed.
+
+Servers:
+    - wsgi: gunicorn with the threaded (gthread) worker and the sync DRF views.
+    - asgi-sync: uvicorn with the sync DRF views (each request is run in a worker thread).
+    - asgi: uvicorn with the native async views (see ``hotels.async_views``).
+
+Functions:
+    - run_server: Context manager that runs a server against a given database file.
+    - drive: Run concurrent keep-alive clients against a server and collect latencies.
+    - summarize: Throughput, latency percentiles and error rate per endpoint of a run.
+    - compare: The regressions of a run against a baseline run.
+
+Classes:
+    - EndpointStats: Latency samples and error count of one endpoint.
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+
+SERVERS = ('wsgi', 'asgi-sync', 'asgi')
+PERCENTILES = (('p50', 0.50), ('p95', 0.95), ('p99', 0.99))
+# Latency increases below this many milliseconds are jitter, whatever their ratio.
+LATENCY_SLACK_MS = 1.0
+
+
+def _free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def _server_command(kind, port, threads):
+    if kind == 'wsgi':
+        return [
+            sys.executable, '-m', 'gunicorn', 'hotel_project.wsgi:application',
+            '--bind', f'127.0.0.1:{port}', '--worker-class', 'gthread',
+            '--workers', '1', '--threads', str(threads), '--log-level', 'warning',
+        ]
+    return [
+        sys.executable, '-m', 'uvicorn', 'hotel_project.asgi:application',
+        '--host', '127.0.0.1', '--port', str(port), '--log-level', 'warning', '--no-access-log',
+    ]
+
+
+@contextmanager
+def run_server(kind, database_name, threads=8, timeout=30, environ=None):
+    """
+    Run the project under an application server in a subprocess.
+
+    Args:
+        kind (str): One of SERVERS.
+        database_name (str): Path of the SQLite database the server should use.
+        threads (int): Number of worker threads of the WSGI server.
+        timeout (float): Seconds to wait for the server to accept connections.
+        environ (dict): Environment variables of the server, over the defaults, e.g. to
+            enable the rate limit.
+
+    Yields:
+        tuple: The (host, port) the server listens on.
+    """
+    port = _free_port()
+    env = dict(
+        os.environ,
+        DJANGO_DB_NAME=str(database_name),
+        HOTELS_ASYNC_API='1' if kind == 'asgi' else '0',
+        # Every client connects from 127.0.0.1: the rate limit and the load shedding (see
+        # hotels.throttling) would measure themselves instead of the server.
+        HOTELS_THROTTLE_RATE='0',
+        HOTELS_SHED_MAX_IN_FLIGHT='0',
+    )
+    env.update(environ or {})
+    process = subprocess.Popen(_server_command(kind, port, threads), cwd=settings.BASE_DIR, env=env)
+    try:
+        deadline = time.monotonic() + timeout
+        while True:
+            try:
+                socket.create_connection(('127.0.0.1', port), timeout=1).close()
+                break
+            except OSError:
+                if process.poll() is not None or time.monotonic() > deadline:
+                    raise RuntimeError(f'{kind} server did not start on port {port}')
+                time.sleep(0.1)
+        yield '127.0.0.1', port
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+class EndpointStats:
+    """
+    Latency samples and error count of one endpoint.
+
+    Attributes:
+        latencies (list): Latency per successful request, in seconds.
+        errors (int): Number of failed requests (connection errors or status >= 400).
+    """
+    __slots__ = ('latencies', 'errors')
+
+    def __init__(self):
+        self.latencies = []
+        self.errors = 0
+
+    @property
+    def requests(self):
+        return len(self.latencies) + self.errors
+
+    def percentile(self, fraction):
+        """
+        Return a latency percentile in seconds (0.0 when there are no samples).
+        """
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+    @property
+    def error_rate(self):
+        return self.errors / self.requests if self.requests else 0.0
+
+
+async def _read_response(reader):
+    """
+    Read one HTTP/1.1 response and return its status code and whether the connection stays open.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError('Connection closed by server')
+    status = int(status_line.split()[1])
+    length = None
+    chunked = False
+    keep_alive = True
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        name, value = name.strip().lower(), value.strip().lower()
+        if name == 'content-length':
+            length = int(value)
+        elif name == 'transfer-encoding':
+            chunked = 'chunked' in value
+        elif name == 'connection':
+            keep_alive = value != 'close'
+    if chunked:
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            await reader.readexactly(size + 2)
+            if size == 0:
+                break
+    elif length is not None:
+        await reader.readexactly(length)
+    else:
+        await reader.read()
+        keep_alive = False
+    return status, keep_alive
+
+
+async def _client(host, port, paths, offset, deadline, stats, headers, interval):
+    request_tail = ''.join(f'{name}: {value}\r\n' for name, value in headers.items())
+    reader = writer = None
+    index = offset
+    while time.perf_counter() < deadline:
+        label, path = paths[index % len(paths)]
+        index += 1
+        started = time.perf_counter()
+        try:
+            if writer is None:
+                reader, writer = await asyncio.open_connection(host, port)
+            writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}\r\n{request_tail}\r\n'.encode())
+            status, keep_alive = await _read_response(reader)
+        except (OSError, ConnectionError, asyncio.IncompleteReadError, ValueError, IndexError):
+            stats[label].errors += 1
+            if writer is not None:
+                writer.close()
+            reader = writer = None
+            continue
+        if status >= 400:
+            stats[label].errors += 1
+        else:
+            stats[label].latencies.append(time.perf_counter() - started)
+        if not keep_alive:
+            writer.close()
+            reader = writer = None
+        if interval:
+            await asyncio.sleep(max(0, started + interval - time.perf_counter()))
+    if writer is not None:
+        writer.close()
+
+
+async def drive(host, port, paths, clients, duration, headers=None, interval=0):
+    """
+    Run concurrent keep-alive clients against a server.
+
+    Each client keeps one connection open and sends requests back to back (or one every
+    ``interval`` seconds), cycling through the paths (every client starts at a different offset).
+
+    Args:
+        host (str): Server host.
+        port (int): Server port.
+        paths (list): (label, path) pairs to request; statistics are grouped per label.
+        clients (int): Number of concurrent clients.
+        duration (float): Seconds to run.
+        headers (dict): Extra request headers.
+        interval (float): Seconds between the starts of two requests of a client.
+
+    Returns:
+        tuple: A dict mapping each label to its EndpointStats, and the elapsed seconds.
+    """
+    stats = {label: EndpointStats() for label, _path in paths}
+    started = time.perf_counter()
+    deadline = started + duration
+    await asyncio.gather(*(
+        _client(host, port, paths, offset, deadline, stats, headers or {}, interval)
+        for offset in range(clients)
+    ))
+    return stats, time.perf_counter() - started
+
+
+def summarize(stats, elapsed):
+    """
+    Return throughput, latency percentiles and error rate per endpoint of a load run.
+
+    Args:
+        stats (dict): The statistics per label, as returned by drive().
+        elapsed (float): The duration of the run in seconds.
+
+    Returns:
+        dict: Maps each label to a dict with the number of ``requests``, the ``throughput``
+            in requests per second, ``p50``/``p95``/``p99`` in milliseconds and the
+            ``error_rate`` (0 to 1). JSON serialisable, so it can be stored as a baseline.
+    """
+    summary = {}
+    for label, endpoint in stats.items():
+        summary[label] = {
+            'requests': endpoint.requests,
+            'throughput': endpoint.requests / elapsed if elapsed else 0.0,
+            **{name: endpoint.percentile(fraction) * 1e3 for name, fraction in PERCENTILES},
+            'error_rate': endpoint.error_rate,
+        }
+    return summary
+
+
+def compare(summary, baseline, tolerance=0.2, error_tolerance=0.01):
+    """
+    Return the regressions of a load run against a baseline run.
+
+    An endpoint regresses when its throughput drops by more than ``tolerance`` (a fraction
+    of the baseline), when a latency percentile grows by more than ``tolerance`` and by more
+    than LATENCY_SLACK_MS, or when its error rate grows by more than ``error_tolerance``.
+    Endpoints of the baseline missing from the run regress too; new endpoints are ignored.
+
+    Args:
+        summary (dict): The run, as returned by summarize().
+        baseline (dict): The baseline run, in the same format.
+        tolerance (float): Allowed relative change of throughput and latency.
+        error_tolerance (float): Allowed absolute increase of the error rate.
+
+    Returns:
+        list: One message per regression; empty if the run is within the tolerances.
+    """
+    regressions = []
+    for label, expected in baseline.items():
+        actual = summary.get(label)
+        if actual is None:
+            regressions.append(f'{label}: not measured')
+            continue
+        if actual['throughput'] < expected['throughput'] * (1 - tolerance):
+            regressions.append(
+                f"{label}: throughput {actual['throughput']:.0f} req/s, baseline {expected['throughput']:.0f} req/s")
+        for name, _fraction in PERCENTILES:
+            limit = max(expected[name] * (1 + tolerance), expected[name] + LATENCY_SLACK_MS)
+            if actual[name] > limit:
+                regressions.append(f'{label}: {name} {actual[name]:.2f} ms, baseline {expected[name]:.2f} ms')
+        if actual['error_rate'] > expected['error_rate'] + error_tolerance:
+            regressions.append(
+                f"{label}: error rate {actual['error_rate']:.2%}, baseline {expected['error_rate']:.2%}")
+    return regressions
@@ -0,0 +1,731 @@
+import asyncio
+import base64
+import gc
+import gzip
+import json
+import os
+import random
+import statistics
+import tempfile
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+from io import BytesIO, StringIO
+
+from django.contrib import admin
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import RequestFactory, override_settings
+from rest_framework.renderers import JSONRenderer
+from django.db.models import Q
+from hotels import catalog, fulltext, imports, loadtest, pragmas, summary
+from hotels.admin import KEYSET
+from hotels.ingest import parse_csv, parse_ndjson, read_lines
+from hotels.api_views import hotel_export, hotel_list, ingest
+from hotels.management.commands.import_csv import Command as ImportCommand
+from hotels.models import City, Hotel
+from hotels.renderers import hotel_fragment, json_array, quote
+from hotels.serializers import HotelSerializer
+from hotels.search import CitySearchIndex, fold
+from hotels.synthetic import add_hotels, city_names, hotel_code, populate, scratch_database
+from hotels.validation import BATCH_SIZE, batches, clean_hotel_rows, insert_hotel_rows, normalize_hotel
+from hotels.views import HotelInCityView
+
+# The pragmas of a connection without a profile (SQLite and Python defaults).
+SQLITE_DEFAULTS = {
+    'journal_mode': 'delete',
+    'synchronous': 'full',
+    'cache_size': -2000,
+    'mmap_size': 0,
+    'temp_store': 'default',
+    'busy_timeout': 5000,
+}
+
+# Rows per upload of the imports scenario: the size of a typical admin upload.
+UPLOAD_ROWS = 50
+# Well-behaved clients of the throttling scenario, each from its own address, and the
+# seconds between two of their requests.
+POLITE_CLIENTS = 10
+POLITE_INTERVAL = 0.1
+# The limits of the throttling scenario (see hotels.throttling), as server environment.
+THROTTLING_LIMITS = {
+    'HOTELS_THROTTLE_RATE': '20',
+    'HOTELS_SHED_MAX_IN_FLIGHT': '64',
+    'HOTELS_THROTTLE_CLIENT_HEADER': 'HTTP_X_FORWARDED_FOR',
+}
+
+
+class DefaultHotelAdmin(admin.ModelAdmin):
+    """
+    The hotel admin before it was built for large tables: offset paging, exact counts, a
+    filter link per city and a query per row for the city.
+    """
+    list_display = ('code', 'name', 'city')
+    list_filter = ('city',)
+    search_fields = ('name', 'code')
+    ordering = ('city', 'name', 'code')
+
+
+class Command(BaseCommand):
+    """
+    Management command that runs performance benchmarks against a synthetic catalog.
+
+    The benchmarks run against a scratch database (see ``hotels.synthetic``) that is filled
+    with the requested number of cities and hotels, so they never touch real data.
+
+    Scenarios:
+        - catalog: Load time and memory of the in-memory catalog, and hotel lookup latency
+          compared with the ORM query it replaces.
+        - city_search: Build time and query latency of the city autocomplete index. The
+          index is built in memory, so --cities is not limited by the 3-letter code space.
+        - hotel_search: Latency of the FTS5 hotel search compared with the ``LIKE '%term%'``
+          lookups of the default admin search, for selective and very common terms.
+        - city_code: The ORM hotel list of a city, filtered through the join on city__code
+          compared with the denormalized Hotel.city_code.
+        - json: Rendering a city's hotel list: DRF JSONRenderer over ``.values()`` (the
+          original path), HotelSerializer, the lean fragment encoder and the cached body.
+        - export: Time to first byte, total time and peak memory of the streaming hotel export
+          compared with rendering the whole catalog as one list.
+        - servers: Throughput and latency of the read API under --clients concurrent
+          keep-alive clients, served by gunicorn (threaded WSGI), uvicorn with the sync views
+          and uvicorn with the native async views.
+        - pragmas: The SQLite connection profiles (see ``hotels.pragmas``) against the SQLite
+          defaults, on a database file. Serving workload: hotel lists with a new or a
+          persistent connection, catalog loads and single-row updates. Import workload:
+          import_csv of --rows hotels.
+        - validation: Rows per second of hotel validation for --rows new rows: model
+          full_clean() and the per-row lookups of the previous importers, against the
+          query-free normaliser and the batch validator (see ``hotels.validation``).
+        - admin: Render time of the hotel changelist (first page, a page in the middle, one
+          city) at 1%, 10% and 100% of --hotels, for the default ModelAdmin and HotelAdmin.
+        - pages: Latency of the server-rendered hotel page of a city (see ``hotels.views``),
+          rendered on every request and served from the fragment cache.
+        - imports: Rows per second of --rows hotels uploaded in small files by --threads
+          concurrent uploaders, on a database file: each upload writing on its own (as the
+          admin uploads did) against the import coordinator (see ``hotels.imports``).
+        - ingest: Rows per second of --rows hotels sent to the bulk ingest endpoint (see
+          ``hotels.ingest``) as NDJSON, gzipped NDJSON and CSV, on a database file, and of the
+          parsers alone.
+        - throttling: Latency of well-behaved clients reading hotel lists while --clients
+          greedy clients overload the API with searches, under gunicorn without limits and
+          with the rate limit and load shedding (see ``hotels.throttling``).
+
+    Usage Examples:
+        python manage.py benchmark catalog --cities=1000 --hotels=1000000
+        python manage.py benchmark city_search --cities=100000
+        python manage.py benchmark hotel_search --hotels=1000000
+        python manage.py benchmark city_code --hotels=1000000
+        python manage.py benchmark json --cities=100 --hotels=100000
+        python manage.py benchmark export --hotels=1000000
+        python manage.py benchmark servers --clients=300 --duration=10
+        python manage.py benchmark pragmas --hotels=100000 --rows=2000
+        python manage.py benchmark validation --hotels=100000 --rows=20000
+        python manage.py benchmark admin --hotels=1000000
+        python manage.py benchmark pages --cities=1000 --hotels=100000
+        python manage.py benchmark imports --hotels=100000 --rows=5000 --threads=8
+        python manage.py benchmark ingest --hotels=100000 --rows=100000
+        python manage.py benchmark throttling --clients=200 --duration=10
+    """
+    help = 'Run performance benchmarks against a synthetic catalog'
+
+    scenarios = (
+        'catalog', 'city_search', 'hotel_search', 'city_code', 'json', 'export', 'servers', 'pragmas', 'validation',
+        'admin', 'pages', 'imports', 'ingest', 'throttling',
+    )
+    # Scenarios that need the data in a database file: application servers read it from other
+    # processes, and the connection profiles and write contention only matter for files.
+    file_scenarios = ('servers', 'pragmas', 'imports', 'ingest', 'throttling')
+
+    def add_arguments(self, parser):
+        """
+        Add custom command arguments to the parser.
+
+        Args:
+            parser (argparse.ArgumentParser): The argument parser used to parse command options.
+        """
+        parser.add_argument('scenario', choices=self.scenarios, help='Benchmark scenario to run')
+        parser.add_argument('--cities', type=int, default=1000, help='Number of synthetic cities')
+        parser.add_argument('--hotels', type=int, default=100000, help='Number of synthetic hotels')
+        parser.add_argument('--repeat', type=int, default=200, help='Number of timed calls per measurement')
+        parser.add_argument('--clients', type=int, default=200, help='Concurrent HTTP clients (servers, throttling)')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds per server run (servers, throttling)')
+        parser.add_argument('--threads', type=int, default=8, help='Worker threads of the WSGI server, or concurrent uploaders (servers, imports)')
+        parser.add_argument('--rows', type=int, default=2000, help='Rows per import or validation run (pragmas, validation, imports, ingest)')
+
+    def handle(self, *args, **options):
+        """
+        Run the selected scenario inside a scratch database.
+        """
+        with tempfile.TemporaryDirectory() as directory:
+            self.database_name = None
+            if options['scenario'] in self.file_scenarios:
+                self.database_name = os.path.join(directory, 'benchmark.sqlite3')
+            with scratch_database(self.database_name):
+                getattr(self, f"bench_{options['scenario']}")(options)
+
+    def populate(self, options):
+        """
+        Fill the scratch database with the requested number of cities and hotels.
+        """
+        self.stdout.write(f"Populating {options['cities']} cities and {options['hotels']} hotels...")
+        started = time.perf_counter()
+        self.city_codes = populate(options['cities'], options['hotels'])
+        self.stdout.write(f"Populated in {time.perf_counter() - started:.1f}s")
+
+    def measure(self, label, func, repeat, args=()):
+        """
+        Call a function repeatedly and report its latency percentiles.
+
+        Args:
+            label (str): Name printed in the report.
+            func (callable): The function to time.
+            repeat (int): Number of calls.
+            args (sequence): Optional list of argument tuples; call ``i`` uses ``args[i % len(args)]``.
+
+        Returns:
+            float: The median latency in seconds.
+        """
+        args = list(args) or [()]
+        samples = []
+        for i in range(repeat):
+            call_args = args[i % len(args)]
+            started = time.perf_counter()
+            func(*call_args)
+            samples.append(time.perf_counter() - started)
+        samples.sort()
+        p50 = statistics.median(samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        self.stdout.write(f"  {label:<40} p50 {p50 * 1e6:>10.1f} us   p99 {p99 * 1e6:>10.1f} us")
+        return p50
+
+    def allocated(self, func):
+        """
+        Return the number of bytes still allocated by the result of a function.
+
+        Args:
+            func (callable): The function to run; its return value is kept alive while measuring.
+
+        Returns:
+            tuple: The result of the function and the number of bytes it holds.
+        """
+        gc.collect()
+        tracemalloc.start()
+        try:
+            result = func()
+            size, _peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return result, size
+
+    def bench_catalog(self, options):
+        """
+        Benchmark the in-memory catalog against the ORM.
+        """
+        self.populate(options)
+        started = time.perf_counter()
+        catalog.invalidate()
+        catalog.get_catalog()
+        self.stdout.write(f"Catalog load: {time.perf_counter() - started:.2f}s")
+
+        hotel_count = max(options['hotels'], 1)
+        _snapshot, size = self.allocated(lambda: catalog.CatalogSnapshot.load((-1, -1)))
+        self.stdout.write(f"Catalog memory: {size / 2**20:.1f} MiB ({size / hotel_count:.0f} bytes per hotel)")
+
+        sample = min(options['hotels'], 10000) or 1
+        _rows, size = self.allocated(lambda: list(Hotel.objects.values()[:sample]))
+        self.stdout.write(f"values() dicts: {size / sample:.0f} bytes per hotel")
+        _rows, size = self.allocated(lambda: list(Hotel.objects.all()[:sample]))
+        self.stdout.write(f"ORM instances: {size / sample:.0f} bytes per hotel")
+
+        codes = [(code,) for code in random.sample(self.city_codes, min(len(self.city_codes), 100))]
+        self.stdout.write("hotel_list lookup:")
+        self.measure(
+            'ORM filter(city__code).values()',
+            lambda code: list(Hotel.objects.filter(city__code=code).values()),
+            options['repeat'], codes,
+        )
+        self.measure(
+            'catalog hotels_json()',
+            lambda code: catalog.get_catalog().hotels_json(code),
+            options['repeat'], codes,
+        )
+
+    def bench_city_search(self, options):
+        """
+        Benchmark the city autocomplete index.
+        """
+        names = sorted(city_names(options['cities']))
+        codes = [f'{row:03d}'[-3:] for row in range(len(names))]
+        started = time.perf_counter()
+        index = CitySearchIndex(codes, names)
+        self.stdout.write(f"Index build for {len(names)} cities: {time.perf_counter() - started:.2f}s")
+
+        rng = random.Random(1)
+        samples = [fold(name) for name in rng.sample(names, min(len(names), 200))]
+        self.stdout.write("search(limit=10):")
+        for length in (1, 2, 3, 5, 8):
+            queries = [(sample[:length],) for sample in samples]
+            self.measure(f'{length}-character prefix', index.search, options['repeat'], queries)
+        queries = [(sample[2:6],) for sample in samples]
+        self.measure('4-character infix', index.search, options['repeat'], queries)
+
+    def bench_hotel_search(self, options):
+        """
+        Benchmark the full-text hotel search against LIKE scans.
+        """
+        self.populate(options)
+        codes = list(Hotel.objects.order_by('?').values_list('code', flat=True)[:200])
+        city_codes = random.sample(self.city_codes, min(len(self.city_codes), 200))
+
+        def like(term):
+            return list(Hotel.objects.filter(Q(name__icontains=term) | Q(code__icontains=term))[:10])
+
+        queries = {
+            'full hotel code': [(code,) for code in codes],
+            '3-character code prefix': [(code[:3],) for code in codes],
+            'city code + word': [(f'{code} hot',) for code in city_codes],
+            '"hotel" (matches every row)': [('hotel',)],
+        }
+        for label, args in queries.items():
+            self.stdout.write(f"{label}:")
+            self.measure('LIKE %term% (default admin search)', like, options['repeat'], args)
+            self.measure('FTS5 search_hotels(limit=10)', lambda term: fulltext.search_hotels(term, 10),
+                         options['repeat'], args)
+
+    def bench_city_code(self, options):
+        """
+        Benchmark the hotel list of a city with and without the join on hotels_city.
+        """
+        self.populate(options)
+        codes = [(code,) for code in random.sample(self.city_codes, min(len(self.city_codes), 100))]
+        self.stdout.write(f"Hotel list of one city (~{options['hotels'] // max(options['cities'], 1)} hotels):")
+        self.measure(
+            "join on city__code, all hotels",
+            lambda code: list(Hotel.objects.filter(city__code=code).values_list('code', 'name', 'city__code')),
+            options['repeat'], codes,
+        )
+        self.measure(
+            "city_code, all hotels",
+            lambda code: list(Hotel.objects.filter(city_code=code).values_list('code', 'name', 'city_code')),
+            options['repeat'], codes,
+        )
+        self.measure(
+            "join on city__code, first 20",
+            lambda code: list(Hotel.objects.filter(city__code=code).values_list('code', 'name', 'city__code')[:20]),
+            options['repeat'], codes,
+        )
+        self.measure(
+            "city_code, first 20",
+            lambda code: list(Hotel.objects.filter(city_code=code).values_list('code', 'name', 'city_code')[:20]),
+            options['repeat'], codes,
+        )
+
+    def bench_json(self, options):
+        """
+        Benchmark JSON rendering paths for the hotel list of a city.
+        """
+        self.populate(options)
+        renderer = JSONRenderer()
+        codes = [(code,) for code in random.sample(self.city_codes, min(len(self.city_codes), 50))]
+        snapshot = catalog.get_catalog()
+        factory = RequestFactory()
+
+        def lean(code):
+            rows = Hotel.objects.filter(city__code=code).values_list('code', 'name')
+            quoted = quote(code)
+            return json_array(hotel_fragment(hotel_code, name, quoted) for hotel_code, name in rows)
+
+        def render_uncached(code):
+            return catalog.CatalogSnapshot(snapshot.versions, snapshot.cities, snapshot.hotels).hotels_json(code)
+
+        self.stdout.write(f"Render one city (~{options['hotels'] // max(options['cities'], 1)} hotels):")
+        self.measure(
+            'JSONRenderer(values())',
+            lambda code: renderer.render(list(Hotel.objects.filter(city__code=code).values())),
+            options['repeat'], codes,
+        )
+        self.measure(
+            'JSONRenderer(HotelSerializer)',
+            lambda code: renderer.render(HotelSerializer(
+                Hotel.objects.filter(city_code=code), many=True).data),
+            options['repeat'], codes,
+        )
+        self.measure('lean encoder over values_list()', lean, options['repeat'], codes)
+        self.measure('lean encoder over catalog', render_uncached, options['repeat'], codes)
+        self.measure('cached catalog body', snapshot.hotels_json, options['repeat'], codes)
+        self.measure(
+            'hotel_list view (cached body)',
+            lambda code: hotel_list(factory.get(f'/hotels/api/hotels/{code}'), code=code),
+            options['repeat'], codes,
+        )
+
+    def peak(self, func):
+        """
+        Run a function and return its peak memory allocation in bytes.
+        """
+        gc.collect()
+        tracemalloc.start()
+        try:
+            func()
+            _size, peak = tracemalloc.get_traced_memory()
+        finally:
+            tracemalloc.stop()
+        return peak
+
+    def bench_export(self, options):
+        """
+        Benchmark the streaming hotel export against a fully materialised response.
+        """
+        self.populate(options)
+        renderer = JSONRenderer()
+        factory = RequestFactory()
+
+        def materialised():
+            return renderer.render(list(Hotel.objects.values()))
+
+        def streamed(first_byte=None):
+            response = hotel_export(factory.get('/hotels/api/hotels/export'))
+            size = 0
+            for chunk in response.streaming_content:
+                if first_byte is not None and size <= 1 and len(chunk) > 1:
+                    first_byte.append(time.perf_counter())
+                size += len(chunk)
+            return size
+
+        started = time.perf_counter()
+        materialised()
+        self.stdout.write(f"Materialised list: {time.perf_counter() - started:.2f}s to first byte and last byte")
+        self.stdout.write(f"  peak memory {self.peak(materialised) / 2**20:.1f} MiB")
+
+        first_byte = []
+        started = time.perf_counter()
+        size = streamed(first_byte)
+        self.stdout.write(
+            f"Streaming export: {(first_byte[0] - started) * 1e3:.1f} ms to first row, "
+            f"{time.perf_counter() - started:.2f}s to last byte ({size / 2**20:.1f} MiB)"
+        )
+        self.stdout.write(f"  peak memory {self.peak(streamed) / 2**20:.1f} MiB")
+
+    def report_load(self, stats, elapsed):
+        """
+        Print throughput, latency percentiles and error rate per endpoint of a load run.
+        """
+        for label, endpoint in stats.items():
+            self.stdout.write(
+                f"  {label:<12} {endpoint.requests / elapsed:>9.0f} req/s"
+                f"   p50 {endpoint.percentile(0.50) * 1e3:>8.2f} ms"
+                f"   p95 {endpoint.percentile(0.95) * 1e3:>8.2f} ms"
+                f"   p99 {endpoint.percentile(0.99) * 1e3:>8.2f} ms"
+                f"   errors {endpoint.error_rate:>6.2%}"
+            )
+
+    def bench_servers(self, options):
+        """
+        Benchmark the read API under WSGI and ASGI application servers.
+        """
+        self.populate(options)
+        codes = random.sample(self.city_codes, min(len(self.city_codes), 50))
+        paths = [('cities', '/hotels/api/cities/')] + [('hotels', f'/hotels/api/hotels/{code}') for code in codes]
+        for kind in loadtest.SERVERS:
+            with loadtest.run_server(kind, self.database_name, threads=options['threads']) as (host, port):
+                # Warm up: load the catalog before measuring.
+                asyncio.run(loadtest.drive(host, port, paths, 1, 0.5))
+                stats, elapsed = asyncio.run(
+                    loadtest.drive(host, port, paths, options['clients'], options['duration']))
+            self.stdout.write(f"{kind} ({options['clients']} keep-alive clients):")
+            self.report_load(stats, elapsed)
+
+    async def overload(self, host, port, paths, greedy_paths, options):
+        """
+        Drive a server with greedy clients sharing one address and polite clients with their own.
+
+        Returns:
+            tuple: The statistics of the polite and of the greedy requests, and the elapsed seconds.
+        """
+        duration = options['duration']
+        greedy, *polite = await asyncio.gather(
+            loadtest.drive(host, port, greedy_paths, options['clients'], duration,
+                           headers={'X-Forwarded-For': '10.0.0.1'}),
+            *(loadtest.drive(host, port, paths, 1, duration, headers={'X-Forwarded-For': f'10.1.0.{client}'},
+                             interval=POLITE_INTERVAL)
+              for client in range(POLITE_CLIENTS)),
+        )
+        stats = {'polite': loadtest.EndpointStats(), 'greedy': loadtest.EndpointStats()}
+        for label, (run, _elapsed) in (('greedy', greedy), *(('polite', run) for run in polite)):
+            for endpoint in run.values():
+                stats[label].latencies.extend(endpoint.latencies)
+                stats[label].errors += endpoint.errors
+        return stats, greedy[1]
+
+    def bench_throttling(self, options):
+        """
+        Benchmark the latency of well-behaved clients under overload, without and with the
+        rate limit and load shedding.
+        """
+        self.populate(options)
+        codes = random.sample(self.city_codes, min(len(self.city_codes), 50))
+        paths = [('cities', '/hotels/api/cities/')] + [('hotels', f'/hotels/api/hotels/{code}') for code in codes]
+        # The runaway client asks for what the catalog does not cache: searches and statistics.
+        greedy_paths = [('search', '/hotels/api/hotels/search?q=hotel'), ('stats', '/hotels/api/cities/stats')]
+        for label, environ in (('no limits', {}), ('rate limit and load shedding', THROTTLING_LIMITS)):
+            with loadtest.run_server('wsgi', self.database_name, threads=options['threads'],
+                                     environ=environ) as (host, port):
+                asyncio.run(loadtest.drive(host, port, paths, 1, 0.5))
+                stats, elapsed = asyncio.run(self.overload(host, port, paths, greedy_paths, options))
+            self.stdout.write(f"{label} ({options['clients']} greedy and {POLITE_CLIENTS} polite clients, "
+                              f"errors include the rejections):")
+            self.report_load(stats, elapsed)
+
+    @contextmanager
+    def connection_profile(self, name):
+        """
+        Reconnect every alias with the given SQLite profile for the duration of a block.
+        """
+        for connection in connections.all():
+            connection.close()
+        with override_settings(HOTELS_SQLITE_PROFILES={alias: name for alias in connections},
+                               HOTELS_SQLITE_PRAGMAS={'sqlite_defaults': SQLITE_DEFAULTS}):
+            yield
+            for connection in connections.all():
+                connection.close()
+
+    def bench_pragmas(self, options):
+        """
+        Benchmark the SQLite connection profiles on the serving and the import workloads.
+        """
+        self.populate(options)
+        codes = [(code,) for code in random.sample(self.city_codes, min(len(self.city_codes), 100))]
+        hotel_codes = [(code,) for code in Hotel.objects.order_by('?').values_list('code', flat=True)[:100]]
+
+        def hotel_rows(code):
+            return list(Hotel.objects.filter(city_code=code).values_list('code', 'name'))
+
+        def reconnect_and_read(code):
+            connections['replica'].close()
+            return hotel_rows(code)
+
+        def update(code):
+            Hotel.objects.filter(code=code).update(name=f'Hotel {code} {random.random():.6f}')
+
+        self.stdout.write("Serving workload:")
+        for name in ('sqlite_defaults', 'serving'):
+            self.stdout.write(f"{name}:")
+            with self.connection_profile(name):
+                self.measure('hotel list, new connection', reconnect_and_read, options['repeat'], codes)
+                self.measure('hotel list, persistent connection', hotel_rows, options['repeat'], codes)
+                self.measure('catalog load', lambda: catalog.CatalogSnapshot.load((-1, -1)),
+                             max(options['repeat'] // 50, 3))
+                self.measure('single-row update (commit)', update, options['repeat'], hotel_codes)
+
+        rows = ''.join(f'{city};{code};Imported hotel {code}\n' for city, code, _name in self.new_hotel_rows(options))
+        last_id = Hotel.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        self.stdout.write(f"Import workload (import_csv, {options['rows']} hotels):")
+        for name in ('sqlite_defaults', 'serving', 'bulk_import'):
+            with self.connection_profile(name):
+                command = ImportCommand(stdout=StringIO())
+                self.throughput(name, lambda: command.import_hotels_from_string(rows), options['rows'])
+                Hotel.objects.filter(id__gt=last_id).delete()
+
+    def new_hotel_rows(self, options):
+        """
+        Return --rows (city code, hotel code, name) tuples of hotels that do not exist yet.
+        """
+        return [
+            (self.city_codes[i % len(self.city_codes)], hotel_code(options['hotels'] + i), f'Hotel {i}')
+            for i in range(options['rows'])
+        ]
+
+    def throughput(self, label, func, rows):
+        """
+        Call a function once and report the rows it processed per second.
+        """
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f"  {label:<40} {elapsed:>8.2f}s   {rows / elapsed:>10.0f} rows/s")
+
+    def bench_validation(self, options):
+        """
+        Benchmark hotel row validation: per-row model validation and lookups against the
+        query-free normaliser and the batch validator.
+        """
+        self.populate(options)
+        rows = [(number, city.lower(), code.lower(), f' {name} ')
+                for number, (city, code, name) in enumerate(self.new_hotel_rows(options))]
+        cities = City.objects.in_bulk(self.city_codes, field_name='code')
+
+        def full_clean():
+            for _number, city, code, name in rows:
+                Hotel(city=cities[city.upper()], code=code, name=name).full_clean()
+
+        def lookups():
+            # The checks of the previous importers: the city, then the hotel code, per row.
+            for _number, city, code, name in rows:
+                city = City.objects.get(code=city.upper())
+                Hotel.objects.filter(code=code.strip().upper(), city=city).exists()
+
+        def normalize():
+            for _number, _city, code, name in rows:
+                normalize_hotel(code, name)
+
+        def batched():
+            for batch in batches(rows):
+                clean_hotel_rows(batch)
+
+        self.stdout.write(f"Validate {options['rows']} new hotel rows:")
+        self.throughput('Hotel.full_clean() per row', full_clean, len(rows))
+        self.throughput('per-row city and code lookups', lookups, len(rows))
+        self.throughput('normalize_hotel() per row (no queries)', normalize, len(rows))
+        self.throughput(f'clean_hotel_rows(), batches of {BATCH_SIZE}', batched, len(rows))
+
+    def bench_admin(self, options):
+        """
+        Benchmark the hotel changelist as the hotels table grows.
+        """
+        self.populate({**options, 'hotels': 0})
+        request_factory = RequestFactory()
+        user = User.objects.create_superuser('benchmark', 'benchmark@example.com', 'benchmark')
+        admins = {
+            'ModelAdmin': DefaultHotelAdmin(Hotel, admin.site),
+            'HotelAdmin': admin.site.get_model_admin(Hotel),
+        }
+        city_ids = [(city_id,) for city_id in City.objects.values_list('id', flat=True)[:100]]
+
+        def render(model_admin, params):
+            request = request_factory.get('/admin/hotels/hotel/', params)
+            request.user = user
+            return model_admin.changelist_view(request).render()
+
+        hotel_count = 0
+        for size in sorted({max(options['hotels'] // 100, 1), max(options['hotels'] // 10, 1), options['hotels']}):
+            add_hotels(self.city_codes, hotel_count, size - hotel_count)
+            hotel_count = size
+            middle = Hotel.objects.order_by(*KEYSET).values_list('code', flat=True)[size // 2]
+            # The default ModelAdmin pages by number, HotelAdmin after a hotel code.
+            pages = {
+                'first page': ({}, {}),
+                'middle page': ({'p': size // 2 // 100}, {'after': middle}),
+            }
+            repeat = max(options['repeat'] // 20, 3)
+            self.stdout.write(f"{size} hotels:")
+            for index, (label, model_admin) in enumerate(admins.items()):
+                for page, params in pages.items():
+                    self.measure(f'{label}, {page}', render, repeat, [(model_admin, params[index])])
+                self.measure(f'{label}, one city', lambda city_id: render(model_admin, {'city__id__exact': city_id}),
+                             repeat, city_ids)
+
+    def bench_pages(self, options):
+        """
+        Benchmark the server-rendered hotel pages with and without the fragment cache.
+        """
+        self.populate(options)
+        request_factory = RequestFactory()
+        view = HotelInCityView.as_view()
+        codes = [(code,) for code in random.sample(self.city_codes, min(len(self.city_codes), 100))]
+        catalog.get_catalog()
+
+        def render(code):
+            return view(request_factory.get('/hotels/city/', {'city': code})).render()
+
+        self.stdout.write("Hotel page of a city:")
+        with override_settings(HOTELS_PAGE_CACHE_TIMEOUT=0):
+            self.measure('rendered on every request', render, options['repeat'], codes)
+        for code, in codes:
+            render(code)
+        self.measure('fragment cache', render, options['repeat'], codes)
+
+    def concurrently(self, func, items, threads):
+        """
+        Call a function on every item from several threads, and return the failed calls.
+        """
+        items = iter(items)
+        items_lock = threading.Lock()
+        failures = []
+
+        def work():
+            try:
+                while True:
+                    with items_lock:
+                        item = next(items, None)
+                    if item is None:
+                        return
+                    try:
+                        func(item)
+                    except Exception as error:
+                        failures.append(error)
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=work) for _ in range(threads)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        return failures
+
+    def bench_imports(self, options):
+        """
+        Benchmark concurrent small hotel uploads, uncoordinated and through the import coordinator.
+        """
+        self.populate(options)
+        uploads = [[(number, *row) for number, row in enumerate(upload, start=1)]
+                   for upload in batches(self.new_hotel_rows(options), UPLOAD_ROWS)]
+        last_id = Hotel.objects.order_by('-id').values_list('id', flat=True).first() or 0
+
+        def uncoordinated(upload):
+            # The admin upload before the coordinator: validate, write and recount on its own.
+            valid, _rejected = clean_hotel_rows(upload)
+            insert_hotel_rows(valid)
+            summary.refresh()
+
+        def coordinated(upload):
+            imports.import_rows('hotels', upload, 'benchmark upload')
+
+        self.stdout.write(f"{len(uploads)} uploads of {UPLOAD_ROWS} hotels from {options['threads']} threads:")
+        with tempfile.TemporaryDirectory() as directory, override_settings(HOTELS_IMPORT_DIR=directory):
+            for label, upload in (('uncoordinated', uncoordinated), ('import coordinator', coordinated)):
+                started = time.perf_counter()
+                failures = self.concurrently(upload, uploads, options['threads'])
+                elapsed = time.perf_counter() - started
+                imported = Hotel.objects.filter(id__gt=last_id).count()
+                self.stdout.write(f"  {label:<40} {elapsed:>8.2f}s   {imported / elapsed:>10.0f} rows/s"
+                                  f"   {len(failures)} failed uploads")
+                Hotel.objects.filter(id__gt=last_id).delete()
+                summary.refresh()
+
+    def bench_ingest(self, options):
+        """
+        Benchmark the bulk ingest endpoint: the parsers alone, then whole requests per body format.
+        """
+        self.populate(options)
+        rows = self.new_hotel_rows(options)
+        ndjson = b''.join(json.dumps({'code': code, 'name': name, 'city': city}).encode() + b'\n'
+                          for city, code, name in rows)
+        csv = ''.join(f'{city};{code};{name}\n' for city, code, name in rows).encode()
+        last_id = Hotel.objects.order_by('-id').values_list('id', flat=True).first() or 0
+        User.objects.create_superuser('benchmark', password='benchmark')
+        request_factory = RequestFactory(HTTP_AUTHORIZATION=f"Basic {base64.b64encode(b'benchmark:benchmark').decode()}")
+
+        def parse(parser, body):
+            for _row in parser(read_lines(BytesIO(body))):
+                pass
+
+        def post(body, content_type, **headers):
+            response = ingest(request_factory.post('/hotels/api/ingest', body, content_type=content_type, **headers))
+            assert response.status_code == 200, response.data
+
+        self.stdout.write(f"Parse {len(rows)} hotel lines:")
+        self.throughput('NDJSON', lambda: parse(parse_ndjson, ndjson), len(rows))
+        self.throughput('CSV', lambda: parse(parse_csv, csv), len(rows))
+        self.stdout.write(f"Ingest {len(rows)} new hotels:")
+        with tempfile.TemporaryDirectory() as directory, override_settings(HOTELS_IMPORT_DIR=directory):
+            for label, body, content_type, headers in (
+                ('NDJSON', ndjson, 'application/x-ndjson', {}),
+                ('NDJSON, gzip', gzip.compress(ndjson), 'application/x-ndjson', {'HTTP_CONTENT_ENCODING': 'gzip'}),
+                ('CSV', csv, 'text/csv', {}),
+            ):
+                self.throughput(label, lambda: post(body, content_type, **headers), len(rows))
+                Hotel.objects.filter(id__gt=last_id).delete()
+                summary.refresh()
@@ -3,10 +3,12 @@ import io
 import requests
 import getpass  # For secure password input in the terminal
 import sys
+from contextlib import nullcontext
 
 from django.core.management.base import BaseCommand
 from django.conf import settings
-from hotels.models import City, Hotel
+from hotels import imports, pragmas, profiling, summary
+from hotels.validation import batches, clean_city_rows, clean_hotel_rows, insert_city_rows, insert_hotel_rows
 
 
 class Command(BaseCommand):
@@ -31,6 +33,16 @@ class Command(BaseCommand):
           python manage.py import_csv --mode=file \
               --city-path="/path/to/city.csv" \
               --hotel-path="/path/to/hotel.csv"
+
+      - Profile an import (written to HOTELS_PROFILE_DIR, see ``hotels.profiling``):
+          python manage.py import_csv --mode=file --hotel-path="/path/to/hotel.csv" --profile
+
+      - Show the running and the queued imports:
+          python manage.py import_csv --status
+
+    The import holds the import lock while it runs (see ``hotels.imports``): it waits for the
+    running import, if any, and admin uploads wait for it. With --wait=SECONDS it gives up
+    after that long instead.
     """
     help = 'Import CSV data for City and Hotel models'
 
@@ -68,6 +80,21 @@ class Command(BaseCommand):
             type=str,
             help='Local file path for hotel CSV (used in file mode)'
         )
+        parser.add_argument(
+            '--profile',
+            action='store_true',
+            help='Profile the import with cProfile and write the profile to HOTELS_PROFILE_DIR'
+        )
+        parser.add_argument(
+            '--wait',
+            type=float,
+            help='Seconds to wait for a running import to finish (default: as long as it takes)'
+        )
+        parser.add_argument(
+            '--status',
+            action='store_true',
+            help='Show the running and the queued imports, and exit'
+        )
 
     def handle(self, *args, **kwargs):
         """
@@ -99,28 +126,66 @@ class Command(BaseCommand):
         options = kwargs
         mode = options.get('mode')
 
-        if mode == 'http':
-            self.stdout.write("Importing via authenticated HTTP...")
-            city_url = options.get('city_url')
-            hotel_url = options.get('hotel_url')
-            # Use the validated credentials for HTTP basic authentication.
-            # See: [HTTP Basic Auth with requests](https://docs.python-requests.org/en/latest/user/authentication/#basic-authentication)
-            auth = (expected_username, expected_password)
-            if city_url:
-                self.import_cities_from_url(city_url, auth)
-            if hotel_url:
-                self.import_hotels_from_url(hotel_url, auth)
-        else:
-            self.stdout.write("Importing from local files...")
-            city_path = options.get('city_path')
-            hotel_path = options.get('hotel_path')
-            if city_path:
-                self.import_cities_from_file(city_path)
-            if hotel_path:
-                self.import_hotels_from_file(hotel_path)
+        if options.get('status'):
+            self.write_status(imports.status())
+            return
 
+        label = f'import_csv --mode={mode}'
+        running = imports.status()
+        if running['holder'] or running['queue']:
+            self.stdout.write("Waiting for the running import to finish...")
+            self.write_status(running)
+        lock = imports.writer(label, timeout=options.get('wait'))
+        profiler = profiling.profile(label) if options.get('profile') else nullcontext()
+        try:
+            # Same durability as serving, with a larger cache, fewer checkpoints and a longer busy
+            # timeout while importing (see hotels.pragmas).
+            with lock, profiler, pragmas.profile('bulk_import'):
+                if mode == 'http':
+                    self.stdout.write("Importing via authenticated HTTP...")
+                    city_url = options.get('city_url')
+                    hotel_url = options.get('hotel_url')
+                    # Use the validated credentials for HTTP basic authentication.
+                    # See: [HTTP Basic Auth with requests](https://docs.python-requests.org/en/latest/user/authentication/#basic-authentication)
+                    auth = (expected_username, expected_password)
+                    if city_url:
+                        self.import_cities_from_url(city_url, auth)
+                    if hotel_url:
+                        self.import_hotels_from_url(hotel_url, auth)
+                else:
+                    self.stdout.write("Importing from local files...")
+                    city_path = options.get('city_path')
+                    hotel_path = options.get('hotel_path')
+                    if city_path:
+                        self.import_cities_from_file(city_path)
+                    if hotel_path:
+                        self.import_hotels_from_file(hotel_path)
+        except imports.ImportBusy as e:
+            self.stdout.write(self.style.ERROR(str(e)))
+            sys.exit(1)
+
+        if options.get('profile'):
+            self.stdout.write(f"Profile written to {profiling.profile_dir()}")
         self.stdout.write(self.style.SUCCESS('CSV import complete'))
 
+    def write_status(self, status):
+        """
+        Print the running import and the queued imports.
+
+        Args:
+            status (dict): As returned by ``hotels.imports.status()``.
+        """
+        holder = status['holder']
+        if holder:
+            rows = f", {holder['rows']} rows" if holder['rows'] else ""
+            self.stdout.write(f"Running: {holder['label']}{rows} (pid {holder['pid']}, since {holder['started']})")
+        else:
+            self.stdout.write("Running: none")
+        self.stdout.write(f"Queued: {len(status['queue'])} imports, {status['queued_rows']} rows")
+        for ticket in status['queue']:
+            rows = f", {ticket['rows']} rows" if ticket['rows'] else ""
+            self.stdout.write(f"  {ticket['label']}{rows} (pid {ticket['pid']}, since {ticket['queued']})")
+
     def import_cities_from_url(self, url, auth):
         """
         Fetches and imports city data from a CSV file via an HTTP request.
@@ -184,6 +249,8 @@ class Command(BaseCommand):
     def import_cities_from_string(self, csv_string):
         """
         Parses a CSV string and imports each valid row as a new City.
+
+        Rows are validated and written in batches (see ``hotels.validation``).
        
         Args:
             csv_string (str): The CSV data as a string.
@@ -194,27 +261,28 @@ class Command(BaseCommand):
         reader = csv.reader(io.StringIO(csv_string), delimiter=';')
         imported_count = 0
         skipped_count = 0
-        for idx, row in enumerate(reader, start=1):
-            if not row or len(row) != 2:
-                self.stdout.write(self.style.WARNING(f"Skipping row {idx}: invalid format"))
-                skipped_count += 1
-                continue
-            code, name = row
-            if not code or not name:
-                self.stdout.write(self.style.WARNING(f"Skipping row {idx}: missing values"))
-                skipped_count += 1
-                continue
-            if City.objects.filter(code=code).exists():
-                self.stdout.write(self.style.WARNING(f"Row {idx}: City code {code} already exists"))
-                skipped_count += 1
-                continue
-            City.objects.create(code=code, name=name)
-            imported_count += 1
+        for batch in batches(enumerate(reader, start=1)):
+            rows = []
+            for idx, row in batch:
+                if not row or len(row) != 2:
+                    self.stdout.write(self.style.WARNING(f"Skipping row {idx}: invalid format"))
+                    skipped_count += 1
+                    continue
+                rows.append((idx, *row))
+            valid, rejected = clean_city_rows(rows)
+            for idx, message in rejected:
+                self.stdout.write(self.style.WARNING(f"Row {idx}: {message}"))
+            skipped_count += len(rejected)
+            insert_city_rows(valid)
+            imported_count += len(valid)
+        summary.refresh()
         self.stdout.write(self.style.SUCCESS(f"Imported {imported_count} cities, skipped {skipped_count} rows"))
 
     def import_hotels_from_string(self, csv_string):
         """
         Parses a CSV string and imports each valid row as a new Hotel, linking it to its City.
+
+        Rows are validated and written in batches (see ``hotels.validation``).
        
         Args:
             csv_string (str): The CSV data as a string.
@@ -225,26 +293,19 @@ class Command(BaseCommand):
         reader = csv.reader(io.StringIO(csv_string), delimiter=';')
         imported_count = 0
         skipped_count = 0
-        for idx, row in enumerate(reader, start=1):
-            if not row or len(row) != 3:
-                self.stdout.write(self.style.WARNING(f"Skipping row {idx}: invalid format"))
-                skipped_count += 1
-                continue
-            city_code, hotel_code, name = row
-            try:
-                city = City.objects.get(code=city_code)
-            except City.DoesNotExist:
-                self.stdout.write(self.style.WARNING(f"Row {idx}: City {city_code} not found"))
-                skipped_count += 1
-                continue
-            if not hotel_code or not name:
-                self.stdout.write(self.style.WARNING(f"Skipping row {idx}: missing hotel code or name"))
-                skipped_count += 1
-                continue
-            if Hotel.objects.filter(code=hotel_code, city=city).exists():
-                self.stdout.write(self.style.WARNING(f"Row {idx}: Hotel code {hotel_code} already exists for this city"))
-                skipped_count += 1
-                continue
-            Hotel.objects.create(code=hotel_code, name=name, city=city)
-            imported_count += 1
+        for batch in batches(enumerate(reader, start=1)):
+            rows = []
+            for idx, row in batch:
+                if not row or len(row) != 3:
+                    self.stdout.write(self.style.WARNING(f"Skipping row {idx}: invalid format"))
+                    skipped_count += 1
+                    continue
+                rows.append((idx, *row))
+            valid, rejected = clean_hotel_rows(rows)
+            for idx, message in rejected:
+                self.stdout.write(self.style.WARNING(f"Row {idx}: {message}"))
+            skipped_count += len(rejected)
+            insert_hotel_rows(valid)
+            imported_count += len(valid)
+        summary.refresh()
         self.stdout.write(self.style.SUCCESS(f"Imported {imported_count} hotels, skipped {skipped_count} rows"))
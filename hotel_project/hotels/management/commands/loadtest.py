@@ -0,0 +1,151 @@
+import asyncio
+import json
+import os
+import random
+import tempfile
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from hotels import loadtest
+from hotels.synthetic import populate, scratch_database
+
+# The run parameters stored with a baseline: results are only comparable between runs that agree on them.
+RUN_PARAMETERS = ('server', 'cities', 'hotels', 'clients', 'duration', 'threads')
+
+
+class Command(BaseCommand):
+    """
+    Management command that load-tests the read API and checks it against a stored baseline.
+
+    The command fills a scratch database file (see ``hotels.synthetic``) with a synthetic
+    catalog, runs the project under an application server in a subprocess (see
+    ``hotels.loadtest``), and drives ``/hotels/api/cities/`` and ``/hotels/api/hotels/<code>``
+    with --clients concurrent keep-alive clients for --duration seconds, after a short
+    warm-up. Everything runs locally; no external service is involved.
+
+    It reports the throughput, p50/p95/p99 latency and error rate per endpoint. With
+    --baseline, the results are compared with the baseline file and the command fails if an
+    endpoint regressed beyond --tolerance (see ``loadtest.compare``); with --save-baseline,
+    the results are written to the baseline file instead.
+
+    Usage Examples:
+        python manage.py loadtest --hotels=100000 --clients=100 --save-baseline --baseline=loadtest.json
+        python manage.py loadtest --hotels=100000 --clients=100 --baseline=loadtest.json --tolerance=0.25
+        python manage.py loadtest --server=wsgi --threads=16 --duration=30
+    """
+    help = 'Load-test the read API against a synthetic catalog and compare with a baseline'
+
+    def add_arguments(self, parser):
+        """
+        Add custom command arguments to the parser.
+
+        Args:
+            parser (argparse.ArgumentParser): The argument parser used to parse command options.
+        """
+        parser.add_argument('--server', choices=loadtest.SERVERS, default='asgi', help='Application server to run')
+        parser.add_argument('--cities', type=int, default=1000, help='Number of synthetic cities')
+        parser.add_argument('--hotels', type=int, default=100000, help='Number of synthetic hotels')
+        parser.add_argument('--clients', type=int, default=100, help='Concurrent HTTP clients')
+        parser.add_argument('--duration', type=float, default=10, help='Seconds to drive the server')
+        parser.add_argument('--warmup', type=float, default=1, help='Seconds of warm-up before measuring')
+        parser.add_argument('--threads', type=int, default=8, help='Worker threads of the WSGI server')
+        parser.add_argument('--baseline', help='JSON file with the baseline results')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Write the results to --baseline instead of comparing with it')
+        parser.add_argument('--tolerance', type=float, default=0.2,
+                            help='Allowed relative drop of throughput and growth of latency (0.2 = 20%%)')
+        parser.add_argument('--error-tolerance', type=float, default=0.01,
+                            help='Allowed absolute growth of the error rate (0.01 = 1 percentage point)')
+
+    def handle(self, *args, **options):
+        """
+        Run the load test, report it and compare it with, or save it as, the baseline.
+
+        Raises:
+            CommandError: If the baseline cannot be read, or if an endpoint regressed.
+        """
+        if options['save_baseline'] and not options['baseline']:
+            raise CommandError('--save-baseline requires --baseline')
+        baseline = None
+        if options['baseline'] and not options['save_baseline']:
+            baseline = self.read_baseline(options['baseline'])
+
+        with tempfile.TemporaryDirectory() as directory:
+            with scratch_database(os.path.join(directory, 'loadtest.sqlite3')) as connection:
+                summary = self.run(options, connection.settings_dict['NAME'])
+
+        parameters = {name: options[name] for name in RUN_PARAMETERS}
+        self.report(summary)
+        if options['save_baseline']:
+            with open(options['baseline'], 'w') as file:
+                json.dump({'parameters': parameters, 'endpoints': summary}, file, indent=2)
+            self.stdout.write(self.style.SUCCESS(f"Baseline saved to {options['baseline']}"))
+        elif baseline is not None:
+            self.compare_with_baseline(summary, parameters, baseline, options)
+
+    def read_baseline(self, path):
+        """
+        Read a baseline file written by --save-baseline.
+        """
+        try:
+            with open(path) as file:
+                baseline = json.load(file)
+            return baseline['parameters'], baseline['endpoints']
+        except FileNotFoundError:
+            raise CommandError(f'Baseline {path} not found; create it with --save-baseline')
+        except (ValueError, KeyError, TypeError) as error:
+            raise CommandError(f'Invalid baseline {path}: {error}')
+
+    def run(self, options, database_name):
+        """
+        Populate the scratch database, serve it and drive the read API.
+
+        Returns:
+            dict: The results per endpoint, as returned by ``loadtest.summarize``.
+        """
+        self.stdout.write(f"Populating {options['cities']} cities and {options['hotels']} hotels...")
+        started = time.perf_counter()
+        city_codes = populate(options['cities'], options['hotels'])
+        self.stdout.write(f"Populated in {time.perf_counter() - started:.1f}s")
+
+        codes = random.Random(0).sample(city_codes, min(len(city_codes), 50))
+        paths = [('cities', '/hotels/api/cities/')] + [('hotels', f'/hotels/api/hotels/{code}') for code in codes]
+        with loadtest.run_server(options['server'], database_name, threads=options['threads']) as (host, port):
+            # Warm up: load the catalog and fill the caches before measuring.
+            asyncio.run(loadtest.drive(host, port, paths, 1, options['warmup']))
+            self.stdout.write(
+                f"Driving {options['server']} with {options['clients']} clients for {options['duration']:g}s...")
+            stats, elapsed = asyncio.run(
+                loadtest.drive(host, port, paths, options['clients'], options['duration']))
+        return loadtest.summarize(stats, elapsed)
+
+    def report(self, summary):
+        """
+        Print throughput, latency percentiles and error rate per endpoint.
+        """
+        for label, result in summary.items():
+            self.stdout.write(
+                f"  {label:<12} {result['throughput']:>9.0f} req/s"
+                f"   p50 {result['p50']:>8.2f} ms"
+                f"   p95 {result['p95']:>8.2f} ms"
+                f"   p99 {result['p99']:>8.2f} ms"
+                f"   errors {result['error_rate']:>6.2%}"
+            )
+
+    def compare_with_baseline(self, summary, parameters, baseline, options):
+        """
+        Compare the results with the baseline.
+
+        Raises:
+            CommandError: If an endpoint regressed beyond the tolerances.
+        """
+        baseline_parameters, baseline_endpoints = baseline
+        differences = [f'{name}={baseline_parameters.get(name)}' for name in RUN_PARAMETERS
+                       if baseline_parameters.get(name) != parameters[name]]
+        if differences:
+            self.stderr.write(self.style.WARNING(
+                f"The baseline was recorded with {', '.join(differences)}; the results may not be comparable"))
+        regressions = loadtest.compare(summary, baseline_endpoints, options['tolerance'], options['error_tolerance'])
+        if regressions:
+            raise CommandError('Regressions against {}:\n  {}'.format(options['baseline'], '\n  '.join(regressions)))
+        self.stdout.write(self.style.SUCCESS(f"No regression against {options['baseline']}"))
@@ -0,0 +1,348 @@
+"""
+Module: metrics
+
+Per-endpoint request metrics, aggregated in-process and exposed in the Prometheus text format.
+
+``MetricsMiddleware`` records, for every request and per resolved URL name (the view name,
+e.g. ``api_hotel_list`` or ``admin:hotels_hotel_upload_csv``):
+    - the latency (until the response is returned; the time to first byte of streams),
+    - the number of SQL queries and the time spent in the database,
+    - the size of the response body (not known for streamed responses),
+    - the lookups in the caches of the read path, as hits and misses (see record_cache()),
+    - the status code.
+
+Queries are counted by an execute wrapper installed on every database connection
+(``connection_created``). It finds the statistics of the current request through a context
+variable, so queries that async views run in worker threads are counted too; outside of a
+request it only reads the context variable.
+
+Recording takes no lock: every thread adds to its own buffer, and the buffers are merged
+when the metrics are read. When a thread ends, its buffer is folded into the totals of the
+ended threads, so the short-lived threads of ``runserver`` or of an ASGI thread pool do not
+leave a buffer each behind. Counters only grow while the process lives, as Prometheus expects;
+``histogram_quantile()`` turns the histograms into p50/p99 per endpoint.
+
+Functions:
+    - record_cache: Count a cache lookup for the current request.
+    - request_stats: The database and cache activity of the current request.
+    - instrument_connection: ``connection_created`` receiver installing the query counter.
+    - render: The metrics of the process in the Prometheus text format.
+    - metrics_view: The view serving render().
+    - reset: Drop every recorded metric.
+
+Classes:
+    - MetricsMiddleware: Middleware recording the metrics of every request.
+"""
+
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.http import HttpResponse
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# The URL name of the metrics endpoint, whose own requests are not recorded.
+METRICS_VIEW_NAME = 'metrics'
+UNRESOLVED = '<unresolved>'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_request = ContextVar('hotels_metrics_request', default=None)
+_local = threading.local()
+# The buffers of the running threads, by id, and the merged buffers of the ended threads.
+_buffers = {}
+_retired = {}
+_buffers_lock = threading.Lock()
+
+
+class RequestStats:
+    """
+    The database and cache activity of the request being served.
+    """
+    __slots__ = ('queries', 'db_seconds', 'cache')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.cache = {}
+
+
+class Histogram:
+    """
+    Observations counted in the first bucket they fit; render() makes the counts cumulative.
+    """
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        # The last slot counts the observations above every bound (le="+Inf").
+        self.counts = [0] * (len(bounds) + 1)
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def merge(self, other):
+        for index, count in enumerate(other.counts):
+            self.counts[index] += count
+        self.sum += other.sum
+
+
+class ViewStats:
+    """
+    The metrics of one URL name, in one thread's buffer.
+    """
+    __slots__ = ('latency', 'queries', 'size', 'db_seconds', 'statuses', 'cache')
+
+    def __init__(self):
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.queries = Histogram(QUERY_BUCKETS)
+        self.size = Histogram(SIZE_BUCKETS)
+        self.db_seconds = 0.0
+        self.statuses = {}
+        self.cache = {}
+
+    def record(self, seconds, request_stats, status, size):
+        self.latency.observe(seconds)
+        self.queries.observe(request_stats.queries)
+        self.db_seconds += request_stats.db_seconds
+        if size is not None:
+            self.size.observe(size)
+        self.statuses[status] = self.statuses.get(status, 0) + 1
+        for key, count in request_stats.cache.items():
+            self.cache[key] = self.cache.get(key, 0) + count
+
+    def merge(self, other):
+        self.latency.merge(other.latency)
+        self.queries.merge(other.queries)
+        self.size.merge(other.size)
+        self.db_seconds += other.db_seconds
+        for status, count in other.statuses.items():
+            self.statuses[status] = self.statuses.get(status, 0) + count
+        for key, count in other.cache.items():
+            self.cache[key] = self.cache.get(key, 0) + count
+
+
+class _Owner:
+    """
+    Held in the thread-local data of a thread, which is dropped when the thread ends.
+    """
+    __slots__ = ('__weakref__',)
+
+
+def _buffer():
+    """
+    Return the buffer of the current thread, registering it on first use.
+    """
+    try:
+        return _local.buffer
+    except AttributeError:
+        buffer = {}
+        _local.owner = _Owner()
+        weakref.finalize(_local.owner, _retire, buffer)
+        with _buffers_lock:
+            _buffers[id(buffer)] = buffer
+        _local.buffer = buffer
+        return buffer
+
+
+def _retire(buffer):
+    """
+    Fold the buffer of an ended thread into the totals of the ended threads.
+    """
+    with _buffers_lock:
+        if _buffers.pop(id(buffer), None) is None:
+            return
+        for view_name, stats in buffer.items():
+            _retired.setdefault(view_name, ViewStats()).merge(stats)
+
+
+def _record(view_name, seconds, request_stats, status, size):
+    buffer = _buffer()
+    stats = buffer.get(view_name)
+    if stats is None:
+        stats = buffer[view_name] = ViewStats()
+    stats.record(seconds, request_stats, status, size)
+
+
+def record_cache(name, hit):
+    """
+    Count a cache lookup for the request being served. Does nothing outside of a request.
+
+    Args:
+        name (str): The cache, e.g. "catalog" or "body".
+        hit (bool): Whether the value was found.
+    """
+    stats = _request.get()
+    if stats is not None:
+        key = (name, 'hit' if hit else 'miss')
+        stats.cache[key] = stats.cache.get(key, 0) + 1
+
+
+def request_stats():
+    """
+    Return the RequestStats of the request being served, or None outside of a request.
+    """
+    return _request.get()
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _request.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.queries += 1
+        stats.db_seconds += time.perf_counter() - started
+
+
+def instrument_connection(sender, connection, **kwargs):
+    """
+    Install the query counter on a new database connection.
+    """
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, queries, response size and cache lookups of every request.
+
+    Put it first in ``MIDDLEWARE`` so the latency covers the other middleware. Works under
+    WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = RequestStats()
+        token = _request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _request.set(stats)
+        started = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            _request.reset(token)
+        self.record(request, response, time.perf_counter() - started, stats)
+        return response
+
+    def record(self, request, response, seconds, stats):
+        match = request.resolver_match
+        view_name = match.view_name if match else UNRESOLVED
+        if view_name == METRICS_VIEW_NAME:
+            return
+        size = None if response.streaming else len(response.content)
+        _record(view_name, seconds, stats, response.status_code, size)
+
+
+def _merged():
+    """
+    Return the metrics of every thread, merged per URL name.
+    """
+    merged = {}
+    with _buffers_lock:
+        buffers = list(_buffers.values())
+        for view_name, stats in _retired.items():
+            merged.setdefault(view_name, ViewStats()).merge(stats)
+    for buffer in buffers:
+        # Copy first: the owning thread may add a view while this one reads.
+        for view_name, stats in list(buffer.items()):
+            merged.setdefault(view_name, ViewStats()).merge(stats)
+    return merged
+
+
+def _labels(**labels):
+    def escape(value):
+        return str(value).replace('\\', r'\\').replace('"', r'\"').replace('\n', r'\n')
+    return '{' + ','.join(f'{name}="{escape(value)}"' for name, value in labels.items()) + '}'
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _histogram_lines(name, histogram, view):
+    cumulative = 0
+    for bound, count in zip((*histogram.bounds, '+Inf'), histogram.counts):
+        cumulative += count
+        yield f'{name}_bucket{_labels(view=view, le=bound)} {cumulative}'
+    yield f'{name}_sum{_labels(view=view)} {_number(histogram.sum)}'
+    yield f'{name}_count{_labels(view=view)} {cumulative}'
+
+
+def render():
+    """
+    Return the metrics of the process in the Prometheus text exposition format.
+
+    Returns:
+        str: The metrics, one family after the other.
+    """
+    merged = sorted(_merged().items())
+    families = (
+        ('hotels_requests_total', 'counter', 'Requests served, per URL name and status code.',
+         lambda view, stats: (f'hotels_requests_total{_labels(view=view, status=status)} {count}'
+                              for status, count in sorted(stats.statuses.items()))),
+        ('hotels_request_duration_seconds', 'histogram', 'Time to produce the response, per URL name.',
+         lambda view, stats: _histogram_lines('hotels_request_duration_seconds', stats.latency, view)),
+        ('hotels_request_queries', 'histogram', 'SQL queries per request, per URL name.',
+         lambda view, stats: _histogram_lines('hotels_request_queries', stats.queries, view)),
+        ('hotels_request_db_seconds_total', 'counter', 'Time spent in SQL queries, per URL name.',
+         lambda view, stats: (f'hotels_request_db_seconds_total{_labels(view=view)} {_number(stats.db_seconds)}',)),
+        ('hotels_response_bytes', 'histogram', 'Size of the response body (not streamed), per URL name.',
+         lambda view, stats: _histogram_lines('hotels_response_bytes', stats.size, view)),
+        ('hotels_cache_lookups_total', 'counter', 'Cache lookups of the read path, per URL name, cache and result.',
+         lambda view, stats: (f'hotels_cache_lookups_total{_labels(view=view, cache=cache, result=result)} {count}'
+                              for (cache, result), count in sorted(stats.cache.items()))),
+    )
+    lines = []
+    for name, kind, description, samples in families:
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {kind}')
+        for view, stats in merged:
+            lines.extend(samples(view, stats))
+    return '\n'.join(lines) + '\n'
+
+
+def metrics_view(request):
+    """
+    Serve the metrics of this process to a Prometheus scraper.
+
+    Every process has its own metrics: scrape each worker, or let each one listen on its own
+    address. The endpoint is not authenticated; restrict it to the monitoring network.
+    """
+    return HttpResponse(render(), content_type=CONTENT_TYPE)
+
+
+def reset():
+    """
+    Drop every recorded metric, e.g. between tests.
+    """
+    with _buffers_lock:
+        for buffer in _buffers.values():
+            buffer.clear()
+        _retired.clear()
@@ -1,55 +1,75 @@
 from django.db import models
 from django.forms import ValidationError
 
+from .validation import (
+    CITY_CODE_LENGTH, CITY_NAME_MAX_LENGTH, HOTEL_CODE_LENGTH, HOTEL_NAME_MAX_LENGTH, normalize_city, normalize_hotel,
+)
+
 # Create your models here.
 
 
 class Hotel(models.Model):
     
+    # No single-column index: city_id leads the composite index in Meta.indexes.
     city = models.ForeignKey(
         'City',
         on_delete=models.CASCADE,
         related_name='hotels',
+        db_index=False,
     )
 
     code = models.CharField(
-        max_length=5,
+        max_length=HOTEL_CODE_LENGTH,
         unique=True,
     )
     
     name = models.CharField(
-        max_length=50,
+        max_length=HOTEL_NAME_MAX_LENGTH,
+    )
+
+    # Copy of city.code, so hotels can be listed by city code without a join.
+    # Kept consistent by save() and by database triggers (see hotels.denormalize).
+    city_code = models.CharField(
+        max_length=CITY_CODE_LENGTH,
+        editable=False,
+        default='',
     )
     
     class Meta:
         verbose_name_plural = "Hotels"
         ordering = ['name']
+        indexes = [
+            # Hotels of a city in name order. With code (and the rowid, which every SQLite
+            # index carries) it covers the projection of the API and the catalog load.
+            models.Index(fields=['city', 'name', 'code'], name='hotel_city_name_code_idx'),
+            # The same by city code: the hotel list of a city is a single-table range scan.
+            models.Index(fields=['city_code', 'name', 'code'], name='hotel_citycode_name_code_idx'),
+            # Hotels in the default (Meta.ordering) order, e.g. a page of all hotels.
+            models.Index(fields=['name'], name='hotel_name_idx'),
+        ]
     
+    def save(self, *args, **kwargs):
+        if self.city_id is not None:
+            self.city_code = self.city.code
+        super().save(*args, **kwargs)
+
     def clean(self):
-        self.code = self.code.strip().upper()
-        self.name = self.name.strip()
+        # Query-free: the form field has already resolved the city (see hotels.validation).
+        self.code, self.name = normalize_hotel(self.code, self.name)
         
-        if len(self.code) != 5:
-            raise ValidationError('The hotel code must be 3 characters long')
-        
-        if not self.name:
-            raise ValidationError('The hotel name cannot be empty')
-        
-        if not self.city:
+        if self.city_id is None:
             raise ValidationError('The hotel must belong to a city')
-        if not City.objects.filter(pk=self.city.pk).exists():
-            raise ValidationError('The hotel must belong to an existing city')
         
         
 
 class City(models.Model):
     
     code = models.CharField(
-        max_length=3,
+        max_length=CITY_CODE_LENGTH,
         unique=True,
     )
     name = models.CharField(
-        max_length=100,
+        max_length=CITY_NAME_MAX_LENGTH,
         unique=True,
     )
     
@@ -58,14 +78,7 @@ class City(models.Model):
         ordering = ['name']
         
     def clean(self):
-        self.code = self.code.strip().upper()
-        self.name = self.name.strip()
-        
-        if len(self.code) != 3:
-            raise ValidationError('The city code must be 3 characters long')
-        
-        if not self.name:
-            raise ValidationError('The city name cannot be empty')
+        self.code, self.name = normalize_city(self.code, self.name)
 
     def __str__(self):
         return f"{self.name} ({self.code})"
\ No newline at end of file
@@ -0,0 +1,144 @@
+"""
+Module: pragmas
+
+SQLite connection profiles: the PRAGMAs applied to every new database connection.
+
+SQLite keeps most settings per connection, so they are applied when Django opens one (the
+``connection_created`` signal). ``settings.HOTELS_SQLITE_PROFILES`` maps each database
+alias to the name of a profile; aliases without a profile keep the SQLite defaults.
+
+Profiles:
+    - serving: The API and the admin. WAL journal, so readers never wait for a writer, and
+      ``synchronous=NORMAL``, which in WAL mode only syncs at checkpoints: a power loss may
+      drop the last transactions but never corrupts the database. A 64 MiB page cache, a
+      256 MiB memory map, temporary tables in memory and a 5 s busy timeout.
+    - reader: The serving profile on a connection that cannot write (``query_only``).
+    - bulk_import: Applied by import_csv for the duration of an import. The serving profile
+      with a larger cache and checkpoint interval and a longer busy timeout. It keeps
+      ``synchronous=NORMAL``: under WAL a commit does not sync anyway, and
+      ``synchronous=OFF`` would let an operating system crash during an import corrupt
+      the database.
+
+``settings.HOTELS_SQLITE_PRAGMAS`` may add profiles or override pragmas of the built-in ones.
+
+Functions:
+    - get_profile: The pragmas of a profile.
+    - apply: Set pragmas on a connection.
+    - current: Read the values of pragmas from a connection.
+    - configure_connection: ``connection_created`` receiver applying the alias's profile.
+    - profile: Context manager that switches a connection to another profile.
+"""
+
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+PROFILES = {
+    'serving': {
+        'journal_mode': 'wal',
+        'synchronous': 'normal',
+        # Negative cache sizes are in KiB.
+        'cache_size': -65536,
+        'mmap_size': 256 * 2**20,
+        'temp_store': 'memory',
+        'busy_timeout': 5000,
+    },
+}
+PROFILES['reader'] = {**PROFILES['serving'], 'query_only': 'on'}
+PROFILES['bulk_import'] = {
+    **PROFILES['serving'],
+    'cache_size': -262144,
+    'wal_autocheckpoint': 10000,
+    'busy_timeout': 30000,
+}
+
+
+def get_profile(name):
+    """
+    Return the pragmas of a profile, with the overrides of ``HOTELS_SQLITE_PRAGMAS``.
+
+    Args:
+        name (str): The profile name.
+
+    Returns:
+        dict: Pragma names mapped to their values.
+
+    Raises:
+        KeyError: If the profile does not exist.
+    """
+    overrides = getattr(settings, 'HOTELS_SQLITE_PRAGMAS', {})
+    if name not in PROFILES and name not in overrides:
+        raise KeyError(f'Unknown SQLite profile: {name}')
+    return {**PROFILES.get(name, {}), **overrides.get(name, {})}
+
+
+def apply(connection, pragmas):
+    """
+    Set pragmas on a connection.
+
+    Args:
+        connection: The Django database connection.
+        pragmas (dict): Pragma names mapped to their values.
+    """
+    with connection.cursor() as cursor:
+        for name, value in pragmas.items():
+            cursor.execute(f'PRAGMA {name} = {value}')
+
+
+def current(connection, names):
+    """
+    Read the values of pragmas from a connection.
+
+    Args:
+        connection: The Django database connection.
+        names (iterable): Pragma names.
+
+    Returns:
+        dict: Pragma names mapped to their current values, for the pragmas that have one.
+    """
+    values = {}
+    with connection.cursor() as cursor:
+        for name in names:
+            cursor.execute(f'PRAGMA {name}')
+            row = cursor.fetchone()
+            # Some pragmas report nothing, e.g. mmap_size of an in-memory database.
+            if row is not None:
+                values[name] = row[0]
+    return values
+
+
+def configure_connection(sender, connection, **kwargs):
+    """
+    Apply the profile configured for the alias of a new SQLite connection.
+    """
+    if connection.vendor != 'sqlite':
+        return
+    name = getattr(settings, 'HOTELS_SQLITE_PROFILES', {}).get(connection.alias)
+    if name:
+        apply(connection, get_profile(name))
+
+
+@contextmanager
+def profile(name, using=DEFAULT_DB_ALIAS):
+    """
+    Switch a connection to another profile and restore its pragmas on exit.
+
+    SQLite does not allow changing the durability inside a transaction, so the profile is
+    only applied outside of one. Does nothing on other backends.
+
+    Args:
+        name (str): The profile name.
+        using (str): The database alias.
+    """
+    connection = connections[using]
+    if connection.vendor != 'sqlite' or connection.in_atomic_block:
+        yield
+        return
+    pragmas = get_profile(name)
+    previous = current(connection, pragmas)
+    apply(connection, pragmas)
+    try:
+        yield
+    finally:
+        apply(connection, previous)
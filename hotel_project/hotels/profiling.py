@@ -0,0 +1,295 @@
+"""
+Module: profiling
+
+Opt-in profiling of sampled requests, slow requests and import runs, written to disk.
+
+``ProfilingMiddleware`` is disabled unless a sample rate or a latency threshold is
+configured: it then raises ``MiddlewareNotUsed`` and Django leaves it out of the middleware
+chain, so requests pay nothing for it. When enabled:
+    - A fraction of the requests (HOTELS_PROFILE_SAMPLE_RATE) run under cProfile, and their
+      profile is always written (``.prof``, readable with ``pstats`` or snakeviz).
+    - Every other request is watched by a stack sampler thread, which records the stack of
+      the request thread every HOTELS_PROFILE_INTERVAL seconds. Whether a request is slow is
+      only known once it finished, and tracing every call of every request would slow all
+      of them down; the samples are only written when the request took longer than
+      HOTELS_PROFILE_SLOW_SECONDS (``.folded``: one stack per line with its sample count,
+      the input format of flame graph tools).
+
+``profile()`` runs a block under cProfile and writes its profile unconditionally; import_csv
+uses it for ``--profile``.
+
+Next to every profile a ``.json`` summary holds the URL (or command), the status code, the
+duration, and the SQL statements sent, grouped by shape (see ``hotels.querybudget``) with
+their count and time. Only the newest HOTELS_PROFILE_KEEP profiles are kept in
+HOTELS_PROFILE_DIR.
+
+The middleware only wraps the synchronous request path: under ASGI, enabling it makes Django
+run the request in a worker thread.
+
+Settings:
+    - HOTELS_PROFILE_SAMPLE_RATE: Fraction of requests to profile (default 0).
+    - HOTELS_PROFILE_SLOW_SECONDS: Latency above which a request's samples are written (default None).
+    - HOTELS_PROFILE_INTERVAL: Seconds between two stack samples (default 0.005).
+    - HOTELS_PROFILE_DIR: Directory of the profiles.
+    - HOTELS_PROFILE_KEEP: Number of profiles kept (default 200).
+
+Functions:
+    - profile: Context manager that profiles a block and writes the profile.
+    - profile_dir: The directory the profiles are written to.
+    - rotate: Delete all but the newest profiles of a directory.
+
+Classes:
+    - ProfilingMiddleware: Middleware profiling sampled and slow requests.
+    - StackSampler: Thread sampling the stacks of the watched threads.
+"""
+
+import cProfile
+import json
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from contextlib import ExitStack, contextmanager
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+
+SAMPLE_INTERVAL = 0.005
+KEEP = 200
+# Statement shapes listed in a summary, by total time.
+TOP_QUERIES = 20
+MAX_STACK_DEPTH = 100
+
+
+def profile_dir():
+    """
+    Return the directory the profiles are written to.
+    """
+    return Path(getattr(settings, 'HOTELS_PROFILE_DIR', None) or Path(settings.BASE_DIR) / 'profiles')
+
+
+class QueryRecorder:
+    """
+    Execute wrapper recording the statements of a profiled run and their duration.
+    """
+
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((sql, time.perf_counter() - started))
+
+    @contextmanager
+    def installed(self):
+        """
+        Record the statements sent through every connection of the current thread.
+        """
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(self))
+            yield self
+
+    def summary(self):
+        from .querybudget import normalize
+
+        shapes = {}
+        for sql, seconds in self.queries:
+            shape = shapes.setdefault(normalize(sql), [0, 0.0])
+            shape[0] += 1
+            shape[1] += seconds
+        top = sorted(shapes.items(), key=lambda item: item[1][1], reverse=True)[:TOP_QUERIES]
+        return {
+            'count': len(self.queries),
+            'seconds': sum(seconds for _sql, seconds in self.queries),
+            'shapes': [{'sql': sql, 'count': count, 'seconds': seconds} for sql, (count, seconds) in top],
+        }
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    return f'{code.co_name} ({code.co_filename}:{frame.f_lineno})'
+
+
+class StackSampler(threading.Thread):
+    """
+    Daemon thread recording, at a fixed interval, the stacks of the threads being watched.
+
+    Watching a thread costs a dict update; the sampler reads the frames of all threads once
+    per interval and only walks the stacks of the watched ones.
+    """
+
+    def __init__(self, interval=SAMPLE_INTERVAL):
+        super().__init__(name='hotels-profiling-sampler', daemon=True)
+        self.interval = interval
+        self.watched = {}
+        self.stopped = threading.Event()
+
+    def watch(self, ident):
+        """
+        Start sampling a thread.
+
+        Returns:
+            Counter: The samples, as folded stacks (root first, ``;``-separated) and their counts.
+        """
+        samples = self.watched[ident] = Counter()
+        return samples
+
+    def unwatch(self, ident):
+        self.watched.pop(ident, None)
+
+    def stop(self):
+        self.stopped.set()
+
+    def run(self):
+        while not self.stopped.wait(self.interval):
+            if not self.watched:
+                continue
+            frames = sys._current_frames()
+            for ident, samples in list(self.watched.items()):
+                frame = frames.get(ident)
+                stack = []
+                while frame is not None and len(stack) < MAX_STACK_DEPTH:
+                    stack.append(_frame_name(frame))
+                    frame = frame.f_back
+                if stack:
+                    samples[';'.join(reversed(stack))] += 1
+
+
+_sampler = None
+_sampler_lock = threading.Lock()
+
+
+def _get_sampler(interval):
+    global _sampler
+    with _sampler_lock:
+        if _sampler is None:
+            _sampler = StackSampler(interval)
+            _sampler.start()
+        return _sampler
+
+
+def _write(label, trigger, seconds, recorder, info, profiler=None, samples=None):
+    """
+    Write a profile and its summary to the profile directory, then rotate the directory.
+
+    Returns:
+        Path: The summary file.
+    """
+    directory = profile_dir()
+    directory.mkdir(parents=True, exist_ok=True)
+    slug = re.sub(r'[^A-Za-z0-9]+', '_', label).strip('_')[:60]
+    stem = f"{datetime.now().strftime('%Y%m%dT%H%M%S.%f')}-{trigger}-{slug}"
+    if profiler is not None:
+        profile_file = directory / f'{stem}.prof'
+        profiler.dump_stats(profile_file)
+    else:
+        profile_file = directory / f'{stem}.folded'
+        profile_file.write_text(''.join(f'{stack} {count}\n' for stack, count in samples.most_common()))
+    summary_file = directory / f'{stem}.json'
+    summary_file.write_text(json.dumps({
+        'label': label,
+        'trigger': trigger,
+        'started': datetime.fromtimestamp(time.time() - seconds).isoformat(),
+        'seconds': seconds,
+        **info,
+        'queries': recorder.summary(),
+        'profile': profile_file.name,
+    }, indent=2))
+    rotate(directory, getattr(settings, 'HOTELS_PROFILE_KEEP', KEEP))
+    return summary_file
+
+
+def rotate(directory, keep):
+    """
+    Delete all but the ``keep`` newest profiles (summary and profile files) of a directory.
+    """
+    # The names start with the time stamp, so they sort by age.
+    summaries = sorted(Path(directory).glob('*.json'))
+    for summary_file in summaries[:max(len(summaries) - keep, 0)]:
+        for path in Path(directory).glob(f'{summary_file.stem}.*'):
+            path.unlink(missing_ok=True)
+
+
+@contextmanager
+def profile(label, **info):
+    """
+    Run a block under cProfile and write its profile and summary, however long it took.
+
+    Args:
+        label (str): What is profiled, e.g. the command line.
+        **info: Extra fields of the summary.
+    """
+    recorder = QueryRecorder()
+    profiler = cProfile.Profile()
+    started = time.perf_counter()
+    with recorder.installed():
+        profiler.enable()
+        try:
+            yield
+        finally:
+            profiler.disable()
+            _write(label, 'command', time.perf_counter() - started, recorder, info, profiler=profiler)
+
+
+class ProfilingMiddleware:
+    """
+    Profile a sample of the requests, and keep the stack samples of slow requests.
+
+    Put it right after ``MetricsMiddleware`` so the profile covers the other middleware.
+
+    Raises:
+        MiddlewareNotUsed: If neither a sample rate nor a latency threshold is configured.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'HOTELS_PROFILE_SAMPLE_RATE', 0)
+        self.slow_seconds = getattr(settings, 'HOTELS_PROFILE_SLOW_SECONDS', None)
+        if not self.sample_rate and self.slow_seconds is None:
+            raise MiddlewareNotUsed
+        self.sampler = None
+        if self.slow_seconds is not None:
+            self.sampler = _get_sampler(getattr(settings, 'HOTELS_PROFILE_INTERVAL', SAMPLE_INTERVAL))
+
+    def __call__(self, request):
+        sampled = self.sample_rate and random.random() < self.sample_rate
+        if not sampled and self.sampler is None:
+            return self.get_response(request)
+        recorder = QueryRecorder()
+        profiler = samples = None
+        started = time.perf_counter()
+        with recorder.installed():
+            if sampled:
+                profiler = cProfile.Profile()
+                profiler.enable()
+                try:
+                    response = self.get_response(request)
+                finally:
+                    profiler.disable()
+            else:
+                ident = threading.get_ident()
+                samples = self.sampler.watch(ident)
+                try:
+                    response = self.get_response(request)
+                finally:
+                    self.sampler.unwatch(ident)
+        seconds = time.perf_counter() - started
+        if sampled or seconds >= self.slow_seconds:
+            match = request.resolver_match
+            info = {
+                'method': request.method,
+                'view': match.view_name if match else None,
+                'status': response.status_code,
+            }
+            _write(request.get_full_path(), 'sampled' if sampled else 'slow', seconds, recorder, info,
+                   profiler=profiler, samples=samples)
+        return response
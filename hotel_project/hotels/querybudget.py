@@ -0,0 +1,135 @@
+"""
+Module: querybudget
+
+Query budgets for tests: fail when an entry point sends more SQL than it is allowed to.
+
+``QueryBudget`` captures the statements sent while it is active, like Django's
+``assertNumQueries``, and groups them by shape: the statement with its literals replaced by
+``?``, ``IN`` lists and multi-row ``VALUES`` collapsed, and savepoint names erased. A shape
+that repeats many times is the signature of an N+1 pattern (one query per row of a page, per
+row of an import), so a budget bounds both the total number of statements and the number of
+times any single shape may repeat. On failure the message lists every shape with its count.
+
+Budgets are declared per entry point in ``hotels/tests/test_query_budgets.py``; the budget
+of an import is a function of the number of rows imported.
+
+Functions:
+    - normalize: The shape of a SQL statement.
+
+Classes:
+    - QueryBudget: Context manager and decorator enforcing a query budget.
+"""
+
+import re
+from collections import Counter
+from contextlib import ContextDecorator
+
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test.utils import CaptureQueriesContext
+
+# Shapes that may repeat this many times by default; an N+1 over a page of rows repeats more.
+MAX_REPEATS = 5
+
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_NUMBER = re.compile(r'(?<![\w"])-?\d+(?:\.\d+)?(?![\w"])')
+_SAVEPOINT = re.compile(r'"s\d+_x\d+"')
+_TUPLE = r'\((?:\?|NULL)(?:, ?(?:\?|NULL))*\)'
+_TUPLES = re.compile(rf'{_TUPLE}(?:, ?{_TUPLE})*')
+_SPACE = re.compile(r'\s+')
+
+
+def normalize(sql):
+    """
+    Return the shape of a SQL statement, so that the same query with other values compares equal.
+
+    Args:
+        sql (str): A statement as captured by Django (with its parameters inlined), or as
+            sent to the driver (with ``%s`` placeholders).
+
+    Returns:
+        str: The statement with literals replaced by ``?``, lists of values by ``(...)``
+            and savepoint names by ``"s?"``.
+    """
+    sql = _STRING.sub('?', sql).replace('%s', '?')
+    sql = _SAVEPOINT.sub('"s?"', sql)
+    sql = _NUMBER.sub('?', sql)
+    sql = _TUPLES.sub('(...)', sql)
+    return _SPACE.sub(' ', sql).strip()
+
+
+class QueryBudget(ContextDecorator):
+    """
+    Fail if the block sends more statements, or repeats a statement shape more often, than allowed.
+
+    Use it as a context manager or a decorator::
+
+        with QueryBudget(3, label='hotel list'):
+            client.get('/hotels/api/hotels/AMS')
+
+    The statements are captured on the given database aliases only. Inside a ``TestCase``
+    reads go to the primary (see ``hotels.routers``), so the default alias sees everything.
+
+    Args:
+        max_queries (int): The most statements the block may send, or None for no limit.
+        max_repeats (int): The most times a single statement shape may be sent.
+        using (tuple): The database aliases to capture.
+        label (str): Name of the entry point, used in failure messages.
+
+    Attributes:
+        queries (list): The captured statements, once the block has run.
+
+    Raises:
+        AssertionError: On exit, if the budget is exceeded (and the block raised nothing).
+    """
+
+    def __init__(self, max_queries=None, max_repeats=MAX_REPEATS, using=(DEFAULT_DB_ALIAS,), label=None):
+        self.max_queries = max_queries
+        self.max_repeats = max_repeats
+        self.using = using
+        self.label = label
+        self.queries = []
+
+    def __enter__(self):
+        self.contexts = [CaptureQueriesContext(connections[alias]) for alias in self.using]
+        for context in self.contexts:
+            context.__enter__()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        for context in self.contexts:
+            context.__exit__(exc_type, exc_value, traceback)
+        self.queries = [query['sql'] for context in self.contexts for query in context.captured_queries]
+        if exc_type is None:
+            self.check()
+
+    @property
+    def shapes(self):
+        """
+        Counter of the statement shapes sent by the block.
+        """
+        return Counter(normalize(sql) for sql in self.queries)
+
+    @property
+    def repeated(self):
+        """
+        The shapes sent more than ``max_repeats`` times, with their counts.
+        """
+        return {shape: count for shape, count in self.shapes.items() if count > self.max_repeats}
+
+    def check(self):
+        """
+        Raise AssertionError if the captured statements exceed the budget.
+        """
+        errors = []
+        if self.max_queries is not None and len(self.queries) > self.max_queries:
+            errors.append(f'{len(self.queries)} queries, budget {self.max_queries}')
+        if self.repeated:
+            errors.append(f'{len(self.repeated)} statement shape(s) repeated more than {self.max_repeats} times (N+1)')
+        if errors:
+            raise AssertionError('{}: {}\n{}'.format(self.label or 'Query budget exceeded', '; '.join(errors), self.report()))
+
+    def report(self):
+        """
+        Return the captured statement shapes, most frequent first, one per line.
+        """
+        return '\n'.join(f'{count:>5} x {shape}' for shape, count in self.shapes.most_common())
@@ -0,0 +1,373 @@
+"""
+Module: renderers
+
+Lean JSON rendering for the read API.
+
+The public representation of the catalog has a fixed field set (see ``hotels.serializers``):
+    - City:  {"code": ..., "name": ...}
+    - Hotel: {"code": ..., "name": ..., "city": <city code>}
+    - City statistics: {"code": ..., "name": ..., "hotels": <hotel count>}
+    - Change: {"version": ..., "type": "city" | "hotel", "op": "insert" | "update" | "delete",
+      "code": ..., plus the other fields of the city or hotel unless op is "delete"}
+
+Instead of building a dict per row and passing it through a generic encoder, every row is
+written as a JSON object fragment with the C-accelerated string quoting of the standard
+library. Fragments are joined into arrays, so the output is byte-for-byte what the
+serializers would produce, without per-row dicts or serializer instances.
+
+Responses are compressed according to the Accept-Encoding request header: brotli when
+the optional ``brotli`` package is installed, otherwise gzip. Bodies that are cached on the
+catalog snapshot are ``CachedBody`` instances, which keep their compressed variants, so a
+hot endpoint is compressed once per data version instead of once per request. Requests
+compress with fast settings (brotli quality 5, gzip level 5): the strongest settings save a
+little more but take seconds for a large body, so only the warm-up (see ``hotels.warmup``)
+uses them, before the process serves requests. The async views compress in a worker thread,
+never on the event loop.
+
+Functions:
+    - city_fragment / hotel_fragment / city_stats_fragment / change_fragment: The JSON object for one row.
+    - json_array: Join fragments into a JSON array.
+    - json_object: Join (key, JSON value) pairs into a JSON object.
+    - stream_json_array / stream_ndjson: Encode chunks of fragments for a streaming response.
+    - negotiate_encoding: Pick a content coding from an Accept-Encoding header.
+    - json_response / ajson_response / streaming_response: Build (compressed) responses.
+
+Classes:
+    - CachedBody: A rendered body that memoises its compressed variants.
+"""
+
+import gzip
+import threading
+import zlib
+from json.encoder import encode_basestring as quote
+
+from asgiref.sync import sync_to_async
+from django.http import HttpResponse, StreamingHttpResponse
+from django.utils.cache import patch_vary_headers
+
+from .metrics import record_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+JSON_CONTENT_TYPE = 'application/json'
+NDJSON_CONTENT_TYPE = 'application/x-ndjson'
+
+# Bodies smaller than this are sent uncompressed: the saving does not pay for the work.
+COMPRESS_MIN_SIZE = 512
+# Content codings in order of preference.
+ENCODINGS = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def city_fragment(code, name):
+    """
+    Return the JSON object of a city.
+
+    Args:
+        code (str): City code.
+        name (str): City name.
+
+    Returns:
+        str: The JSON text.
+    """
+    return '{"code":%s,"name":%s}' % (quote(code), quote(name))
+
+
+def hotel_fragment(code, name, quoted_city_code):
+    """
+    Return the JSON object of a hotel.
+
+    Args:
+        code (str): Hotel code.
+        name (str): Hotel name.
+        quoted_city_code (str): The city code, already quoted with ``quote()``.
+
+    Returns:
+        str: The JSON text.
+    """
+    return '{"code":%s,"name":%s,"city":%s}' % (quote(code), quote(name), quoted_city_code)
+
+
+def city_stats_fragment(code, name, hotel_count):
+    """
+    Return the JSON object of the statistics of a city.
+
+    Args:
+        code (str): City code.
+        name (str): City name.
+        hotel_count (int): Number of hotels in the city.
+
+    Returns:
+        str: The JSON text.
+    """
+    return '{"code":%s,"name":%s,"hotels":%d}' % (quote(code), quote(name), hotel_count)
+
+
+def change_fragment(version, kind, op, code, name, city_code):
+    """
+    Return the JSON object of a change-log entry (see ``hotels.changelog``).
+
+    Args:
+        version (int): The version of the change.
+        kind (str): 'city' or 'hotel'.
+        op (str): 'insert', 'update' or 'delete'.
+        code (str): The code of the city or hotel.
+        name (str): The name after the change (None for deletes).
+        city_code (str): The city code of a hotel after the change (None otherwise).
+
+    Returns:
+        str: The JSON text.
+    """
+    text = '{"version":%d,"type":"%s","op":"%s","code":%s' % (version, kind, op, quote(code))
+    if op != 'delete':
+        text += ',"name":' + quote(name)
+        if kind == 'hotel':
+            text += ',"city":' + quote(city_code)
+    return text + '}'
+
+
+def json_array(fragments):
+    """
+    Join JSON fragments into a UTF-8 encoded JSON array.
+
+    Args:
+        fragments (iterable): JSON texts (str).
+
+    Returns:
+        bytes: The encoded array.
+    """
+    return ('[' + ','.join(fragments) + ']').encode()
+
+
+def json_object(items):
+    """
+    Join (key, encoded JSON value) pairs into a UTF-8 encoded JSON object.
+
+    Args:
+        items (iterable): Pairs of a key (str) and an already encoded value (bytes).
+
+    Returns:
+        bytes: The encoded object.
+    """
+    return b'{' + b','.join(quote(key).encode() + b':' + value for key, value in items) + b'}'
+
+
+def stream_json_array(chunks):
+    """
+    Encode chunks of JSON fragments as one JSON array, one piece per chunk.
+
+    The opening bracket is produced before the first chunk is requested, so a streaming
+    response starts immediately.
+
+    Args:
+        chunks (iterable): Lists of JSON texts (str).
+
+    Yields:
+        bytes: Pieces of the encoded array.
+    """
+    yield b'['
+    separator = ''
+    for fragments in chunks:
+        if fragments:
+            yield (separator + ','.join(fragments)).encode()
+            separator = ','
+    yield b']'
+
+
+async def astream_json_array(chunks):
+    """
+    Async variant of stream_json_array() for async iterables of chunks.
+    """
+    yield b'['
+    separator = ''
+    async for fragments in chunks:
+        if fragments:
+            yield (separator + ','.join(fragments)).encode()
+            separator = ','
+    yield b']'
+
+
+def stream_ndjson(chunks):
+    """
+    Encode chunks of JSON fragments as newline-delimited JSON, one piece per chunk.
+
+    Args:
+        chunks (iterable): Lists of JSON texts (str).
+
+    Yields:
+        bytes: Pieces of the encoded document.
+    """
+    for fragments in chunks:
+        if fragments:
+            yield ('\n'.join(fragments) + '\n').encode()
+
+
+async def astream_ndjson(chunks):
+    """
+    Async variant of stream_ndjson() for async iterables of chunks.
+    """
+    async for fragments in chunks:
+        if fragments:
+            yield ('\n'.join(fragments) + '\n').encode()
+
+
+def negotiate_encoding(accept_encoding, encodings):
+    """
+    Pick the preferred content coding accepted by the client.
+
+    Args:
+        accept_encoding (str): The Accept-Encoding request header.
+        encodings (tuple): The supported codings, most preferred first.
+
+    Returns:
+        str: The chosen coding, or None for the identity coding.
+    """
+    accepted = {}
+    for item in accept_encoding.split(','):
+        coding, _, params = item.strip().partition(';')
+        quality = 1.0
+        params = params.strip()
+        if params.startswith('q='):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        accepted[coding.strip().lower()] = quality
+    wildcard = accepted.get('*', 0.0)
+    for encoding in encodings:
+        if accepted.get(encoding, wildcard) > 0:
+            return encoding
+    return None
+
+
+def compress(data, encoding, best=False):
+    """
+    Compress a body.
+
+    Args:
+        data (bytes): The body.
+        encoding (str): 'br' or 'gzip'.
+        best (bool): Use the slowest, strongest settings (off the request path only).
+
+    Returns:
+        bytes: The compressed body.
+    """
+    if encoding == 'br':
+        return brotli.compress(data, quality=11 if best else 5)
+    return gzip.compress(data, compresslevel=9 if best else 5, mtime=0)
+
+
+class CachedBody(bytes):
+    """
+    A rendered body that is cached (on a catalog snapshot) and memoises its compressed variants.
+    """
+
+    def variant(self, encoding, best=False):
+        """
+        Return the body compressed with the given coding, compressing it on first use.
+
+        Concurrent first requests wait for a single compression instead of each running it.
+
+        Args:
+            encoding (str): 'br' or 'gzip'.
+            best (bool): Compress with the strongest settings if the variant is missing
+                (the warm-up; requests use the fast settings).
+
+        Returns:
+            bytes: The compressed body.
+        """
+        variants = self.__dict__
+        data = variants.get(encoding)
+        record_cache('compressed', data is not None)
+        if data is None:
+            with variants.setdefault('lock', threading.Lock()):
+                data = variants.get(encoding)
+                if data is None:
+                    data = variants[encoding] = compress(self, encoding, best=best)
+        return data
+
+    def has_variant(self, encoding):
+        """
+        Return whether the body was already compressed with the given coding.
+        """
+        return encoding in self.__dict__
+
+
+def json_response(request, body):
+    """
+    Wrap an encoded JSON body in a response, compressed as the client accepts.
+
+    Args:
+        request (HttpRequest): The request, for its Accept-Encoding header.
+        body (bytes): The encoded JSON; a CachedBody reuses its compressed variants.
+
+    Returns:
+        HttpResponse: The response.
+    """
+    encoding = None
+    if len(body) >= COMPRESS_MIN_SIZE:
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), ENCODINGS)
+    if encoding is None:
+        response = HttpResponse(body, content_type=JSON_CONTENT_TYPE)
+    else:
+        data = body.variant(encoding) if isinstance(body, CachedBody) else compress(body, encoding)
+        response = HttpResponse(data, content_type=JSON_CONTENT_TYPE)
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+async def ajson_response(request, body):
+    """
+    Async variant of json_response(): a body that has to be compressed is compressed in a
+    worker thread, so the event loop keeps serving other requests meanwhile.
+    """
+    if len(body) >= COMPRESS_MIN_SIZE:
+        encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), ENCODINGS)
+        if encoding is not None and not (isinstance(body, CachedBody) and body.has_variant(encoding)):
+            return await sync_to_async(json_response, thread_sensitive=False)(request, body)
+    return json_response(request, body)
+
+
+def gzip_stream(chunks):
+    """
+    Gzip a stream, flushing after every chunk so each chunk is sent without delay.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+async def agzip_stream(chunks):
+    """
+    Async variant of gzip_stream() for async iterables of chunks.
+    """
+    compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+    async for chunk in chunks:
+        yield compressor.compress(chunk) + compressor.flush(zlib.Z_SYNC_FLUSH)
+    yield compressor.flush()
+
+
+def streaming_response(request, chunks, content_type):
+    """
+    Build a streaming response, gzipped when the client accepts it.
+
+    Args:
+        request (HttpRequest): The request, for its Accept-Encoding header.
+        chunks (iterable): The encoded body pieces; an async iterable under ASGI.
+        content_type (str): The content type.
+
+    Returns:
+        StreamingHttpResponse: The response.
+    """
+    encoding = negotiate_encoding(request.META.get('HTTP_ACCEPT_ENCODING', ''), ('gzip',))
+    if encoding is not None:
+        chunks = agzip_stream(chunks) if hasattr(chunks, '__aiter__') else gzip_stream(chunks)
+    response = StreamingHttpResponse(chunks, content_type=content_type)
+    if encoding is not None:
+        response['Content-Encoding'] = encoding
+    patch_vary_headers(response, ('Accept-Encoding',))
+    return response
@@ -0,0 +1,57 @@
+"""
+Module: routers
+
+Database router that separates the read path of the catalog from its writers.
+
+Reads of the hotels models go to the read alias (``replica`` in ``settings.DATABASES``):
+a second connection to the same SQLite file in WAL mode, or a separate replica database.
+In WAL mode readers see the last committed state and are never blocked by a writer, so
+the API keeps answering while an import holds a long write transaction on ``default``.
+
+Writes always go to ``default``. Reads made while the writer connection of the current
+thread is inside a transaction go to ``default`` as well, so importers and admin forms read
+their own uncommitted writes.
+
+Classes:
+    - ReadReplicaRouter: Route reads to the read alias and writes to the primary.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, connections
+
+READ_ALIAS = 'replica'
+
+_ALIASES = {DEFAULT_DB_ALIAS, READ_ALIAS}
+
+
+class ReadReplicaRouter:
+    """
+    Route reads of the hotels app to the read alias and writes to the primary.
+
+    Models of other apps (auth, sessions, admin log) are left to the default routing.
+    """
+
+    app_label = 'hotels'
+
+    def db_for_read(self, model, **hints):
+        if model._meta.app_label != self.app_label or READ_ALIAS not in connections.settings:
+            return None
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return READ_ALIAS
+
+    def db_for_write(self, model, **hints):
+        if model._meta.app_label != self.app_label:
+            return None
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Both aliases hold the same data.
+        if obj1._state.db in _ALIASES and obj2._state.db in _ALIASES:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # The read alias is the same database, or a copy of it.
+        if db == READ_ALIAS:
+            return False
+        return None
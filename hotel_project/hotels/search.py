@@ -0,0 +1,161 @@
+"""
+Module: search
+
+Prefix and trigram index used for city autocomplete.
+
+City names and codes are folded (case-insensitive, accents removed) and stored in sorted
+key arrays, so a prefix lookup is a binary search followed by a short scan. Substring
+matches ("dam" in "Amsterdam") are answered from a trigram index.
+
+Results are ranked in tiers:
+    0. Exact city code match.
+    1. The name starts with the query.
+    2. A word in the name starts with the query.
+    3. The code starts with the query.
+    4. The name contains the query (queries of 3 or more characters).
+
+Within tiers 1-3 matches are ordered alphabetically by their folded key, so a lookup only
+has to read the first ``limit`` keys after the binary search. Substring matches are ordered
+by name.
+
+Classes:
+    - CitySearchIndex: Index over the rows of a catalog CityTable.
+
+Functions:
+    - fold: Normalise text for matching.
+"""
+
+import unicodedata
+from array import array
+from bisect import bisect_left
+
+
+def fold(text):
+    """
+    Normalise text for matching: remove accents, casefold and collapse whitespace.
+
+    Args:
+        text (str): The text to fold.
+
+    Returns:
+        str: The folded text.
+    """
+    decomposed = unicodedata.normalize('NFKD', text)
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(stripped.casefold().split())
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class _SortedKeys:
+    """
+    Sorted (key, row) pairs stored as two parallel columns.
+    """
+    __slots__ = ('keys', 'rows')
+
+    def __init__(self, pairs):
+        pairs.sort()
+        self.keys = [key for key, _row in pairs]
+        self.rows = array('l', (row for _key, row in pairs))
+
+    def prefixed(self, prefix):
+        """
+        Yield the rows whose key starts with the prefix.
+        """
+        keys, rows = self.keys, self.rows
+        index = bisect_left(keys, prefix)
+        while index < len(keys) and keys[index].startswith(prefix):
+            yield rows[index]
+            index += 1
+
+
+class CitySearchIndex:
+    """
+    Autocomplete index over the rows of a catalog CityTable.
+
+    Attributes:
+        names (list): Folded city name per row.
+        code_rows (dict): Maps a folded city code to its row.
+    """
+    __slots__ = ('names', 'code_rows', '_name_keys', '_word_keys', '_code_keys', '_trigram_rows')
+
+    def __init__(self, codes, names):
+        """
+        Build the index.
+
+        Args:
+            codes (list): City code per row.
+            names (list): City name per row.
+        """
+        self.names = [fold(name) for name in names]
+        folded_codes = [fold(code) for code in codes]
+        self.code_rows = {code: row for row, code in enumerate(folded_codes)}
+
+        word_pairs = []
+        trigram_rows = {}
+        for row, name in enumerate(self.names):
+            position = name.find(' ')
+            while position >= 0:
+                word_pairs.append((name[position + 1:], row))
+                position = name.find(' ', position + 1)
+            for trigram in _trigrams(name):
+                trigram_rows.setdefault(trigram, array('l')).append(row)
+
+        self._name_keys = _SortedKeys([(name, row) for row, name in enumerate(self.names)])
+        self._word_keys = _SortedKeys(word_pairs)
+        self._code_keys = _SortedKeys([(code, row) for row, code in enumerate(folded_codes)])
+        self._trigram_rows = trigram_rows
+
+    def _substring_rows(self, query):
+        """
+        Yield the rows whose folded name contains the query (at least 3 characters), in row order.
+        """
+        postings = [self._trigram_rows.get(trigram) for trigram in _trigrams(query)]
+        if not all(postings):
+            return
+        # Every match appears in the posting list of each of its trigrams: scan the shortest
+        # list (which is in row order) and verify the candidates.
+        names = self.names
+        for row in min(postings, key=len):
+            if query in names[row]:
+                yield row
+
+    def search(self, query, limit=10):
+        """
+        Return the best matching rows for a query.
+
+        Args:
+            query (str): The text typed by the user.
+            limit (int): Maximum number of rows to return.
+
+        Returns:
+            list: Matching row numbers, best match first.
+        """
+        query = fold(query)
+        if not query or limit <= 0:
+            return []
+
+        tiers = [
+            self._name_keys.prefixed(query),
+            self._word_keys.prefixed(query),
+            self._code_keys.prefixed(query),
+        ]
+        if len(query) >= 3:
+            tiers.append(self._substring_rows(query))
+
+        result = []
+        seen = set()
+        exact = self.code_rows.get(query)
+        if exact is not None:
+            result.append(exact)
+            seen.add(exact)
+        for rows in tiers:
+            for row in rows:
+                if len(result) >= limit:
+                    return result
+                if row not in seen:
+                    result.append(row)
+                    seen.add(row)
+        return result
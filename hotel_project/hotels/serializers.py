@@ -1,12 +1,18 @@
 from rest_framework import serializers
 from .models import Hotel, City
 
+# Public representation of the catalog. The read API renders the same fields directly
+# from the in-memory catalog (see hotels.renderers); keep both in sync.
+
 class CitySerializer(serializers.ModelSerializer):
     class Meta:
         model = City
-        fields = ['code, name']
+        fields = ['code', 'name']
         
 class HotelSerializer(serializers.ModelSerializer):
+    # The denormalized city code: serializing a hotel does not load its city.
+    city = serializers.CharField(source='city_code', read_only=True)
+
     class Meta:
         model = Hotel
-        fields = ['city', 'code', 'name']
\ No newline at end of file
+        fields = ['code', 'name', 'city']
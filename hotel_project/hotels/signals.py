@@ -0,0 +1,40 @@
+"""
+Module: signals
+
+Signal receivers that keep derived read models in sync with the City and Hotel tables.
+
+The catalog data version is read from the change log (see ``hotels.catalog``), so every
+write is noticed by the processes serving the read API. Every save or delete of a City or
+Hotel also bumps it in this process, so that a write made through the connection the catalog
+is read from is noticed as well. Saving a city also keeps the ``city_code`` of its hotels
+consistent (see ``hotels.denormalize``). Bulk writes that bypass model signals
+(``bulk_create``, ``QuerySet.update``) call ``catalog.bump_data_version()`` themselves.
+"""
+
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import catalog
+from .denormalize import sync_city_code
+from .models import City, Hotel
+
+
+@receiver(post_save, sender=City)
+@receiver(post_delete, sender=City)
+def city_changed(sender, **kwargs):
+    """Bump the catalog version after a city was written."""
+    catalog.bump_data_version()
+
+
+@receiver(post_save, sender=City)
+def city_saved(sender, instance, created, using, **kwargs):
+    """Copy a changed city code to the hotels of the city."""
+    if not created:
+        sync_city_code(instance, using)
+
+
+@receiver(post_save, sender=Hotel)
+@receiver(post_delete, sender=Hotel)
+def hotel_changed(sender, **kwargs):
+    """Bump the catalog version after a hotel was written."""
+    catalog.bump_data_version()
@@ -0,0 +1,159 @@
+"""
+Module: summary
+
+Precomputed per-city hotel counts.
+
+The table ``hotels_city_stats`` holds one row per city with the number of its hotels. Like
+the full-text index (see ``hotels.fulltext``) it is created after migrations and kept up
+to date incrementally by triggers on ``hotels_hotel`` and ``hotels_city``, so every write
+path is covered, including ``bulk_create`` and ``QuerySet.update``. The importers call
+``refresh()`` when they finish, which recounts every city in one statement and repairs
+any drift (for example from rows written while the triggers did not exist).
+
+Reading the counts is a scan of the small summary table joined with the cities, never a
+``GROUP BY`` over the hotels. On other database backends the counts are computed with an
+aggregate query instead.
+
+Functions:
+    - install: Create the summary table and its triggers, filling it when it is new.
+    - refresh: Recount the hotels of every city.
+    - city_counts: (code, name, hotel count) of every city, ordered by name.
+    - total_hotels: The number of hotels, summed over the cities.
+"""
+
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.models import Count
+
+from .models import City, Hotel
+
+STATS_TABLE = 'hotels_city_stats'
+
+_CREATE_TABLE = f"""
+    CREATE TABLE IF NOT EXISTS {STATS_TABLE} (
+        city_id INTEGER PRIMARY KEY NOT NULL,
+        hotel_count INTEGER NOT NULL DEFAULT 0
+    )
+"""
+
+_TRIGGERS = (
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_city_insert AFTER INSERT ON hotels_city BEGIN
+        INSERT OR IGNORE INTO {STATS_TABLE} (city_id, hotel_count) VALUES (new.id, 0);
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_city_delete AFTER DELETE ON hotels_city BEGIN
+        DELETE FROM {STATS_TABLE} WHERE city_id = old.id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_hotel_insert AFTER INSERT ON hotels_hotel BEGIN
+        UPDATE {STATS_TABLE} SET hotel_count = hotel_count + 1 WHERE city_id = new.city_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_hotel_delete AFTER DELETE ON hotels_hotel BEGIN
+        UPDATE {STATS_TABLE} SET hotel_count = hotel_count - 1 WHERE city_id = old.city_id;
+    END
+    """,
+    f"""
+    CREATE TRIGGER IF NOT EXISTS {STATS_TABLE}_hotel_move AFTER UPDATE OF city_id ON hotels_hotel
+    WHEN old.city_id != new.city_id BEGIN
+        UPDATE {STATS_TABLE} SET hotel_count = hotel_count - 1 WHERE city_id = old.city_id;
+        UPDATE {STATS_TABLE} SET hotel_count = hotel_count + 1 WHERE city_id = new.city_id;
+    END
+    """,
+)
+
+_REFRESH = (
+    f"DELETE FROM {STATS_TABLE}",
+    f"""
+    INSERT INTO {STATS_TABLE} (city_id, hotel_count)
+    SELECT c.id, COUNT(h.id) FROM hotels_city c LEFT JOIN hotels_hotel h ON h.city_id = c.id
+    GROUP BY c.id
+    """,
+)
+
+_COUNTS = f"""
+    SELECT c.code, c.name, s.hotel_count
+    FROM {STATS_TABLE} s JOIN hotels_city c ON c.id = s.city_id
+    ORDER BY c.name
+"""
+
+_TOTAL = f"SELECT COALESCE(SUM(hotel_count), 0) FROM {STATS_TABLE}"
+
+
+def _is_sqlite(using):
+    return connections[using].vendor == 'sqlite'
+
+
+def install(using=DEFAULT_DB_ALIAS):
+    """
+    Create the summary table and its triggers if they do not exist yet.
+
+    The table is (re)filled, so it is correct even if writes happened while it was missing.
+    Does nothing on other backends.
+
+    Args:
+        using (str): The database alias.
+    """
+    if not _is_sqlite(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(_CREATE_TABLE)
+        for trigger in _TRIGGERS:
+            cursor.execute(trigger)
+    refresh(using)
+
+
+def refresh(using=DEFAULT_DB_ALIAS):
+    """
+    Recount the hotels of every city in one set-based statement.
+
+    Args:
+        using (str): The database alias.
+    """
+    if not _is_sqlite(using):
+        return
+    with transaction.atomic(using=using), connections[using].cursor() as cursor:
+        for statement in _REFRESH:
+            cursor.execute(statement)
+
+
+def city_counts(using=None):
+    """
+    Return the number of hotels of every city.
+
+    Args:
+        using (str): The database alias. Defaults to the alias cities are read from.
+
+    Returns:
+        list: (city code, city name, hotel count) tuples ordered by city name.
+    """
+    using = using or router.db_for_read(City)
+    if not _is_sqlite(using):
+        return list(
+            City.objects.using(using).order_by('name')
+            .annotate(hotel_count=Count('hotels')).values_list('code', 'name', 'hotel_count')
+        )
+    with connections[using].cursor() as cursor:
+        cursor.execute(_COUNTS)
+        return cursor.fetchall()
+
+
+def total_hotels(using=None):
+    """
+    Return the number of hotels without counting the hotels table.
+
+    Args:
+        using (str): The database alias. Defaults to the alias hotels are read from.
+
+    Returns:
+        int: The sum of the per-city hotel counts.
+    """
+    using = using or router.db_for_read(Hotel)
+    if not _is_sqlite(using):
+        return Hotel.objects.using(using).count()
+    with connections[using].cursor() as cursor:
+        cursor.execute(_TOTAL)
+        return cursor.fetchone()[0]
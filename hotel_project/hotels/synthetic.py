@@ -0,0 +1,170 @@
+"""
+Module: synthetic
+
+Helpers to build synthetic City/Hotel datasets for benchmarks and load tests.
+
+The data is written to a scratch copy of the default database (the same database the test
+runner creates), so running a benchmark never touches the development or production data.
+
+Functions:
+    - scratch_database: Context manager that switches the database connections to a scratch database.
+    - populate: Fill the database with a synthetic catalog.
+    - add_hotels: Insert more synthetic hotels into an existing catalog.
+    - city_code / hotel_code: Deterministic codes for the n-th city or hotel.
+    - city_names: Pronounceable, partly accented city names.
+"""
+
+import random
+import string
+from contextlib import contextmanager
+
+from django.db import connection, connections
+
+from . import catalog
+from .models import City, Hotel
+
+_CITY_ALPHABET = string.ascii_uppercase
+_HOTEL_ALPHABET = string.digits + string.ascii_uppercase
+_SYLLABLES = ('am', 'ber', 'ca', 'dor', 'el', 'fa', 'gen', 'ho', 'is', 'jé', 'ka', 'lon', 'ma',
+              'no', 'ö', 'pa', 'que', 'ri', 'sa', 'to', 'ur', 'va', 'wil', 'xo', 'yo', 'zü')
+_PREFIXES = ('', '', '', '', 'New ', 'San ', 'Port ', 'Saint-', 'Bad ', 'La ')
+
+
+def _encode(number, alphabet, width):
+    chars = []
+    for _ in range(width):
+        number, digit = divmod(number, len(alphabet))
+        chars.append(alphabet[digit])
+    return ''.join(reversed(chars))
+
+
+def city_code(index):
+    """
+    Return the 3-letter code of the n-th synthetic city.
+
+    Args:
+        index (int): Zero-based city index (at most 26**3 cities).
+
+    Returns:
+        str: The city code.
+    """
+    return _encode(index, _CITY_ALPHABET, 3)
+
+
+def hotel_code(index):
+    """
+    Return the 5-character code of the n-th synthetic hotel.
+
+    Args:
+        index (int): Zero-based hotel index (at most 36**5 hotels).
+
+    Returns:
+        str: The hotel code.
+    """
+    return _encode(index, _HOTEL_ALPHABET, 5)
+
+
+def city_names(count, seed=0):
+    """
+    Return pseudo-random, pronounceable city names such as "Port Kalonsa" or "Jéurto".
+
+    Args:
+        count (int): Number of names to return.
+        seed (int): Seed for the random generator, so runs are reproducible.
+
+    Returns:
+        list: The names (not necessarily unique).
+    """
+    rng = random.Random(seed)
+    names = []
+    for _ in range(count):
+        word = ''.join(rng.choice(_SYLLABLES) for _ in range(rng.randint(2, 4)))
+        names.append(rng.choice(_PREFIXES) + word.capitalize())
+    return names
+
+
+@contextmanager
+def scratch_database(name=None, verbosity=0):
+    """
+    Create an empty, migrated scratch database and route the default connection to it.
+
+    The other aliases, such as the read alias (see ``hotels.routers``), are pointed at the
+    scratch database as well, the way the test runner treats a test mirror.
+
+    On SQLite the scratch database lives in memory unless a file name is given (or
+    ``TEST['NAME']`` is configured); a file is needed when other processes, such as an
+    application server started for a load test, must read the data. The original database
+    settings are restored, and the scratch database removed, on exit.
+
+    Args:
+        name (str): Optional file name of the scratch database.
+        verbosity (int): Verbosity passed to the database creation machinery.
+    """
+    old_name = connection.settings_dict['NAME']
+    old_test_name = connection.settings_dict['TEST'].get('NAME')
+    if name:
+        connection.settings_dict['TEST']['NAME'] = str(name)
+    connection.creation.create_test_db(verbosity=verbosity, autoclobber=True, serialize=False)
+    readers = {}
+    for alias in connections:
+        reader = connections[alias]
+        if reader is not connection:
+            readers[reader] = reader.settings_dict
+            reader.close()
+            reader.creation.set_as_test_mirror(connection.settings_dict)
+    catalog.invalidate()
+    try:
+        yield connection
+    finally:
+        catalog.invalidate()
+        for reader, settings_dict in readers.items():
+            # Restore the settings first: an in-memory database ignores close().
+            reader.settings_dict = settings_dict
+            reader.close()
+        connection.creation.destroy_test_db(old_name, verbosity=verbosity)
+        connection.settings_dict['TEST']['NAME'] = old_test_name
+
+
+def populate(city_count, hotel_count, batch_size=10000):
+    """
+    Insert a synthetic catalog: hotels are spread round-robin over the cities.
+
+    Args:
+        city_count (int): Number of cities to create.
+        hotel_count (int): Number of hotels to create.
+        batch_size (int): Number of rows per INSERT.
+
+    Returns:
+        list: The codes of the created cities.
+    """
+    codes = [city_code(i) for i in range(city_count)]
+    City.objects.bulk_create(
+        (City(code=code, name=f'City {code}') for code in codes),
+        batch_size=batch_size,
+    )
+    add_hotels(codes, 0, hotel_count, batch_size)
+    catalog.bump_data_version()
+    return codes
+
+
+def add_hotels(city_codes, start, count, batch_size=10000):
+    """
+    Insert the synthetic hotels ``start`` to ``start + count - 1``, spread round-robin over the cities.
+
+    Args:
+        city_codes (list): The codes of the cities, as returned by populate().
+        start (int): Index of the first hotel, so that codes do not collide with earlier hotels.
+        count (int): Number of hotels to create.
+        batch_size (int): Number of rows per INSERT.
+    """
+    city_ids = dict(City.objects.values_list('code', 'id'))
+    batch = []
+    for i in range(start, start + count):
+        code = hotel_code(i)
+        city = city_codes[i % len(city_codes)]
+        batch.append(Hotel(city_id=city_ids[city], city_code=city, code=code, name=f'Hotel {code}'))
+        if len(batch) >= batch_size:
+            Hotel.objects.bulk_create(batch)
+            batch = []
+    if batch:
+        Hotel.objects.bulk_create(batch)
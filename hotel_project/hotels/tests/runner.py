@@ -0,0 +1,36 @@
+"""
+Module: runner
+
+This module contains the test runner of the project (``TEST_RUNNER``).
+
+The suite runs with HOTELS_IMPORT_DIR pointing to a temporary directory, for the test
+process and the processes it starts, so that no test takes the import lock of a running
+server or import_csv, nor leaves files in the project.
+"""
+
+import os
+import tempfile
+from unittest import mock
+
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """
+    The Django test runner, with a temporary import directory.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self.import_dir = tempfile.TemporaryDirectory()
+        self.import_settings = override_settings(HOTELS_IMPORT_DIR=self.import_dir.name)
+        self.import_settings.enable()
+        self.import_environ = mock.patch.dict(os.environ, {'HOTELS_IMPORT_DIR': self.import_dir.name})
+        self.import_environ.start()
+
+    def teardown_test_environment(self, **kwargs):
+        self.import_environ.stop()
+        self.import_settings.disable()
+        self.import_dir.cleanup()
+        super().teardown_test_environment(**kwargs)
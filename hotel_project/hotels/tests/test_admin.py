@@ -9,15 +9,24 @@ The tests ensure that:
     - Valid CSV leads to the successful creation of City and Hotel instances.
     - CSV file including invalid or incomplete data are handled correctly.
     - Duplicate entries or missing cities are not created.
+    - The upload pages require a staff user allowed to add cities or hotels.
+    - The hotel changelist pages by key through every hotel in both directions, loads the
+      cities with the hotels, filters by one city without listing the others, and never
+      counts the whole hotels table.
     
 """
 
+from unittest import mock
+
+from django.db import connection
 from django.test import TestCase, Client
+from django.test.utils import CaptureQueriesContext
 from django.contrib.auth.models import User
 from django.contrib.messages import get_messages
 from django.contrib import messages
 from django.core.files.uploadedfile import SimpleUploadedFile
 from django.urls import reverse
+from hotels.admin import KEYSET
 from hotels.models import City, Hotel
 
 
@@ -214,7 +223,93 @@ class HotelAdminTest(BaseAdminTestCase):
         response = self._upload_csv('')
         self.assertEqual(Hotel.objects.count(), 0)
         self.assertContains(response, "No data in file")
-        
 
-        
-        
\ No newline at end of file
+
+class UploadPermissionTest(TestCase):
+    """
+    The upload pages require a staff user allowed to add the model.
+    """
+
+    def test_anonymous(self):
+        for model in ('city', 'hotel'):
+            url = reverse(f'admin:hotels_{model}_upload_csv')
+            for response in (self.client.get(url), self.client.post(url)):
+                self.assertRedirects(response, f"{reverse('admin:login')}?next={url}")
+
+    def test_without_add_permission(self):
+        User.objects.create_user(username='staff', password='staffpass', is_staff=True)
+        self.client.login(username='staff', password='staffpass')
+        for model in ('city', 'hotel'):
+            url = reverse(f'admin:hotels_{model}_upload_csv')
+            self.assertEqual(self.client.get(url).status_code, 403)
+            self.assertEqual(self.client.post(url).status_code, 403)
+
+
+class HotelChangeListTest(BaseAdminTestCase):
+    """
+    Test cases for the hotel changelist: keyset paging, estimated counts and the city filter.
+    """
+
+    def setUp(self):
+        super().setUp()
+        self.amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        self.paris = City.objects.create(code='PAR', name='Paris')
+        Hotel.objects.bulk_create(
+            [Hotel(city=self.amsterdam, city_code='AMS', code=f'A{i:04d}', name=f'Hotel {i % 7}') for i in range(150)]
+            + [Hotel(city=self.paris, city_code='PAR', code=f'P{i:04d}', name=f'Hotel {i % 5}') for i in range(100)]
+        )
+
+    def changelist(self, query_string=''):
+        response = self.client.get(reverse('admin:hotels_hotel_changelist') + query_string)
+        self.assertEqual(response.status_code, 200)
+        return response.context['cl']
+
+    def test_pages_walk_the_index_both_ways(self):
+        expected = list(Hotel.objects.order_by(*KEYSET).values_list('code', flat=True))
+        pages = [self.changelist()]
+        while pages[-1].next_url:
+            pages.append(self.changelist(pages[-1].next_url))
+        self.assertEqual([len(cl.result_list) for cl in pages], [100, 100, 50])
+        self.assertEqual([hotel.code for cl in pages for hotel in cl.result_list], expected)
+        self.assertIsNone(pages[0].previous_url)
+
+        back = [pages[-1]]
+        while back[-1].previous_url:
+            back.append(self.changelist(back[-1].previous_url))
+        self.assertEqual([hotel.code for cl in reversed(back) for hotel in cl.result_list], expected)
+
+    def test_page_does_not_count_hotels(self):
+        with CaptureQueriesContext(connection) as queries:
+            cl = self.changelist('?after=A0100')
+        self.assertEqual((cl.result_count, cl.result_count_is_estimate), (250, False))
+        hotel_queries = [query['sql'] for query in queries.captured_queries if 'hotels_' in query['sql']]
+        self.assertFalse([sql for sql in hotel_queries if 'COUNT(' in sql or 'OFFSET' in sql], hotel_queries)
+        # The cities are joined to the page, not loaded per row.
+        self.assertFalse([sql for sql in hotel_queries if sql.startswith('SELECT "hotels_city"')], hotel_queries)
+
+    def test_city_filter(self):
+        response = self.client.get(reverse('admin:hotels_hotel_changelist'), {'city__id__exact': self.paris.pk})
+        cl = response.context['cl']
+        self.assertEqual(cl.result_count, 100)
+        self.assertEqual({hotel.city_code for hotel in cl.result_list}, {'PAR'})
+        self.assertContains(response, f'<option value="{self.paris.pk}" selected>Paris (PAR)</option>', html=True)
+        self.assertNotContains(response, 'Amsterdam (AMS)')
+
+    def test_city_filter_invalid(self):
+        changelist = reverse('admin:hotels_hotel_changelist')
+        response = self.client.get(changelist, {'city__id__exact': 'abc'})
+        self.assertRedirects(response, changelist + '?e=1')
+        response = self.client.get(changelist, {'city__id__exact': 999999})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['cl'].result_list), [])
+
+    def test_filtered_count_is_capped(self):
+        with mock.patch('hotels.admin.COUNT_LIMIT', 120):
+            response = self.client.get(reverse('admin:hotels_hotel_changelist'), {'q': 'hotel'})
+        cl = response.context['cl']
+        self.assertEqual((cl.result_count, cl.result_count_is_estimate), (120, True))
+        self.assertContains(response, '120+ Hotels')
+
+    def test_unknown_key(self):
+        response = self.client.get(reverse('admin:hotels_hotel_changelist'), {'after': 'ZZZZZ'})
+        self.assertRedirects(response, reverse('admin:hotels_hotel_changelist') + '?e=1')
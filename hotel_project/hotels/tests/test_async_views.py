@@ -0,0 +1,154 @@
+"""
+Module: test_async_views
+
+This module contains unit tests for the native async read API views.
+
+The tests ensure that:
+    - The async views return the same bodies and status codes as the DRF views, also for
+      HEAD, OPTIONS, methods that are not allowed and paths that are not routed.
+    - A body that is not cached yet is rendered off the event loop.
+    - A current catalog snapshot is served without database queries, and the data version
+      is never read on the event loop.
+"""
+
+import threading
+from unittest import mock
+
+from asgiref.sync import async_to_sync, sync_to_async
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.urls import path
+from hotels import api_views, async_views, catalog
+from hotels.models import City, Hotel
+
+
+def api_urls(api):
+    return [
+        path('hotels/api/cities/', api.city_list),
+        path('hotels/api/hotels/export', api.hotel_export),
+        path('hotels/api/hotels/<str:code>', api.hotel_list),
+    ]
+
+
+class SyncURLs:
+    urlpatterns = api_urls(api_views)
+
+
+class AsyncURLs:
+    urlpatterns = api_urls(async_views)
+
+
+class AsyncViewsTest(TestCase):
+
+    def setUp(self):
+        catalog.invalidate()
+        amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        City.objects.create(code='BCN', name='Barcelona')
+        Hotel.objects.create(city=amsterdam, code='AMS01', name='Amstel Hotel')
+        self.factory = AsyncRequestFactory()
+        self.sync_factory = RequestFactory()
+
+    async def assertSameResponse(self, view_name, path, data=None, **kwargs):
+        response = await getattr(async_views, view_name)(self.factory.get(path, data), **kwargs)
+        expected = await sync_to_async(getattr(api_views, view_name))(self.sync_factory.get(path, data), **kwargs)
+        if hasattr(expected, 'render'):
+            expected.render()
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertJSONEqual(response.content, expected.content.decode())
+        return response
+
+    async def test_city_list(self):
+        await self.assertSameResponse('city_list', '/hotels/api/cities/')
+
+    async def test_city_search(self):
+        await self.assertSameResponse('city_search', '/hotels/api/cities/search', {'q': 'bar'})
+
+    async def test_hotel_list(self):
+        response = await self.assertSameResponse('hotel_list', '/hotels/api/hotels/AMS', code='AMS')
+        self.assertJSONEqual(response.content, [{'code': 'AMS01', 'name': 'Amstel Hotel', 'city': 'AMS'}])
+
+    async def test_hotel_batch(self):
+        await self.assertSameResponse('hotel_batch', '/hotels/api/hotels/', {'codes': 'AMS,BCN'})
+        await self.assertSameResponse('hotel_batch', '/hotels/api/hotels/')
+
+    def test_hotel_search(self):
+        # The search queries the database, so the sync view cannot run inside an async test.
+        request = {'path': '/hotels/api/hotels/search', 'data': {'q': 'amstel'}}
+        response = async_to_sync(async_views.hotel_search)(self.factory.get(**request))
+        expected = api_views.hotel_search(self.sync_factory.get(**request))
+        self.assertEqual(response.content, expected.content)
+        self.assertJSONEqual(response.content, [{'code': 'AMS01', 'name': 'Amstel Hotel', 'city': 'AMS'}])
+
+    def test_city_stats(self):
+        response = async_to_sync(async_views.city_stats)(self.factory.get('/hotels/api/cities/stats'))
+        expected = api_views.city_stats(self.sync_factory.get('/hotels/api/cities/stats'))
+        self.assertEqual(response.content, expected.content)
+
+    def test_changes(self):
+        response = async_to_sync(async_views.changes)(self.factory.get('/hotels/api/changes', {'limit': 2}))
+        expected = api_views.changes(self.sync_factory.get('/hotels/api/changes', {'limit': 2}))
+        self.assertEqual(response.content, expected.content)
+
+    def test_changes_invalid_since(self):
+        response = async_to_sync(async_views.changes)(self.factory.get('/hotels/api/changes', {'since': 'x'}))
+        self.assertEqual(response.status_code, 400)
+
+    async def test_method_not_allowed(self):
+        response = await async_views.city_list(self.factory.post('/hotels/api/cities/'))
+        self.assertEqual(response.status_code, 405)
+
+    def test_same_responses_through_the_handlers(self):
+        for method, url in (
+            ('get', '/hotels/api/hotels/AMS'),
+            ('get', '/hotels/api/hotels/XXX'),
+            ('get', '/hotels/api/hotels/AMS/rooms'),
+            ('head', '/hotels/api/hotels/AMS'),
+            ('head', '/hotels/api/hotels/export'),
+            ('options', '/hotels/api/cities/'),
+            ('post', '/hotels/api/cities/'),
+            ('delete', '/hotels/api/hotels/AMS'),
+            ('head', '/hotels/api/hotels/AMS/rooms'),
+        ):
+            with self.subTest(method=method, url=url):
+                with override_settings(ROOT_URLCONF=SyncURLs):
+                    expected = getattr(self.client, method)(url)
+                with override_settings(ROOT_URLCONF=AsyncURLs):
+                    response = async_to_sync(getattr(self.async_client, method))(url)
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.get('Content-Type'), expected.get('Content-Type'))
+                if response.status_code != 200 or method == 'options':
+                    # DRF also lists the allowed methods on successful GET and HEAD responses.
+                    allowed = [set(r.get('Allow', '').split(', ')) for r in (response, expected)]
+                    self.assertEqual(allowed[0], allowed[1])
+                if not response.streaming:
+                    self.assertEqual(response.content, expected.content)
+
+    async def test_body_is_rendered_off_the_event_loop(self):
+        threads = []
+        hotels_json = catalog.CatalogSnapshot.hotels_json
+
+        def record_thread(snapshot, code):
+            threads.append(threading.current_thread())
+            return hotels_json(snapshot, code)
+
+        with mock.patch.object(catalog.CatalogSnapshot, 'hotels_json', record_thread):
+            await async_views.hotel_list(self.factory.get('/hotels/api/hotels/AMS'), code='AMS')
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
+
+    def test_current_snapshot_is_served_without_queries(self):
+        catalog.get_catalog()
+        with self.assertNumQueries(0):
+            async_to_sync(async_views.hotel_list)(self.factory.get('/hotels/api/hotels/AMS'), code='AMS')
+
+    async def test_version_is_read_off_the_event_loop(self):
+        threads = []
+        current_versions = catalog._current_versions
+
+        def record_thread():
+            threads.append(threading.current_thread())
+            return current_versions()
+
+        with mock.patch.object(catalog, '_current_versions', record_thread):
+            await async_views.hotel_list(self.factory.get('/hotels/api/hotels/AMS'), code='AMS')
+        self.assertTrue(threads)
+        self.assertNotIn(threading.current_thread(), threads)
@@ -0,0 +1,180 @@
+"""
+Module: test_catalog
+
+This module contains unit tests for the in-memory read catalog and the API views that are
+served from it.
+
+The tests ensure that:
+    - The catalog groups hotels per city and orders cities and hotels by name.
+    - Writes through the ORM bump the data version and are visible on the next read.
+    - A write committed by another process is visible on the next read.
+    - Only the table whose version changed is reloaded.
+    - The API returns the public representation defined by the serializers.
+    - The hotel batch endpoint looks the requested codes up as they are stored.
+"""
+
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+from django.conf import settings
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from hotels import catalog
+from hotels.models import City, Hotel
+from hotels.serializers import CitySerializer, HotelSerializer
+
+# Run in a process of its own: loads the catalog of a new database file, lets a second
+# process (the command line argument) write to it, and prints the city count before and after.
+READER = '''
+import subprocess, sys
+import django
+django.setup()
+from django.core.management import call_command
+from hotels import catalog
+from hotels.models import City
+
+call_command('migrate', run_syncdb=True, verbosity=0)
+City.objects.create(code='AMS', name='Amsterdam')
+print(len(catalog.get_catalog().cities))
+subprocess.run([sys.executable, '-c', sys.argv[1]], check=True)
+print(len(catalog.get_catalog().cities))
+'''
+
+WRITER = '''
+import django
+django.setup()
+from hotels.models import City
+
+City.objects.create(code='BCN', name='Barcelona')
+'''
+
+
+class CatalogTestCase(TestCase):
+    """
+    Base test case that starts every test with an empty catalog snapshot.
+
+    Test transactions are rolled back without sending signals, so the snapshot of a
+    previous test would otherwise survive.
+    """
+    def setUp(self):
+        catalog.invalidate()
+        self.amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        self.barcelona = City.objects.create(code='BCN', name='Barcelona')
+        Hotel.objects.create(city=self.barcelona, code='BCN01', name='Casa Batllo')
+        Hotel.objects.create(city=self.amsterdam, code='AMS02', name='Zuid Hotel')
+        Hotel.objects.create(city=self.amsterdam, code='AMS01', name='Amstel Hotel')
+
+
+class CatalogTest(CatalogTestCase):
+
+    def test_cities_ordered_by_name(self):
+        snapshot = catalog.get_catalog()
+        self.assertEqual(snapshot.cities.codes, ['AMS', 'BCN'])
+        self.assertEqual(
+            json.loads(snapshot.cities_json()),
+            CitySerializer(City.objects.all(), many=True).data,
+        )
+
+    def test_hotels_grouped_per_city(self):
+        snapshot = catalog.get_catalog()
+        self.assertEqual(
+            [snapshot.hotels.codes[row] for row in snapshot.hotel_rows('AMS')],
+            ['AMS01', 'AMS02'],
+        )
+        self.assertEqual(
+            json.loads(snapshot.hotels_json('AMS')),
+            HotelSerializer(Hotel.objects.filter(city__code='AMS'), many=True).data,
+        )
+
+    def test_unknown_city_has_no_hotels(self):
+        self.assertEqual(catalog.get_catalog().hotels_json('XXX'), b'[]')
+
+    def test_json_escaping(self):
+        Hotel.objects.create(city=self.amsterdam, code='AMS03', name='Hôtel "Quote" \\ Ü')
+        hotels = json.loads(catalog.get_catalog().hotels_json('AMS'))
+        self.assertEqual(hotels[1], {'code': 'AMS03', 'name': 'Hôtel "Quote" \\ Ü', 'city': 'AMS'})
+
+    def test_write_is_visible_on_next_read(self):
+        before = catalog.get_data_version()
+        catalog.get_catalog()
+        Hotel.objects.create(city=self.barcelona, code='BCN02', name='Arts')
+
+        self.assertNotEqual(catalog.get_data_version(), before)
+        self.assertEqual(
+            [hotel['code'] for hotel in json.loads(catalog.get_catalog().hotels_json('BCN'))],
+            ['BCN02', 'BCN01'],
+        )
+
+    def test_hotel_write_keeps_city_table(self):
+        snapshot = catalog.get_catalog()
+        Hotel.objects.filter(code='AMS01').delete()
+
+        reloaded = catalog.get_catalog()
+        self.assertIs(reloaded.cities, snapshot.cities)
+        self.assertIsNot(reloaded.hotels, snapshot.hotels)
+        self.assertEqual(len(reloaded.hotels), 2)
+
+    def test_city_write_reloads_both_tables(self):
+        snapshot = catalog.get_catalog()
+        City.objects.create(code='ANT', name='Antwerpen')
+
+        reloaded = catalog.get_catalog()
+        self.assertIsNot(reloaded.cities, snapshot.cities)
+        self.assertEqual(reloaded.cities.codes, ['AMS', 'ANT', 'BCN'])
+        self.assertEqual(len(reloaded.hotel_rows('BCN')), 1)
+
+
+class CrossProcessTest(SimpleTestCase):
+
+    def test_write_of_another_process(self):
+        with tempfile.TemporaryDirectory() as directory:
+            name = os.path.join(directory, 'db.sqlite3')
+            process = subprocess.run(
+                [sys.executable, '-c', READER, WRITER], cwd=settings.BASE_DIR, capture_output=True, text=True,
+                env={**os.environ, 'DJANGO_DB_NAME': name, 'DJANGO_REPLICA_DB_NAME': name},
+            )
+        self.assertEqual(process.returncode, 0, process.stderr)
+        self.assertEqual(process.stdout.split(), ['1', '2'])
+
+
+class CatalogApiTest(CatalogTestCase):
+
+    def test_city_list(self):
+        response = self.client.get(reverse('api_city_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(response.json(), [{'code': 'AMS', 'name': 'Amsterdam'}, {'code': 'BCN', 'name': 'Barcelona'}])
+
+    def test_hotel_list(self):
+        response = self.client.get(reverse('api_hotel_list', args=['AMS']))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [
+            {'code': 'AMS01', 'name': 'Amstel Hotel', 'city': 'AMS'},
+            {'code': 'AMS02', 'name': 'Zuid Hotel', 'city': 'AMS'},
+        ])
+
+    def test_hotel_list_is_served_without_queries(self):
+        catalog.get_catalog()
+        with self.assertNumQueries(0):
+            self.client.get(reverse('api_hotel_list', args=['AMS']))
+
+    def test_hotel_batch(self):
+        response = self.client.get(reverse('api_hotel_batch'), {'codes': 'BCN,AMS,XXX,AMS'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(list(data), ['BCN', 'AMS', 'XXX'])
+        self.assertEqual([hotel['code'] for hotel in data['AMS']], ['AMS01', 'AMS02'])
+        self.assertEqual(data['XXX'], [])
+
+    def test_hotel_batch_normalizes_codes(self):
+        response = self.client.get(reverse('api_hotel_batch'), {'codes': 'bcn, ams ,AMS, '})
+        data = response.json()
+        self.assertEqual(list(data), ['BCN', 'AMS'])
+        self.assertEqual([hotel['code'] for hotel in data['AMS']], ['AMS01', 'AMS02'])
+
+    def test_hotel_batch_requires_codes(self):
+        response = self.client.get(reverse('api_hotel_batch'))
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,136 @@
+"""
+Module: test_changelog
+
+This module contains unit tests for the change-log and the incremental sync endpoint.
+
+The tests ensure that:
+    - Inserts, updates and deletes are recorded with increasing versions, including bulk
+      writes and clear_db.
+    - Saves that change nothing are not recorded.
+    - A change of code is recorded as a delete followed by an insert.
+    - A mirror that applies the changes page by page ends up with the catalog.
+"""
+
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.urls import reverse
+from hotels import changelog
+from hotels.models import City, Hotel
+
+
+class ChangeLogTestCase(TestCase):
+
+    def setUp(self):
+        self.start = changelog.latest_version()
+        self.amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        self.hotel = Hotel.objects.create(city=self.amsterdam, code='AMS01', name='Amstel Hotel')
+
+    def changes(self):
+        return [row[1:] for row in changelog.changes_since(self.start, 1000)]
+
+
+class ChangeLogTest(ChangeLogTestCase):
+
+    def test_inserts(self):
+        self.assertEqual(self.changes(), [
+            ('city', 'insert', 'AMS', 'Amsterdam', None),
+            ('hotel', 'insert', 'AMS01', 'Amstel Hotel', 'AMS'),
+        ])
+
+    def test_versions_increase(self):
+        versions = [row[0] for row in changelog.changes_since(self.start, 1000)]
+        self.assertEqual(versions, sorted(set(versions)))
+
+    def test_update_and_delete(self):
+        self.hotel.name = 'Amstel'
+        self.hotel.save()
+        self.hotel.delete()
+        self.assertEqual(self.changes()[2:], [
+            ('hotel', 'update', 'AMS01', 'Amstel', 'AMS'),
+            ('hotel', 'delete', 'AMS01', None, None),
+        ])
+
+    def test_unchanged_save_is_not_recorded(self):
+        self.hotel.save()
+        self.amsterdam.save()
+        self.assertEqual(len(self.changes()), 2)
+
+    def test_bulk_writes(self):
+        Hotel.objects.bulk_create([Hotel(city=self.amsterdam, code='AMS02', name='Canal House')])
+        Hotel.objects.filter(code='AMS02').update(name='Canal')
+        self.assertEqual(self.changes()[2:], [
+            ('hotel', 'insert', 'AMS02', 'Canal House', 'AMS'),
+            ('hotel', 'update', 'AMS02', 'Canal', 'AMS'),
+        ])
+
+    def test_recode(self):
+        City.objects.filter(code='AMS').update(code='AMX')
+        self.assertEqual(self.changes()[2:], [
+            ('city', 'delete', 'AMS', None, None),
+            ('city', 'insert', 'AMX', 'Amsterdam', None),
+            ('hotel', 'update', 'AMS01', 'Amstel Hotel', 'AMX'),
+        ])
+
+    def test_clear_db(self):
+        call_command('clear_db', stdout=StringIO())
+        self.assertEqual(self.changes()[2:], [
+            ('hotel', 'delete', 'AMS01', None, None),
+            ('city', 'delete', 'AMS', None, None),
+        ])
+
+
+class ChangesApiTest(ChangeLogTestCase):
+
+    def get(self, **params):
+        return self.client.get(reverse('api_changes'), params)
+
+    def test_page(self):
+        data = self.get(since=self.start, limit=1).json()
+        self.assertEqual(data['version'], self.start + 1)
+        self.assertEqual(data['latest'], self.start + 2)
+        self.assertTrue(data['more'])
+        self.assertEqual(data['changes'], [
+            {'version': self.start + 1, 'type': 'city', 'op': 'insert', 'code': 'AMS', 'name': 'Amsterdam'},
+        ])
+
+        data = self.get(since=data['version'], limit=1).json()
+        self.assertFalse(data['more'])
+        self.assertEqual(data['changes'], [
+            {'version': self.start + 2, 'type': 'hotel', 'op': 'insert', 'code': 'AMS01',
+             'name': 'Amstel Hotel', 'city': 'AMS'},
+        ])
+
+    def test_up_to_date(self):
+        data = self.get(since=self.start + 2).json()
+        self.assertEqual((data['version'], data['more'], data['changes']), (self.start + 2, False, []))
+
+    def test_invalid_since(self):
+        self.assertEqual(self.get(since='x').status_code, 400)
+        self.assertEqual(self.get(since=-1).status_code, 400)
+
+    def test_mirror(self):
+        paris = City.objects.create(code='PAR', name='Paris')
+        Hotel.objects.create(city=paris, code='PAR01', name='Ritz')
+        Hotel.objects.filter(code='AMS01').update(city=paris, name='Amstel')
+        City.objects.filter(code='PAR').update(code='PAX')
+        self.amsterdam.delete()
+
+        mirror = {'city': {}, 'hotel': {}}
+        since, more = 0, True
+        while more:
+            data = self.get(since=since, limit=2).json()
+            for change in data['changes']:
+                rows = mirror[change['type']]
+                if change['op'] == 'delete':
+                    del rows[change['code']]
+                else:
+                    rows[change['code']] = (change['name'], change.get('city'))
+            since, more = data['version'], data['more']
+
+        self.assertEqual(mirror['city'], {code: (name, None) for code, name in City.objects.values_list('code', 'name')})
+        self.assertEqual(
+            mirror['hotel'],
+            {code: (name, city) for code, name, city in Hotel.objects.values_list('code', 'name', 'city__code')},
+        )
@@ -0,0 +1,134 @@
+"""
+Module: test_compression
+
+This module contains unit tests for the negotiated compression of the read API.
+
+The tests ensure that:
+    - The content coding follows the Accept-Encoding header, including q-values.
+    - Small bodies and clients without Accept-Encoding get the identity coding.
+    - Cached bodies are compressed once per catalog snapshot, with the fast settings, and
+      concurrent first requests wait for a single compression.
+    - The async response compresses in a worker thread, not on the event loop.
+    - The streaming export is gzipped when the client accepts it.
+"""
+
+import gzip
+import json
+import threading
+import time
+from unittest import mock, skipUnless
+
+from asgiref.sync import async_to_sync
+from django.test import RequestFactory, SimpleTestCase
+from django.urls import reverse
+from hotels import catalog, renderers
+from hotels.models import City, Hotel
+from hotels.renderers import CachedBody, negotiate_encoding
+
+from .test_catalog import CatalogTestCase
+
+
+class NegotiateEncodingTest(SimpleTestCase):
+
+    def test_preference(self):
+        self.assertEqual(negotiate_encoding('gzip, br', ('br', 'gzip')), 'br')
+        self.assertEqual(negotiate_encoding('gzip;q=0.5, deflate', ('br', 'gzip')), 'gzip')
+
+    def test_refused(self):
+        self.assertIsNone(negotiate_encoding('', ('gzip',)))
+        self.assertIsNone(negotiate_encoding('gzip;q=0', ('gzip',)))
+        self.assertIsNone(negotiate_encoding('*;q=0, identity', ('gzip',)))
+
+    def test_wildcard(self):
+        self.assertEqual(negotiate_encoding('*', ('br', 'gzip')), 'br')
+        self.assertEqual(negotiate_encoding('br;q=0, *', ('br', 'gzip')), 'gzip')
+
+
+class CachedBodyTest(SimpleTestCase):
+
+    def setUp(self):
+        self.body = CachedBody(b'[' + b'1,' * 1000 + b'1]')
+
+    def test_concurrent_first_requests(self):
+        started = threading.Event()
+
+        def slow_compress(data, encoding, best=False):
+            started.set()
+            time.sleep(0.05)
+            return b'compressed'
+
+        with mock.patch.object(renderers, 'compress', side_effect=slow_compress) as compress:
+            first = threading.Thread(target=self.body.variant, args=('gzip',))
+            first.start()
+            started.wait()
+            self.assertEqual(self.body.variant('gzip'), b'compressed')
+            first.join()
+        compress.assert_called_once_with(self.body, 'gzip', best=False)
+
+    def test_async_response_compresses_in_a_thread(self):
+        threads = []
+        request = RequestFactory().get('/', headers={'accept_encoding': 'gzip'})
+
+        async def respond():
+            with mock.patch.object(renderers, 'ENCODINGS', ('gzip',)):
+                response = await renderers.ajson_response(request, self.body)
+            return threading.current_thread(), response
+
+        def record_thread(data, encoding, best=False):
+            threads.append(threading.current_thread())
+            return gzip.compress(data)
+
+        with mock.patch.object(renderers, 'compress', side_effect=record_thread):
+            loop_thread, response = async_to_sync(respond)()
+        self.assertEqual(gzip.decompress(response.content), self.body)
+        self.assertEqual(len(threads), 1)
+        self.assertIsNot(threads[0], loop_thread)
+
+
+class CompressionApiTest(CatalogTestCase):
+
+    def setUp(self):
+        super().setUp()
+        for number in range(20):
+            Hotel.objects.create(city=self.amsterdam, code=f'AMS{number + 10}', name=f'Canal House {number}')
+
+    def get_hotels(self, **headers):
+        return self.client.get(reverse('api_hotel_list', args=['AMS']), headers=headers)
+
+    def test_gzip(self):
+        with mock.patch.object(renderers, 'ENCODINGS', ('gzip',)):
+            plain = self.get_hotels()
+            response = self.get_hotels(accept_encoding='gzip')
+        self.assertNotIn('Content-Encoding', plain)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertIn('Accept-Encoding', response['Vary'])
+        self.assertEqual(gzip.decompress(response.content), plain.content)
+
+    @skipUnless(renderers.brotli, 'brotli is not installed')
+    def test_brotli(self):
+        response = self.get_hotels(accept_encoding='gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(json.loads(renderers.brotli.decompress(response.content)), self.get_hotels().json())
+
+    def test_small_body_is_not_compressed(self):
+        response = self.client.get(reverse('api_hotel_list', args=['BCN']), headers={'accept_encoding': 'gzip'})
+        self.assertNotIn('Content-Encoding', response)
+
+    def test_cached_body_is_compressed_once(self):
+        self.assertIsInstance(catalog.get_catalog().hotels_json('AMS'), CachedBody)
+        with mock.patch.object(renderers, 'compress', wraps=renderers.compress) as compress:
+            self.get_hotels(accept_encoding='gzip')
+            self.get_hotels(accept_encoding='gzip')
+            self.assertEqual(compress.call_count, 1)
+            self.assertFalse(compress.call_args.kwargs['best'])
+
+            City.objects.filter(code='AMS').update(name='Amsterdam Centrum')
+            catalog.bump_data_version()
+            self.get_hotels(accept_encoding='gzip')
+            self.assertEqual(compress.call_count, 2)
+
+    def test_export_is_gzipped(self):
+        response = self.client.get(reverse('api_hotel_export'), headers={'accept_encoding': 'gzip'})
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        hotels = json.loads(gzip.decompress(b''.join(response.streaming_content)))
+        self.assertEqual(len(hotels), 23)
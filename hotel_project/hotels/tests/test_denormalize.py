@@ -0,0 +1,60 @@
+"""
+Module: test_denormalize
+
+This module contains unit tests for the denormalized city code of hotels.
+
+The tests ensure that:
+    - Hotels get the code of their city on save, bulk insert and when they move.
+    - Changing the code of a city updates its hotels, through save() and QuerySet.update().
+    - install() repairs stale copies.
+"""
+
+from django.db import connection
+from django.test import TestCase
+from hotels import denormalize
+from hotels.models import City, Hotel
+
+
+class CityCodeTest(TestCase):
+
+    def setUp(self):
+        self.amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        self.paris = City.objects.create(code='PAR', name='Paris')
+
+    def city_code(self, hotel_code):
+        return Hotel.objects.get(code=hotel_code).city_code
+
+    def test_save(self):
+        hotel = Hotel.objects.create(city=self.amsterdam, code='AMS01', name='Amstel Hotel')
+        self.assertEqual(hotel.city_code, 'AMS')
+
+        hotel.city = self.paris
+        hotel.save()
+        self.assertEqual(self.city_code('AMS01'), 'PAR')
+
+    def test_bulk_writes(self):
+        Hotel.objects.bulk_create([Hotel(city=self.amsterdam, code='AMS01', name='Amstel Hotel')])
+        self.assertEqual(self.city_code('AMS01'), 'AMS')
+
+        Hotel.objects.filter(code='AMS01').update(city=self.paris)
+        self.assertEqual(self.city_code('AMS01'), 'PAR')
+
+        Hotel.objects.filter(code='AMS01').update(city_code='XXX')
+        self.assertEqual(self.city_code('AMS01'), 'PAR')
+
+    def test_city_code_change(self):
+        Hotel.objects.create(city=self.amsterdam, code='AMS01', name='Amstel Hotel')
+        self.amsterdam.code = 'AMX'
+        self.amsterdam.save()
+        self.assertEqual(self.city_code('AMS01'), 'AMX')
+
+        City.objects.filter(pk=self.amsterdam.pk).update(code='AMY')
+        self.assertEqual(self.city_code('AMS01'), 'AMY')
+
+    def test_install_repairs_stale_copies(self):
+        Hotel.objects.create(city=self.amsterdam, code='AMS01', name='Amstel Hotel')
+        with connection.cursor() as cursor:
+            cursor.execute('DROP TRIGGER hotels_hotel_city_code_update')
+            cursor.execute("UPDATE hotels_hotel SET city_code = 'XXX'")
+        denormalize.install()
+        self.assertEqual(self.city_code('AMS01'), 'AMS')
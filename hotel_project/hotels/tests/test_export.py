@@ -0,0 +1,67 @@
+"""
+Module: test_export
+
+This module contains unit tests for the streaming hotel export.
+
+The tests ensure that:
+    - The export streams every hotel as a JSON array or as NDJSON.
+    - Chunk boundaries do not lose or duplicate hotels.
+    - The async view streams the same document as the sync view.
+"""
+
+import json
+from unittest.mock import patch
+
+from asgiref.sync import async_to_sync
+from django.test import AsyncRequestFactory, TestCase
+from django.urls import reverse
+from hotels import async_views
+from hotels.models import City, Hotel
+
+
+class HotelExportTest(TestCase):
+
+    def setUp(self):
+        amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        barcelona = City.objects.create(code='BCN', name='Barcelona')
+        for i in range(5):
+            Hotel.objects.create(city=amsterdam if i % 2 else barcelona, code=f'HTL0{i}', name=f'Hotel {i}')
+        self.expected = [
+            {'code': f'HTL0{i}', 'name': f'Hotel {i}', 'city': 'AMS' if i % 2 else 'BCN'}
+            for i in range(5)
+        ]
+
+    def export(self, **params):
+        response = self.client.get(reverse('api_hotel_export'), params)
+        self.assertTrue(response.streaming)
+        return response, b''.join(response.streaming_content)
+
+    @patch('hotels.api_views.EXPORT_CHUNK_SIZE', 2)
+    def test_json_array(self):
+        response, body = self.export()
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(body), self.expected)
+
+    @patch('hotels.api_views.EXPORT_CHUNK_SIZE', 2)
+    def test_ndjson(self):
+        response, body = self.export(output='ndjson')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in body.splitlines()], self.expected)
+
+    def test_empty_catalog(self):
+        Hotel.objects.all().delete()
+        _response, body = self.export()
+        self.assertEqual(body, b'[]')
+
+    def test_unknown_format(self):
+        response = self.client.get(reverse('api_hotel_export'), {'output': 'xml'})
+        self.assertEqual(response.status_code, 400)
+
+    @patch('hotels.async_views.EXPORT_CHUNK_SIZE', 2)
+    def test_async_view(self):
+        @async_to_sync
+        async def export():
+            response = await async_views.hotel_export(AsyncRequestFactory().get('/hotels/api/hotels/export'))
+            return b''.join([chunk async for chunk in response.streaming_content])
+
+        self.assertEqual(json.loads(export()), self.expected)
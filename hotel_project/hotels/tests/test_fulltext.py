@@ -0,0 +1,158 @@
+"""
+Module: test_fulltext
+
+This module contains unit tests for the FTS5 full-text search of hotels, its API endpoint
+and the admin search backend.
+
+The tests ensure that:
+    - Every word of a query matches as a case- and accent-insensitive prefix.
+    - Exact code matches rank first, then exact names, then hotels whose name matches more
+      of the words, also when many other matches were inserted before them.
+    - The index follows inserts, updates, deletes, bulk writes and city renames; hotels
+      inserted with deferred indexing are indexed at the end of the block.
+    - FTS5 syntax in user input is treated as plain text.
+"""
+
+from django.contrib.auth.models import User
+from django.db import transaction
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from hotels import fulltext
+from hotels.models import City, Hotel
+
+
+class MatchQueryTest(SimpleTestCase):
+
+    def test_words_are_quoted_prefixes(self):
+        self.assertEqual(fulltext.match_query('Hôtel  AMS'), '"hotel"* "ams"*')
+
+    def test_operators_are_plain_text(self):
+        self.assertEqual(fulltext.match_query('a OR "b" NEAR(c)'), '"a"* "or"* "b"* "near"* "c"*')
+
+    def test_no_words(self):
+        self.assertIsNone(fulltext.match_query(' *"- '))
+
+
+class FullTextTestCase(TestCase):
+
+    def setUp(self):
+        self.amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        self.paris = City.objects.create(code='PAR', name='Paris')
+        Hotel.objects.create(city=self.amsterdam, code='AMS01', name='Amstel Hotel')
+        Hotel.objects.create(city=self.amsterdam, code='AMS02', name='Canal House')
+        Hotel.objects.create(city=self.paris, code='PAR01', name='Hôtel du Louvre')
+
+    def search(self, text, limit=10):
+        return [code for code, _name, _city in fulltext.search_hotels(text, limit)]
+
+
+class FullTextSearchTest(FullTextTestCase):
+
+    def test_available(self):
+        self.assertTrue(fulltext.is_available())
+
+    def test_prefix_and_accents(self):
+        self.assertEqual(self.search('louv'), ['PAR01'])
+        self.assertEqual(sorted(self.search('HOTEL')), ['AMS01', 'PAR01'])
+
+    def test_all_words_must_match(self):
+        self.assertEqual(self.search('hotel amst'), ['AMS01'])
+
+    def test_ranking(self):
+        # "amst" matches the name of AMS01, but only the city name of AMS02.
+        self.assertEqual(self.search('amst'), ['AMS01', 'AMS02'])
+
+    def test_exact_code_first(self):
+        Hotel.objects.create(city=self.paris, code='CANAL', name='Riverside')
+        self.assertEqual(self.search('canal'), ['CANAL', 'AMS02'])
+
+    def test_exact_match_after_many_matches(self):
+        # The best matches have a rowid beyond the matches that are ranked.
+        Hotel.objects.bulk_create(
+            Hotel(city=self.amsterdam, city_code='AMS', code=f'C{number:04d}', name=f'Canal View {number}')
+            for number in range(fulltext.RANK_CANDIDATES + 100)
+        )
+        Hotel.objects.create(city=self.paris, code='VIEW2', name='Canal View')
+        Hotel.objects.create(city=self.paris, code='CANAL', name='Riverside')
+        self.assertEqual(self.search('canal view', limit=1), ['VIEW2'])
+        self.assertEqual(self.search('canal', limit=1), ['CANAL'])
+
+    def test_best_match_after_many_matches(self):
+        # More hotels than are ranked match through their city, inserted before the one whose
+        # name matches.
+        lagoon = City.objects.create(code='LAG', name='Lagoon')
+        Hotel.objects.bulk_create(
+            Hotel(city=lagoon, city_code='LAG', code=f'L{number:04d}', name=f'Hotel {number}')
+            for number in range(fulltext.RANK_CANDIDATES + 100)
+        )
+        Hotel.objects.create(city=self.paris, code='LAGVW', name='Lagoon View')
+        self.assertEqual(self.search('lagoon', limit=1), ['LAGVW'])
+
+    def test_limit(self):
+        self.assertEqual(len(self.search('ams', limit=1)), 1)
+
+    def test_index_follows_writes(self):
+        hotel = Hotel.objects.create(city=self.paris, code='PAR02', name='Ritz')
+        self.assertEqual(self.search('ritz'), ['PAR02'])
+
+        hotel.name = 'Ritz Paris'
+        hotel.save()
+        self.assertEqual(self.search('ritz par'), ['PAR02'])
+
+        hotel.delete()
+        self.assertEqual(self.search('ritz'), [])
+
+    def test_index_follows_bulk_writes(self):
+        Hotel.objects.bulk_create([Hotel(city=self.paris, code='PAR03', name='Le Meurice')])
+        self.assertEqual(self.search('meur'), ['PAR03'])
+
+        Hotel.objects.filter(code='PAR03').update(name='Le Bristol')
+        self.assertEqual(self.search('meur'), [])
+        self.assertEqual(self.search('bristol'), ['PAR03'])
+
+    def test_deferred_indexing(self):
+        # The hotels of the block are indexed when it ends; later ones as they are written.
+        with fulltext.deferred_indexing():
+            Hotel.objects.bulk_create([Hotel(city=self.paris, code='PAR04', name='Le Meurice')])
+            self.assertEqual(self.search('meur'), [])
+        self.assertEqual(self.search('meur'), ['PAR04'])
+        Hotel.objects.create(city=self.paris, code='PAR05', name='Le Bristol')
+        self.assertEqual(self.search('bristol'), ['PAR05'])
+
+    def test_deferred_indexing_rolled_back(self):
+        with self.assertRaises(ValueError), transaction.atomic(), fulltext.deferred_indexing():
+            Hotel.objects.create(city=self.paris, code='PAR04', name='Le Meurice')
+            raise ValueError
+        Hotel.objects.create(city=self.paris, code='PAR05', name='Le Bristol')
+        self.assertEqual(self.search('bristol'), ['PAR05'])
+
+    def test_index_follows_city_rename(self):
+        City.objects.filter(code='PAR').update(name='Lutetia')
+        self.assertEqual(self.search('lutet'), ['PAR01'])
+
+    def test_index_follows_city_delete(self):
+        self.paris.delete()
+        self.assertEqual(self.search('louvre'), [])
+
+
+class HotelSearchApiTest(FullTextTestCase):
+
+    def test_search(self):
+        response = self.client.get(reverse('api_hotel_search'), {'q': 'louvre'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'code': 'PAR01', 'name': 'Hôtel du Louvre', 'city': 'PAR'}])
+
+    def test_empty_query(self):
+        response = self.client.get(reverse('api_hotel_search'), {'q': ''})
+        self.assertEqual(response.json(), [])
+
+
+class HotelAdminSearchTest(FullTextTestCase):
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def test_admin_search(self):
+        response = self.client.get(reverse('admin:hotels_hotel_changelist'), {'q': 'amst hot'})
+        self.assertEqual([hotel.code for hotel in response.context['cl'].result_list], ['AMS01'])
@@ -0,0 +1,304 @@
+"""
+Module: test_imports
+
+This module contains unit tests for the import coordinator (one import writes at a time).
+
+The tests ensure that:
+    - The status shows the holder of the import lock and the queued imports, and forgets
+      the tickets of processes that no longer exist.
+    - An import gives up with ImportBusy when the lock is not free in time, and a failed
+      wait leaves the coordinator usable.
+    - Small uploads waiting for the lock are written together in one batch, each getting its
+      own results, and a row clashing with an earlier upload of the batch is rejected; a
+      leader writes a bounded number of batches per hold, recounts the statistics once if
+      it wrote rows, then hands over to a waiting upload; a failing upload fails alone.
+    - Large imports are written in batches under the lock.
+    - import_csv reports the running import, and gives up after --wait seconds.
+    - The admin upload page shows the running import, and an upload gives up when the lock
+      stays busy.
+"""
+
+import json
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from hotels import imports
+from hotels.routers import READ_ALIAS
+from hotels.models import City, Hotel
+
+IDLE = {'holder': None, 'queue': [], 'queued_rows': 0}
+
+
+def wait_until(condition, timeout=5):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        if time.monotonic() > deadline:
+            raise AssertionError('Condition not met in time')
+        time.sleep(0.005)
+
+
+@contextmanager
+def held(label='import_csv --mode=file', rows=500):
+    """
+    Hold the import lock in another thread for the duration of a block.
+    """
+    acquired, release = threading.Event(), threading.Event()
+
+    def hold():
+        with imports.writer(label, rows):
+            acquired.set()
+            release.wait(10)
+
+    thread = threading.Thread(target=hold)
+    thread.start()
+    acquired.wait(10)
+    try:
+        yield release
+    finally:
+        release.set()
+        thread.join()
+
+
+class ImportDirMixin:
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(HOTELS_IMPORT_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+
+class ImportLockTest(ImportDirMixin, TestCase):
+
+    def test_status(self):
+        self.assertEqual(imports.status(), IDLE)
+        with held():
+            thread = threading.Thread(target=self.try_writer, args=('Hotel upload h.csv', 20, 0.5))
+            thread.start()
+            wait_until(lambda: imports.status()['queue'])
+            status = imports.status()
+            thread.join()
+        self.assertEqual((status['holder']['label'], status['holder']['rows']), ('import_csv --mode=file', 500))
+        self.assertEqual([(ticket['label'], ticket['rows']) for ticket in status['queue']], [('Hotel upload h.csv', 20)])
+        self.assertEqual(status['queued_rows'], 20)
+        self.assertIsInstance(self.error, imports.ImportBusy)
+        self.assertIn('Another import is running: import_csv --mode=file', str(self.error))
+        self.assertEqual(imports.status(), IDLE)
+
+    def try_writer(self, label, rows, timeout):
+        self.error = None
+        try:
+            with imports.writer(label, rows, timeout):
+                pass
+        except imports.ImportBusy as error:
+            self.error = error
+
+    def test_dead_tickets(self):
+        process = subprocess.run([sys.executable, '-c', 'import os; print(os.getpid())'], capture_output=True, text=True)
+        ticket = imports._enqueue('crashed import', 10)
+        ticket.write_text(json.dumps({**json.loads(ticket.read_text()), 'pid': int(process.stdout)}))
+        self.assertEqual(imports.status()['queue'], [])
+        self.assertFalse(ticket.exists())
+
+    def test_busy(self):
+        rows = [(1, 'AMS', 'Amsterdam')]
+        with held():
+            with self.assertRaisesMessage(imports.ImportBusy, 'Another import is running: import_csv --mode=file'):
+                imports.import_rows('cities', rows, 'City upload c.csv', timeout=0.1)
+        self.assertEqual(imports.import_rows('cities', rows, 'City upload c.csv'), (1, []))
+        self.assertEqual(imports.status()['queue'], [])
+
+
+class ImportRowsTest(ImportDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        City.objects.create(code='AMS', name='Amsterdam')
+
+    def test_coalesced_uploads(self):
+        uploads = {
+            'first': [(1, 'AMS', 'HTL01', 'Hotel 1'), (2, 'XXX', 'HTL02', 'Hotel 2')],
+            'second': [(1, 'AMS', 'HTL03', 'Hotel 3')],
+            'third': [(1, 'AMS', 'HTL01', 'Clash'), (2, 'AMS', 'HTL04', 'Hotel 4')],
+        }
+        results = {}
+
+        def upload(name):
+            results[name] = imports.import_rows('hotels', uploads[name], f'Hotel upload {name}.csv')
+
+        def queue_uploads(release):
+            # The first upload waits for the lock; the others queue behind it, then the lock is released.
+            wait_until(lambda: 'hotels' in imports._leaders)
+            threads = [threading.Thread(target=upload, args=(name,)) for name in ('second', 'third')]
+            for queued, thread in enumerate(threads, start=2):
+                thread.start()
+                wait_until(lambda: len(imports._pending['hotels']) == queued)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        with held() as release, CaptureQueriesContext(connection) as queries:
+            queuer = threading.Thread(target=queue_uploads, args=(release,))
+            queuer.start()
+            upload('first')
+            queuer.join()
+
+        self.assertEqual(results, {
+            'first': (1, [(2, 'City XXX not found')]),
+            'second': (1, []),
+            'third': (1, [(1, 'Hotel code HTL01 already exists')]),
+        })
+        self.assertEqual(sorted(Hotel.objects.values_list('code', flat=True)), ['HTL01', 'HTL03', 'HTL04'])
+        # One executemany() statement, logged as 'N times: INSERT ...'.
+        inserts = [query['sql'] for query in queries.captured_queries if 'INSERT INTO "hotels_hotel" ' in query['sql']]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(imports._pending['hotels'], [])
+        self.assertEqual(imports.status()['queue'], [])
+
+    def test_failing_upload_is_isolated(self):
+        uploads = [imports._Upload(rows, self.directory / 'ticket') for rows in (
+            [(1, 'AMS', 'HTL01', 'Hotel 1')],
+            # A city code that is not a string makes the validation of the batch fail.
+            [(1, 42, 'HTL02', 'Broken')],
+            [(1, 'AMS', 'HTL03', 'Hotel 3')],
+        )]
+        results = imports._write_uploads('hotels', uploads)
+        self.assertEqual(results[0], (1, []))
+        self.assertIsInstance(results[1], AttributeError)
+        self.assertEqual(results[2], (1, []))
+        self.assertEqual(sorted(Hotel.objects.values_list('code', flat=True)), ['HTL01', 'HTL03'])
+
+    def test_refresh_only_after_writes(self):
+        with mock.patch('hotels.summary.refresh') as refresh:
+            imports.import_rows('hotels', [(1, 'XXX', 'HTL01', 'Nowhere')], 'Hotel upload rejected.csv')
+            refresh.assert_not_called()
+            imports.import_rows('hotels', [(1, 'AMS', 'HTL01', 'Hotel 1')], 'Hotel upload valid.csv')
+            refresh.assert_called_once()
+
+    @override_settings(HOTELS_IMPORT_COALESCE_ROWS=1)
+    def test_large_import(self):
+        rows = [(number, 'AMS', f'H{number:04d}', f'Hotel {number}') for number in range(1, 2501)] + [(2501, 'AMS', 'H0001', 'Clash')]
+        self.assertEqual(imports.import_rows('hotels', rows, 'Hotel upload big.csv'),
+                         (2500, [(2501, 'Hotel code H0001 already exists')]))
+        self.assertEqual(Hotel.objects.count(), 2500)
+        self.assertEqual(imports.status(), IDLE)
+
+
+class HandOverTest(ImportDirMixin, TransactionTestCase):
+    """
+    The queued uploads lead in their own threads, which cannot write while the transaction
+    of a TestCase is open.
+    """
+    databases = {DEFAULT_DB_ALIAS, READ_ALIAS}
+
+    def setUp(self):
+        super().setUp()
+        City.objects.create(code='AMS', name='Amsterdam')
+
+    @mock.patch.object(imports, 'MAX_GROUPS', 1)
+    @mock.patch.object(imports, 'BATCH_SIZE', 2)
+    def test_hand_over(self):
+        # Each upload is a group of its own, and a leader writes one group per hold: the first
+        # upload returns once written, and each queued upload leads the next hold.
+        uploads = {
+            'MainThread': [(1, 'AMS', 'HTL01', 'Hotel 1'), (2, 'AMS', 'HTL02', 'Hotel 2')],
+            'second': [(1, 'AMS', 'HTL03', 'Hotel 3')],
+            'third': [(1, 'AMS', 'HTL04', 'Hotel 4'), (2, 'AMS', 'HTL05', 'Hotel 5')],
+        }
+        writers = []
+        write_group = imports._write_group
+
+        def record_writer(kind, group):
+            writers.append(threading.current_thread().name)
+            return write_group(kind, group)
+
+        def upload():
+            name = threading.current_thread().name
+            try:
+                return imports.import_rows('hotels', uploads[name], f'Hotel upload {name}.csv')
+            finally:
+                if name != 'MainThread':
+                    connection.close()
+
+        def queue_uploads(release):
+            wait_until(lambda: 'hotels' in imports._leaders)
+            threads = [threading.Thread(target=upload, name=name) for name in ('second', 'third')]
+            for queued, thread in enumerate(threads, start=2):
+                thread.start()
+                wait_until(lambda: len(imports._pending['hotels']) == queued)
+            release.set()
+            for thread in threads:
+                thread.join()
+
+        with mock.patch.object(imports, '_write_group', side_effect=record_writer), \
+                mock.patch('hotels.summary.refresh') as refresh, held() as release:
+            queuer = threading.Thread(target=queue_uploads, args=(release,))
+            queuer.start()
+            self.assertEqual(upload(), (2, []))
+            queuer.join()
+
+        self.assertEqual(writers, ['MainThread', 'second', 'third'])
+        self.assertEqual(refresh.call_count, 3)
+        self.assertEqual(Hotel.objects.count(), 5)
+        self.assertEqual(imports._leaders, set())
+        self.assertEqual(imports.status()['queue'], [])
+
+
+@override_settings(CSV_IMPORT_USERNAME='user', CSV_IMPORT_PASSWORD='secret')
+class ImportCommandTest(ImportDirMixin, TestCase):
+
+    def call(self, **options):
+        stdout = StringIO()
+        with mock.patch('builtins.input', return_value='user'), mock.patch('getpass.getpass', return_value='secret'):
+            call_command('import_csv', stdout=stdout, **options)
+        return stdout.getvalue()
+
+    def test_status(self):
+        with held():
+            output = self.call(status=True)
+        self.assertIn('Running: import_csv --mode=file, 500 rows (pid', output)
+        self.assertIn('Queued: 0 imports, 0 rows', output)
+
+    def test_wait(self):
+        path = self.directory / 'cities.csv'
+        path.write_text('AMS;Amsterdam\n')
+        with held(label='Hotel upload h.csv'), self.assertRaises(SystemExit):
+            self.call(mode='file', city_path=str(path), wait=0.1)
+        self.assertFalse(City.objects.exists())
+        output = self.call(mode='file', city_path=str(path), wait=0.1)
+        self.assertIn('Imported 1 cities', output)
+
+
+class AdminUploadTest(ImportDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.create_superuser(username='admin', password='adminpass', email='admin@example.com')
+        self.client.login(username='admin', password='adminpass')
+
+    @override_settings(HOTELS_IMPORT_WAIT_SECONDS=0.1)
+    def test_busy(self):
+        url = reverse('admin:hotels_city_upload_csv')
+        with held():
+            self.assertContains(self.client.get(url), 'Import running: import_csv --mode=file (500 rows)')
+            response = self.client.post(url, {'csv_upload': SimpleUploadedFile('cities.csv', b'AMS;Amsterdam\n')},
+                                        follow=True)
+        self.assertContains(response, 'Another import is running: import_csv --mode=file')
+        self.assertFalse(City.objects.exists())
+        self.assertNotContains(self.client.get(url), 'Import running')
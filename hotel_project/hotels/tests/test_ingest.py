@@ -0,0 +1,131 @@
+"""
+Module: test_ingest
+
+This module contains unit tests for the bulk ingest endpoint (see hotels.ingest).
+
+The tests ensure that:
+    - The body is split into lines across chunk boundaries, and lines that are too long are
+      rejected without being kept.
+    - NDJSON and CSV bodies, plain or gzip-compressed, are written in batches, with cities
+      written before the hotels that refer to them, and the response counts the received,
+      imported and rejected rows of every category.
+    - An ingest keeps the serving connection profile.
+    - The endpoint requires an authenticated user allowed to add cities and hotels, and a
+      supported content type and encoding.
+    - An ingest that waits too long for the import lock answers 503 with the rows written so far.
+"""
+
+import base64
+import gzip
+import json
+from io import BytesIO
+from unittest import mock
+
+from django.contrib.auth.models import Permission, User
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.urls import reverse
+from hotels.ingest import Ingest, parse_csv, read_lines
+from hotels.models import City, Hotel
+from hotels.summary import city_counts
+
+from .test_imports import ImportDirMixin, held
+
+
+def ndjson(*records):
+    return b''.join(json.dumps(record).encode() + b'\n' for record in records)
+
+
+class ReadLinesTest(SimpleTestCase):
+
+    def test_chunks(self):
+        stream = BytesIO(b'first\nsecond line\n\nlast')
+        self.assertEqual(list(read_lines(stream, chunk_size=4)), [b'first', b'second line', b'', b'last'])
+
+    def test_too_long(self):
+        stream = BytesIO(b'short\n' + b'x' * 50 + b'\nafter\n' + b'y' * 20)
+        self.assertEqual(list(read_lines(stream, chunk_size=8, max_line_length=10)), [b'short', None, b'after', None])
+
+
+class IngestTest(ImportDirMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        City.objects.create(code='AMS', name='Amsterdam')
+        self.user = User.objects.create_user(username='partner', password='secret')
+        self.user.user_permissions.add(*Permission.objects.filter(codename__in=('add_city', 'add_hotel')))
+        credentials = base64.b64encode(b'partner:secret').decode()
+        self.auth = {'HTTP_AUTHORIZATION': f'Basic {credentials}'}
+
+    def post(self, body, content_type='application/x-ndjson', **headers):
+        return self.client.post(reverse('api_ingest'), body, content_type=content_type, **{**self.auth, **headers})
+
+    def test_ndjson(self):
+        body = ndjson(
+            {'code': 'AMS01', 'name': 'Canal Hotel', 'city': 'AMS'},
+            {'code': 'RTM', 'name': 'Rotterdam'},
+            {'code': 'RTM01', 'name': 'Harbour Hotel', 'city': 'RTM'},
+            {'code': 'AMS01', 'name': 'Clash', 'city': 'AMS'},
+            {'code': 'XXX01', 'name': 'Nowhere', 'city': 'XXX'},
+            {'code': 'AMS'},
+        ) + b'not json\n'
+        response = self.post(body)
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual(result['cities'], {'received': 1, 'imported': 1, 'rejected': 0, 'errors': []})
+        self.assertEqual(result['hotels'], {
+            'received': 4, 'imported': 2, 'rejected': 2,
+            'errors': [{'line': 4, 'error': 'Hotel code AMS01 already exists'},
+                       {'line': 5, 'error': 'City XXX not found'}],
+        })
+        self.assertEqual(result['invalid'], {
+            'received': 2, 'imported': 0, 'rejected': 2,
+            'errors': [{'line': 6, 'error': 'Expected an object with a code and a name'},
+                       {'line': 7, 'error': 'Invalid JSON'}],
+        })
+        self.assertEqual(sorted(Hotel.objects.values_list('code', 'city_code')), [('AMS01', 'AMS'), ('RTM01', 'RTM')])
+        self.assertIn(('RTM', 'Rotterdam', 1), city_counts())
+
+    def test_batches(self):
+        # A hotel batch is written after the pending cities it may refer to.
+        rows = parse_csv(read_lines(BytesIO(b'RTM;Rotterdam\nRTM;RTM01;Hotel 1\nRTM;RTM02;Hotel 2\nAMS;AMS01;Hotel 3\n')))
+        ingest = Ingest('test ingest', batch_size=2)
+        with mock.patch('hotels.pragmas.profile') as profile:
+            ingest.run(rows)
+        profile.assert_not_called()
+        self.assertEqual([ingest.results[kind].imported for kind in ('cities', 'hotels')], [1, 3])
+        self.assertEqual(Hotel.objects.count(), 3)
+
+    def test_csv_gzip(self):
+        body = gzip.compress(b'RTM;Rotterdam\nRTM;RTM01;Harbour Hotel\nRTM;RTM01\n;;;\n')
+        response = self.post(body, content_type='text/csv; charset=utf-8', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 200)
+        result = response.json()
+        self.assertEqual([result[category]['imported'] for category in ('cities', 'hotels')], [1, 1])
+        self.assertEqual(result['cities']['rejected'], 1)
+        self.assertEqual(result['invalid']['errors'],
+                         [{'line': 4, 'error': 'Expected 2 columns (city) or 3 columns (hotel), found 4'}])
+
+    def test_invalid_gzip(self):
+        response = self.post(b'AMS;Amsterdam\n', content_type='text/csv', HTTP_CONTENT_ENCODING='gzip')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()['detail'], 'Invalid gzip body')
+
+    def test_unsupported(self):
+        self.assertEqual(self.post(b'{}', content_type='application/json').status_code, 415)
+        self.assertEqual(self.post(b'', HTTP_CONTENT_ENCODING='br').status_code, 415)
+
+    def test_permissions(self):
+        self.assertEqual(self.client.post(reverse('api_ingest'), b'', content_type='text/csv').status_code, 401)
+        self.user.user_permissions.clear()
+        self.assertEqual(self.post(b'').status_code, 403)
+
+    @override_settings(HOTELS_IMPORT_WAIT_SECONDS=0.1)
+    def test_busy(self):
+        with held():
+            response = self.post(ndjson({'code': 'RTM', 'name': 'Rotterdam'}))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '30')
+        result = response.json()
+        self.assertIn('Another import is running: import_csv --mode=file', result['detail'])
+        self.assertEqual((result['cities']['received'], result['cities']['imported']), (1, 0))
+        self.assertFalse(City.objects.filter(code='RTM').exists())
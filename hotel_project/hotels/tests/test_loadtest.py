@@ -0,0 +1,93 @@
+"""
+Module: test_loadtest
+
+This module contains unit tests for the load-test reporting and the baseline comparison.
+
+The tests ensure that:
+    - A run is summarised as throughput, latency percentiles in milliseconds and error rate
+      per endpoint.
+    - A run regresses against its baseline when throughput drops, latency grows or the error
+      rate grows beyond the tolerances, and not within them.
+    - The loadtest command rejects missing or invalid baseline files before running.
+"""
+
+import json
+import tempfile
+from pathlib import Path
+
+from django.core.management import CommandError, call_command
+from django.test import SimpleTestCase
+from hotels.loadtest import EndpointStats, compare, summarize
+
+
+def result(throughput=1000.0, p50=2.0, p95=5.0, p99=10.0, error_rate=0.0):
+    return {'requests': 1000, 'throughput': throughput, 'p50': p50, 'p95': p95, 'p99': p99, 'error_rate': error_rate}
+
+
+class SummarizeTest(SimpleTestCase):
+
+    def test_summarize(self):
+        stats = EndpointStats()
+        stats.latencies = [i / 1000 for i in range(1, 101)]
+        stats.errors = 25
+        summary = summarize({'hotels': stats}, 2.5)
+        self.assertEqual(summary['hotels']['requests'], 125)
+        self.assertAlmostEqual(summary['hotels']['throughput'], 50)
+        self.assertAlmostEqual(summary['hotels']['p50'], 51)
+        self.assertAlmostEqual(summary['hotels']['p95'], 96)
+        self.assertAlmostEqual(summary['hotels']['p99'], 100)
+        self.assertAlmostEqual(summary['hotels']['error_rate'], 0.2)
+
+    def test_summarize_no_requests(self):
+        summary = summarize({'cities': EndpointStats()}, 1)
+        self.assertEqual(summary['cities'], result(throughput=0.0, p50=0.0, p95=0.0, p99=0.0) | {'requests': 0})
+
+
+class CompareTest(SimpleTestCase):
+
+    def test_within_tolerance(self):
+        baseline = {'hotels': result()}
+        self.assertEqual(compare({'hotels': result(throughput=850, p50=2.3, p99=11.9, error_rate=0.005)}, baseline), [])
+
+    def test_regressions(self):
+        baseline = {'cities': result(), 'hotels': result()}
+        summary = {'hotels': result(throughput=700, p95=7, p99=12.5, error_rate=0.02), 'search': result()}
+        self.assertEqual(compare(summary, baseline), [
+            'cities: not measured',
+            'hotels: throughput 700 req/s, baseline 1000 req/s',
+            'hotels: p95 7.00 ms, baseline 5.00 ms',
+            'hotels: p99 12.50 ms, baseline 10.00 ms',
+            'hotels: error rate 2.00%, baseline 0.00%',
+        ])
+
+    def test_latency_slack(self):
+        # Doubling a sub-millisecond latency is jitter, not a regression.
+        baseline = {'hotels': result(p50=0.4)}
+        self.assertEqual(compare({'hotels': result(p50=0.9)}, baseline), [])
+        self.assertEqual(compare({'hotels': result(p50=1.5)}, baseline), ['hotels: p50 1.50 ms, baseline 0.40 ms'])
+
+    def test_tolerances(self):
+        baseline = {'hotels': result()}
+        summary = {'hotels': result(throughput=850, error_rate=0.005)}
+        self.assertEqual(len(compare(summary, baseline, tolerance=0.1, error_tolerance=0)), 2)
+
+
+class BaselineFileTest(SimpleTestCase):
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = Path(directory.name) / 'baseline.json'
+
+    def test_missing_baseline(self):
+        with self.assertRaisesMessage(CommandError, 'not found; create it with --save-baseline'):
+            call_command('loadtest', baseline=str(self.path))
+
+    def test_invalid_baseline(self):
+        self.path.write_text(json.dumps({'endpoints': {}}))
+        with self.assertRaisesMessage(CommandError, 'Invalid baseline'):
+            call_command('loadtest', baseline=str(self.path))
+
+    def test_save_baseline_requires_path(self):
+        with self.assertRaisesMessage(CommandError, '--save-baseline requires --baseline'):
+            call_command('loadtest', save_baseline=True)
@@ -0,0 +1,100 @@
+"""
+Module: test_metrics
+
+This module contains unit tests for the per-endpoint request metrics.
+
+The tests ensure that:
+    - Requests are counted per URL name and status code, with their latency, queries,
+      database time, response size and cache lookups.
+    - Requests served through ASGI are recorded too.
+    - Queries run outside of a request are not counted.
+    - The buffers of several threads are merged, the buffer of an ended thread is folded
+      into the totals, and the metrics endpoint serves them in the Prometheus text format
+      without recording itself.
+"""
+
+import threading
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.urls import reverse
+from hotels import catalog, metrics
+from hotels.models import City, Hotel
+
+
+class MetricsTest(TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        self.addCleanup(metrics.reset)
+        cache.clear()
+        catalog.invalidate()
+        amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        Hotel.objects.create(city=amsterdam, code='AMS01', name='Amstel Hotel')
+
+    def scrape(self):
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response['Content-Type'], metrics.CONTENT_TYPE)
+        return response.content.decode().splitlines()
+
+    def test_request_metrics(self):
+        self.client.get(reverse('api_hotel_list', args=['AMS']))
+        self.client.get(reverse('api_hotel_list', args=['AMS']))
+        self.client.get(reverse('api_city_stats'))
+        lines = self.scrape()
+        for line in (
+            'hotels_requests_total{view="api_hotel_list",status="200"} 2',
+            'hotels_request_duration_seconds_count{view="api_hotel_list"} 2',
+            # The first request loads the catalog (data version, cities and hotels); the second
+            # runs no query.
+            'hotels_request_queries_bucket{view="api_hotel_list",le="0"} 1',
+            'hotels_request_queries_sum{view="api_hotel_list"} 3',
+            'hotels_request_queries_sum{view="api_city_stats"} 1',
+            'hotels_response_bytes_count{view="api_hotel_list"} 2',
+            'hotels_cache_lookups_total{view="api_hotel_list",cache="catalog",result="hit"} 1',
+            'hotels_cache_lookups_total{view="api_hotel_list",cache="catalog",result="miss"} 1',
+            'hotels_cache_lookups_total{view="api_hotel_list",cache="body",result="hit"} 1',
+            'hotels_cache_lookups_total{view="api_hotel_list",cache="body",result="miss"} 1',
+        ):
+            self.assertIn(line, lines)
+        self.assertIn('# TYPE hotels_request_duration_seconds histogram', lines)
+        self.assertIn('hotels_request_duration_seconds_bucket{view="api_hotel_list",le="+Inf"} 2', lines)
+        db_seconds = [line for line in lines if line.startswith('hotels_request_db_seconds_total{view="api_city_stats"}')]
+        self.assertGreater(float(db_seconds[0].split()[1]), 0)
+        self.assertFalse([line for line in lines if 'view="metrics"' in line])
+
+    async def test_asgi_requests(self):
+        await self.async_client.get(reverse('api_city_stats'))
+        lines = await sync_to_async(self.scrape)()
+        self.assertIn('hotels_requests_total{view="api_city_stats",status="200"} 1', lines)
+        self.assertIn('hotels_request_queries_sum{view="api_city_stats"} 1', lines)
+
+    def test_status_and_unresolved_urls(self):
+        self.client.get(reverse('api_hotel_list', args=['XXX']))
+        self.client.get('/missing/')
+        lines = self.scrape()
+        self.assertIn('hotels_requests_total{view="api_hotel_list",status="200"} 1', lines)
+        self.assertIn(f'hotels_requests_total{{view="{metrics.UNRESOLVED}",status="404"}} 1', lines)
+
+    def test_queries_outside_requests_are_not_counted(self):
+        Hotel.objects.count()
+        self.client.get(reverse('api_city_stats'))
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertIn('hotels_request_queries_sum{view="api_city_stats"} 1', self.scrape())
+
+    def test_threads_are_merged(self):
+        thread = threading.Thread(target=metrics._record, args=('api_city_list', 0.5, metrics.RequestStats(), 200, 10))
+        buffers = len(metrics._buffers)
+        thread.start()
+        thread.join()
+        # The buffer of the ended thread was folded into the totals.
+        self.assertEqual(len(metrics._buffers), buffers)
+        metrics._record('api_city_list', 0.002, metrics.RequestStats(), 200, 10)
+        lines = self.scrape()
+        self.assertIn('hotels_requests_total{view="api_city_list",status="200"} 2', lines)
+        self.assertIn('hotels_request_duration_seconds_bucket{view="api_city_list",le="0.0025"} 1', lines)
+        self.assertIn('hotels_request_duration_seconds_bucket{view="api_city_list",le="0.5"} 2', lines)
+        self.assertIn('hotels_request_duration_seconds_sum{view="api_city_list"} 0.502', lines)
@@ -0,0 +1,85 @@
+"""
+Module: test_pragmas
+
+This module contains unit tests for the SQLite connection profiles.
+
+The tests ensure that:
+    - New connections get the profile configured for their alias.
+    - A database file is switched to WAL mode.
+    - The bulk import profile is applied for the duration of a block and then restored.
+    - HOTELS_SQLITE_PRAGMAS overrides single pragmas of a profile.
+"""
+
+import tempfile
+from pathlib import Path
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from hotels import pragmas
+from hotels.routers import READ_ALIAS
+
+
+def pragma(conn, name):
+    with conn.cursor() as cursor:
+        cursor.execute(f'PRAGMA {name}')
+        return cursor.fetchone()[0]
+
+
+class PragmaTest(TestCase):
+
+    databases = {DEFAULT_DB_ALIAS, READ_ALIAS}
+
+    def connect(self, alias, name=None):
+        """
+        Open a new connection for an alias, optionally to another database file.
+        """
+        conn = connections.create_connection(alias)
+        if name:
+            conn.settings_dict = {**conn.settings_dict, 'NAME': name}
+        self.addCleanup(conn.close)
+        conn.ensure_connection()
+        return conn
+
+    def test_serving_profile(self):
+        self.assertEqual(pragma(connection, 'synchronous'), 1)
+        self.assertEqual(pragma(connection, 'cache_size'), -65536)
+        self.assertEqual(pragma(connection, 'temp_store'), 2)
+        self.assertEqual(pragma(connection, 'busy_timeout'), 5000)
+        self.assertEqual(pragma(connection, 'query_only'), 0)
+
+    def test_reader_profile(self):
+        self.assertEqual(pragma(self.connect(READ_ALIAS), 'query_only'), 1)
+
+    def test_database_file_uses_wal(self):
+        with tempfile.TemporaryDirectory() as directory:
+            conn = self.connect(DEFAULT_DB_ALIAS, str(Path(directory) / 'db.sqlite3'))
+            self.assertEqual(pragma(conn, 'journal_mode'), 'wal')
+            self.assertEqual(pragma(conn, 'mmap_size'), 256 * 2**20)
+            conn.close()
+
+    @override_settings(HOTELS_SQLITE_PRAGMAS={'serving': {'cache_size': -1024}, 'tiny': {'cache_size': 10}})
+    def test_overrides(self):
+        self.assertEqual(pragmas.get_profile('serving')['cache_size'], -1024)
+        self.assertEqual(pragmas.get_profile('serving')['synchronous'], 'normal')
+        self.assertEqual(pragmas.get_profile('tiny'), {'cache_size': 10})
+        self.assertEqual(pragma(self.connect(DEFAULT_DB_ALIAS), 'cache_size'), -1024)
+
+    def test_unknown_profile(self):
+        with self.assertRaises(KeyError):
+            pragmas.get_profile('missing')
+
+    def test_profile_is_not_switched_inside_transaction(self):
+        with pragmas.profile('bulk_import'):
+            self.assertEqual(pragma(connection, 'wal_autocheckpoint'), 1000)
+
+
+class ProfileSwitchTest(TransactionTestCase):
+
+    def test_bulk_import_profile(self):
+        with pragmas.profile('bulk_import'):
+            self.assertEqual(pragma(connection, 'cache_size'), -262144)
+            self.assertEqual(pragma(connection, 'wal_autocheckpoint'), 10000)
+            # An import never risks the database file.
+            self.assertEqual(pragma(connection, 'synchronous'), 1)
+        self.assertEqual(pragma(connection, 'cache_size'), -65536)
+        self.assertEqual(pragma(connection, 'wal_autocheckpoint'), 1000)
@@ -0,0 +1,134 @@
+"""
+Module: test_profiling
+
+This module contains unit tests for the opt-in request and import profiler.
+
+The tests ensure that:
+    - The middleware leaves the chain when profiling is not configured.
+    - Sampled requests are profiled with cProfile, and their summary holds the URL, the
+      status, the timing and the statements grouped by shape.
+    - The stack samples of a request are only written when it is slower than the threshold.
+    - Only the newest profiles are kept.
+    - import_csv --profile writes a profile of the whole import.
+"""
+
+import json
+import pstats
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.core.exceptions import MiddlewareNotUsed
+from django.core.management import call_command
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from hotels.models import City
+from hotels.profiling import ProfilingMiddleware, StackSampler, rotate
+
+
+def city_count_view(request):
+    return HttpResponse(str(City.objects.count()))
+
+
+def busy(seconds):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        pass
+
+
+class ProfileDirMixin:
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = Path(directory.name)
+        settings = override_settings(HOTELS_PROFILE_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def summaries(self):
+        return [json.loads(path.read_text()) for path in sorted(self.directory.glob('*.json'))]
+
+
+class ProfilingMiddlewareTest(ProfileDirMixin, TestCase):
+
+    def test_disabled_by_default(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            ProfilingMiddleware(city_count_view)
+
+    @override_settings(HOTELS_PROFILE_SAMPLE_RATE=1)
+    def test_sampled_request(self):
+        response = ProfilingMiddleware(city_count_view)(RequestFactory().get('/hotels/api/cities/?page=2'))
+        self.assertEqual(response.content, b'0')
+        [summary] = self.summaries()
+        self.assertEqual(summary['label'], '/hotels/api/cities/?page=2')
+        self.assertEqual((summary['trigger'], summary['method'], summary['status']), ('sampled', 'GET', 200))
+        self.assertGreater(summary['seconds'], 0)
+        self.assertEqual(summary['queries']['count'], 1)
+        self.assertEqual(summary['queries']['shapes'][0]['sql'], 'SELECT COUNT(*) AS "__count" FROM "hotels_city"')
+        stats = pstats.Stats(str(self.directory / summary['profile']))
+        self.assertIn('city_count_view', {name for _file, _line, name in stats.stats})
+
+    @override_settings(HOTELS_PROFILE_SLOW_SECONDS=0.05, HOTELS_PROFILE_INTERVAL=0.001)
+    def test_slow_requests(self):
+        with mock.patch('hotels.profiling._sampler', None):
+            middleware = ProfilingMiddleware(lambda request: HttpResponse(busy(float(request.GET['seconds']))))
+        self.addCleanup(middleware.sampler.stop)
+        middleware(RequestFactory().get('/hotels/', {'seconds': 0}))
+        self.assertEqual(self.summaries(), [])
+
+        middleware(RequestFactory().get('/hotels/', {'seconds': 0.1}))
+        [summary] = self.summaries()
+        self.assertEqual(summary['trigger'], 'slow')
+        self.assertGreaterEqual(summary['seconds'], 0.1)
+        stacks = (self.directory / summary['profile']).read_text()
+        self.assertIn('busy (', stacks)
+
+
+class StackSamplerTest(SimpleTestCase):
+
+    def test_samples_watched_thread_only(self):
+        sampler = StackSampler(0.001)
+        sampler.start()
+        self.addCleanup(sampler.stop)
+        samples = sampler.watch(threading.get_ident())
+        busy(0.05)
+        sampler.unwatch(threading.get_ident())
+        self.assertTrue(samples)
+        self.assertTrue(all('busy (' in stack for stack in samples))
+        count = sum(samples.values())
+        busy(0.02)
+        self.assertEqual(sum(samples.values()), count)
+
+
+class RotateTest(SimpleTestCase):
+
+    def test_keeps_newest(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for stamp in ('20260101T000000.000001', '20260101T000000.000002', '20260101T000000.000003'):
+                for suffix in ('json', 'prof'):
+                    (Path(directory) / f'{stamp}-sampled-x.{suffix}').touch()
+            rotate(directory, 2)
+            self.assertEqual(sorted(path.name for path in Path(directory).iterdir()), [
+                '20260101T000000.000002-sampled-x.json', '20260101T000000.000002-sampled-x.prof',
+                '20260101T000000.000003-sampled-x.json', '20260101T000000.000003-sampled-x.prof',
+            ])
+
+
+class ImportProfileTest(ProfileDirMixin, TestCase):
+
+    @override_settings(CSV_IMPORT_USERNAME='user', CSV_IMPORT_PASSWORD='secret')
+    def test_import_csv_profile(self):
+        path = self.directory / 'cities.csv'
+        path.write_text('AMS;Amsterdam\nBCN;Barcelona\n')
+        with mock.patch('builtins.input', return_value='user'), mock.patch('getpass.getpass', return_value='secret'):
+            call_command('import_csv', mode='file', city_path=str(path), profile=True, stdout=StringIO())
+        self.assertEqual(City.objects.count(), 2)
+        [summary] = self.summaries()
+        self.assertEqual((summary['label'], summary['trigger']), ('import_csv --mode=file', 'command'))
+        self.assertGreater(summary['queries']['count'], 0)
+        stats = pstats.Stats(str(self.directory / summary['profile']))
+        self.assertIn('import_cities_from_string', {name for _file, _line, name in stats.stats})
@@ -0,0 +1,254 @@
+"""
+Module: test_query_budgets
+
+This module declares the query budget of every entry point, and tests the budget helper.
+
+Each test runs a real entry point (API view, server-rendered page, admin page, importer)
+under ``QueryBudget`` (see ``hotels.querybudget``), which fails when the entry point sends
+more statements than its budget or repeats a statement shape more than a few times. The
+fixtures hold several cities with many hotels each, so one query per listed row shows up.
+
+The tests ensure that:
+    - Statements that differ only by their values have the same shape.
+    - The read API and the pages load the catalog with a fixed number of queries, and send
+      none once it is loaded (except the endpoints that read the database by design).
+    - Admin pages send a fixed number of queries, whatever the number of rows listed.
+    - Importing N rows (import_csv, admin uploads, the ingest API) costs a fixed number of
+      queries per batch of rows, never per row.
+"""
+
+import base64
+import math
+from io import StringIO
+from itertools import accumulate
+
+from asgiref.sync import async_to_sync
+from django.contrib.auth.models import User
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import AsyncRequestFactory, SimpleTestCase, TestCase
+from django.urls import reverse
+from hotels import async_views, catalog
+from hotels.management.commands.import_csv import Command as ImportCommand
+from hotels.models import City, Hotel
+from hotels.querybudget import MAX_REPEATS, QueryBudget, normalize
+from hotels.validation import BATCH_SIZE
+
+CITIES = 3
+HOTELS_PER_CITY = 20
+# Loading the catalog: the data version, the cities, then the hotels.
+CATALOG_LOAD = 3
+# The session and the user of a logged-in admin request.
+ADMIN_AUTH = 2
+# The savepoint around the add and change views.
+ADMIN_TRANSACTION = 2
+# The user of a request with HTTP Basic credentials.
+BASIC_AUTH = 1
+
+# Path: (queries with the catalog to load, queries with the catalog loaded).
+API_BUDGETS = {
+    '/hotels/api/cities/': (CATALOG_LOAD, 0),
+    '/hotels/api/cities/search?q=city': (CATALOG_LOAD, 0),
+    '/hotels/api/cities/stats': (1, 1),
+    '/hotels/api/changes?since=0': (2, 2),
+    '/hotels/api/hotels/?codes=C00,C01,C02': (CATALOG_LOAD, 0),
+    '/hotels/api/hotels/C01': (CATALOG_LOAD, 0),
+    '/hotels/api/hotels/search?q=hotel': (1, 1),
+    # One query per chunk of hotels.
+    '/hotels/api/hotels/export': (1, 1),
+    '/hotels/': (CATALOG_LOAD, 0),
+    '/hotels/all/': (CATALOG_LOAD, 0),
+    '/hotels/city/?city=C01': (CATALOG_LOAD, 0),
+    '/metrics': (0, 0),
+}
+
+# Importer: (queries whatever the size, queries per batch of BATCH_SIZE rows). A batch is
+# validated with one query per lookup and written in a savepoint.
+IMPORT_BUDGETS = {
+    # 1 uniqueness lookup, 2 savepoint statements, 3 INSERTs of at most 499 cities.
+    'cities': (4, 6),
+    # 2 lookups (cities, codes), 2 savepoint statements, 1 executemany() INSERT, and 4
+    # statements indexing the batch for full-text search.
+    'hotels': (4, 9),
+}
+IMPORT_SIZES = (10, 2 * BATCH_SIZE + 500)
+
+
+def import_rows(kind, prefix):
+    """
+    Return (size, CSV) pairs for every import size, with codes that do not collide between sizes.
+    """
+    for size, start in zip(IMPORT_SIZES, accumulate(IMPORT_SIZES, initial=0)):
+        numbers = range(start, start + size)
+        if kind == 'cities':
+            yield size, ''.join(f'{chr(65 + i // 676)}{chr(65 + i // 26 % 26)}{chr(65 + i % 26)};{prefix} city {i}\n'
+                                for i in numbers)
+        else:
+            yield size, ''.join(f'C00;{prefix}{i:04X};{prefix} hotel {i}\n' for i in numbers)
+
+
+def import_budget(kind, rows, extra=0):
+    """
+    Return the QueryBudget of importing ``rows`` rows of a kind, in batches, plus ``extra`` queries.
+    """
+    fixed, per_batch = IMPORT_BUDGETS[kind]
+    batch_count = math.ceil(rows / BATCH_SIZE)
+    # The INSERTs of a batch share a shape; nothing else may repeat once per row.
+    return QueryBudget(extra + fixed + per_batch * batch_count, max_repeats=MAX_REPEATS * batch_count,
+                       label=f'Import of {rows} {kind}')
+
+
+class CatalogFixtureMixin:
+
+    def setUp(self):
+        catalog.invalidate()
+        for i in range(CITIES):
+            city = City.objects.create(code=f'C{i:02d}', name=f'City {i}')
+            Hotel.objects.bulk_create(
+                Hotel(city=city, city_code=city.code, code=f'H{i}{j:03d}', name=f'Hotel {i} {j}')
+                for j in range(HOTELS_PER_CITY)
+            )
+        catalog.bump_data_version()
+
+
+class QueryBudgetTest(SimpleTestCase):
+
+    def test_normalize(self):
+        self.assertEqual(
+            normalize('SELECT "hotels_hotel"."id" FROM "hotels_hotel" WHERE "hotels_hotel"."code" = \'AMS01\' LIMIT 21'),
+            'SELECT "hotels_hotel"."id" FROM "hotels_hotel" WHERE "hotels_hotel"."code" = ? LIMIT ?',
+        )
+        self.assertEqual(normalize("SELECT 1 FROM t WHERE code IN ('A', 'it''s', NULL)"), 'SELECT ? FROM t WHERE code IN (...)')
+        self.assertEqual(normalize("INSERT INTO t (a, b) VALUES ('x', 1), ('y', 2)"), 'INSERT INTO t (a, b) VALUES (...)')
+        self.assertEqual(normalize('SAVEPOINT "s140_x12"'), 'SAVEPOINT "s?"')
+        self.assertEqual(normalize('SELECT "T3"."id2"\n  FROM t3'), 'SELECT "T3"."id2" FROM t3')
+
+    def test_report(self):
+        budget = QueryBudget()
+        budget.queries = ["SELECT * FROM t WHERE id = 1", "SELECT * FROM t WHERE id = 2", "SELECT 1"]
+        self.assertEqual(budget.report(), '    2 x SELECT * FROM t WHERE id = ?\n    1 x SELECT ?')
+
+
+class QueryBudgetFailureTest(CatalogFixtureMixin, TestCase):
+
+    def test_too_many_queries(self):
+        with self.assertRaisesMessage(AssertionError, 'City list: 2 queries, budget 1'):
+            with QueryBudget(1, label='City list'):
+                list(City.objects.all())
+                list(Hotel.objects.all())
+
+    def test_n_plus_one(self):
+        with self.assertRaisesMessage(AssertionError, 'repeated more than 5 times (N+1)') as context:
+            with QueryBudget():
+                for hotel in Hotel.objects.all():
+                    hotel.city.name
+        self.assertIn(f'{CITIES * HOTELS_PER_CITY} x SELECT "hotels_city"."id"', str(context.exception))
+
+    def test_decorator(self):
+        @QueryBudget(0)
+        def count():
+            return City.objects.count()
+
+        with self.assertRaises(AssertionError):
+            count()
+
+
+class ReadBudgetTest(CatalogFixtureMixin, TestCase):
+
+    def test_api_and_pages(self):
+        for path, (cold, warm) in API_BUDGETS.items():
+            with self.subTest(path=path):
+                catalog.invalidate()
+                for budget in (cold, warm):
+                    with QueryBudget(budget, label=path):
+                        response = self.client.get(path)
+                        body = b''.join(response.streaming_content) if response.streaming else response.content
+                    self.assertEqual(response.status_code, 200, body[:200])
+
+    def test_async_api(self):
+        factory = AsyncRequestFactory()
+        for view, path, kwargs in (
+            ('city_list', '/hotels/api/cities/', {}),
+            ('city_search', '/hotels/api/cities/search?q=city', {}),
+            ('hotel_batch', '/hotels/api/hotels/?codes=C00,C01,C02', {}),
+            ('hotel_list', '/hotels/api/hotels/C01', {'code': 'C01'}),
+        ):
+            with self.subTest(view=view):
+                catalog.invalidate()
+                for budget in API_BUDGETS[path]:
+                    with QueryBudget(budget, label=view):
+                        response = async_to_sync(getattr(async_views, view))(factory.get(path), **kwargs)
+                    self.assertEqual(response.status_code, 200)
+
+
+class AdminBudgetTest(CatalogFixtureMixin, TestCase):
+
+    def setUp(self):
+        super().setUp()
+        User.objects.create_superuser(username='admin', password='adminpass', email='admin@example.com')
+        self.client.login(username='admin', password='adminpass')
+
+    def test_pages(self):
+        changelist = reverse('admin:hotels_hotel_changelist')
+        hotel = Hotel.objects.first()
+        for path, budget in (
+            # The recent actions of the user.
+            (reverse('admin:index'), ADMIN_AUTH + 1),
+            # Count and page.
+            (reverse('admin:hotels_city_changelist'), ADMIN_AUTH + 2),
+            # Summed per-city counts and the page with its cities.
+            (changelist, ADMIN_AUTH + 2),
+            # The filtered city, the capped count and the page.
+            (f'{changelist}?city__id__exact={hotel.city_id}', ADMIN_AUTH + 3),
+            (f'{changelist}?q=hotel', ADMIN_AUTH + 2),
+            (f'{changelist}?after={hotel.code}', ADMIN_AUTH + 3),
+            # The object, its content type, and the selected city of the autocomplete widget.
+            (reverse('admin:hotels_hotel_change', args=[hotel.pk]), ADMIN_AUTH + ADMIN_TRANSACTION + 3),
+            (reverse('admin:hotels_city_change', args=[hotel.city_id]), ADMIN_AUTH + ADMIN_TRANSACTION + 2),
+            (reverse('admin:hotels_hotel_add'), ADMIN_AUTH + ADMIN_TRANSACTION),
+            (reverse('admin:autocomplete') + '?app_label=hotels&model_name=hotel&field_name=city&term=c',
+             ADMIN_AUTH + 2),
+            (reverse('admin:hotels_city_upload_csv'), ADMIN_AUTH),
+        ):
+            with self.subTest(path=path):
+                with QueryBudget(budget, label=path):
+                    response = self.client.get(path)
+                self.assertEqual(response.status_code, 200)
+
+    def test_uploads(self):
+        for (rows, cities), (_rows, hotels) in zip(import_rows('cities', 'U'), import_rows('hotels', 'U')):
+            with self.subTest(rows=rows):
+                with import_budget('cities', rows, extra=ADMIN_AUTH):
+                    self.client.post(reverse('admin:hotels_city_upload_csv'),
+                                     {'csv_upload': SimpleUploadedFile('cities.csv', cities.encode())})
+                with import_budget('hotels', rows, extra=ADMIN_AUTH):
+                    self.client.post(reverse('admin:hotels_hotel_upload_csv'),
+                                     {'csv_upload': SimpleUploadedFile('hotels.csv', hotels.encode())})
+        self.assertEqual(City.objects.filter(name__startswith='U').count(), sum(IMPORT_SIZES))
+        self.assertEqual(Hotel.objects.filter(code__startswith='U').count(), sum(IMPORT_SIZES))
+
+
+class ImportBudgetTest(CatalogFixtureMixin, TestCase):
+
+    def test_import_csv(self):
+        command = ImportCommand(stdout=StringIO())
+        for (rows, cities), (_rows, hotels) in zip(import_rows('cities', 'I'), import_rows('hotels', 'I')):
+            with self.subTest(rows=rows):
+                with import_budget('cities', rows):
+                    command.import_cities_from_string(cities)
+                with import_budget('hotels', rows):
+                    command.import_hotels_from_string(hotels)
+        self.assertEqual(City.objects.filter(name__startswith='I').count(), sum(IMPORT_SIZES))
+        self.assertEqual(Hotel.objects.filter(code__startswith='I').count(), sum(IMPORT_SIZES))
+
+    def test_ingest(self):
+        User.objects.create_superuser(username='partner', password='secret', email='partner@example.com')
+        credentials = base64.b64encode(b'partner:secret').decode()
+        for (rows, cities), (_rows, hotels) in zip(import_rows('cities', 'N'), import_rows('hotels', 'N')):
+            for kind, body in (('cities', cities), ('hotels', hotels)):
+                with self.subTest(rows=rows, kind=kind):
+                    with import_budget(kind, rows, extra=BASIC_AUTH):
+                        response = self.client.post(reverse('api_ingest'), body, content_type='text/csv',
+                                                    HTTP_AUTHORIZATION=f'Basic {credentials}')
+                    self.assertEqual(response.status_code, 200)
+        self.assertEqual(City.objects.filter(name__startswith='N').count(), sum(IMPORT_SIZES))
+        self.assertEqual(Hotel.objects.filter(code__startswith='N').count(), sum(IMPORT_SIZES))
@@ -0,0 +1,149 @@
+"""
+Module: test_query_plans
+
+This module contains regression tests for the query plans of the hot access paths.
+
+Each test runs a real entry point, captures the SQL it sends, and asks SQLite for the
+``EXPLAIN QUERY PLAN`` of every statement that touches the hotels tables.
+
+The tests ensure that:
+    - No statement sorts through a temporary B-tree (ORDER BY or GROUP BY without an index).
+    - No statement scans a table without an index, unless reading the whole table is the
+      purpose of the query (e.g. loading the catalog).
+    - The hot paths use the composite indexes declared in ``Hotel.Meta.indexes``.
+"""
+
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test import TestCase, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from hotels import catalog
+from hotels.management.commands.import_csv import Command as ImportCommand
+from hotels.models import City, Hotel
+
+CITY_NAME_CODE_INDEX = 'hotel_city_name_code_idx'
+
+
+def query_plan(sql, params=()):
+    """
+    Return the EXPLAIN QUERY PLAN detail lines of a statement.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute('EXPLAIN QUERY PLAN ' + sql, params)
+        return [row[3] for row in cursor.fetchall()]
+
+
+@skipUnlessDBFeature('supports_explaining_query_execution')
+class QueryPlanTest(TestCase):
+
+    def setUp(self):
+        catalog.invalidate()
+        amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        paris = City.objects.create(code='PAR', name='Paris')
+        Hotel.objects.create(city=amsterdam, code='AMS01', name='Amstel Hotel')
+        Hotel.objects.create(city=paris, code='PAR01', name='Ritz')
+
+    def assertIndexedPlans(self, func, full_scans=(), uses=(), sorts=0):
+        """
+        Run a function and check the plans of the statements it sends.
+
+        Args:
+            func (callable): The entry point to run.
+            full_scans (tuple): Tables that may be read completely.
+            uses (tuple): Index names that must appear in at least one plan.
+            sorts (int): Number of temporary sorts a statement may use.
+
+        Returns:
+            list: The plans, as lists of detail lines.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            func()
+        plans = []
+        for query in queries.captured_queries:
+            sql = query['sql']
+            if 'hotels_' not in sql or not sql.lstrip().upper().startswith(('SELECT', 'INSERT', 'UPDATE', 'DELETE')):
+                continue
+            plan = query_plan(sql)
+            plans.append(plan)
+            self.assertLessEqual(sum('TEMP B-TREE' in line for line in plan), sorts, f'{sql}\n{plan}')
+            for line in plan:
+                if line.startswith('SCAN ') and 'INDEX' not in line and line != 'SCAN CONSTANT ROW':
+                    table = line.split()[1]
+                    self.assertIn(table, full_scans, f'Unindexed scan of {table}:\n{sql}\n{plan}')
+        for index in uses:
+            self.assertTrue(any(index in line for plan in plans for line in plan), f'{index} not used:\n{plans}')
+        return plans
+
+    def test_catalog_load(self):
+        self.assertIndexedPlans(catalog.get_catalog, uses=(CITY_NAME_CODE_INDEX,))
+
+    def test_hotels_of_city(self):
+        # The ORM form of the hotel list (Meta.ordering by name), used by the template views.
+        self.assertIndexedPlans(
+            lambda: list(Hotel.objects.filter(city__code='AMS').values_list('code', 'name')),
+            uses=(CITY_NAME_CODE_INDEX,),
+        )
+
+    def test_hotels_by_city_code(self):
+        # With the denormalized city code the hotel list of a city needs no join.
+        plans = self.assertIndexedPlans(
+            lambda: list(Hotel.objects.filter(city_code='AMS').values_list('code', 'name')),
+            uses=('hotel_citycode_name_code_idx',),
+        )
+        self.assertEqual(plans, [['SEARCH hotels_hotel USING COVERING INDEX hotel_citycode_name_code_idx (city_code=?)']])
+
+    def test_hotels_in_default_order(self):
+        self.assertIndexedPlans(lambda: list(Hotel.objects.all()[:50]), uses=('hotel_name_idx',))
+
+    def test_export(self):
+        plans = self.assertIndexedPlans(lambda: b''.join(self.client.get(reverse('api_hotel_export')).streaming_content))
+        self.assertNotIn('hotels_city', str(plans))
+
+    def test_city_stats(self):
+        self.assertIndexedPlans(lambda: self.client.get(reverse('api_city_stats')))
+
+    def test_changes(self):
+        self.assertIndexedPlans(lambda: self.client.get(reverse('api_changes'), {'since': 1, 'limit': 10}))
+
+    def test_hotel_search(self):
+        # "SCAN m" and "SCAN e" read the FTS matches and the exact names, which are already limited.
+        # The FTS matches are sorted by BM25, which no index provides.
+        self.assertIndexedPlans(
+            lambda: self.client.get(reverse('api_hotel_search'), {'q': 'ams'}),
+            full_scans=('m', 'e', 'sqlite_master'),
+            uses=('hotels_hotel_name_nocase',),
+            sorts=1,
+        )
+
+    def test_importers(self):
+        command = ImportCommand()
+        command.stdout.write = lambda *args, **kwargs: None
+
+        def run():
+            command.import_cities_from_string('BCN;Barcelona\nAMS;Amsterdam')
+            command.import_hotels_from_string('BCN;BCN01;Casa Batllo\nAMS;AMS01;Amstel Hotel')
+
+        # The per-city statistics are recounted over all cities at the end of an import.
+        self.assertIndexedPlans(run, full_scans=('c',))
+
+    def test_admin_changelist(self):
+        self.client.force_login(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        changelist = reverse('admin:hotels_hotel_changelist')
+        paris = City.objects.get(code='PAR')
+        for params in ({}, {'after': 'AMS01'}, {'before': 'PAR01'}, {'city__id__exact': paris.pk}):
+            with self.subTest(params=params):
+                self.assertIndexedPlans(
+                    lambda: self.client.get(changelist, params),
+                    uses=('hotel_citycode_name_code_idx',),
+                    # The number of hotels is the sum of the per-city counts; filtered hotels
+                    # are counted over a subquery limited to COUNT_LIMIT rows.
+                    full_scans=('hotels_city_stats', 'subquery'),
+                )
+
+    def test_city_delete(self):
+        # Deleting cities cascades to their hotels through the composite index.
+        self.assertIndexedPlans(
+            lambda: City.objects.filter(code='AMS').delete(),
+            uses=(CITY_NAME_CODE_INDEX,),
+        )
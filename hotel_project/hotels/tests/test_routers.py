@@ -0,0 +1,147 @@
+"""
+Module: test_routers
+
+This module contains unit tests for the read/write database routing.
+
+The tests ensure that:
+    - Reads of the hotels models go to the read alias, and writes to the primary.
+    - Reads inside a write transaction go to the primary, so writers see their own rows.
+    - On a WAL-mode SQLite file, reads through the read alias are never blocked by a large
+      import holding a write transaction on the primary, and only see committed rows.
+"""
+
+import tempfile
+import threading
+import time
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.test import SimpleTestCase
+from hotels.management.commands.import_csv import Command as ImportCommand
+from hotels.models import City, Hotel
+from hotels.routers import READ_ALIAS
+
+IMPORT_SIZE = 1000
+# A reader that waited for the writer would take the whole import (seconds).
+MAX_READ_SECONDS = 0.5
+
+
+class RouterTest(SimpleTestCase):
+
+    def test_reads_go_to_read_alias(self):
+        self.assertEqual(router.db_for_read(City), READ_ALIAS)
+        self.assertEqual(router.db_for_read(Hotel), READ_ALIAS)
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(router.db_for_write(Hotel), DEFAULT_DB_ALIAS)
+
+    def test_reads_in_transaction_go_to_primary(self):
+        with mock.patch.object(connections[DEFAULT_DB_ALIAS], 'in_atomic_block', True):
+            self.assertEqual(router.db_for_read(Hotel), DEFAULT_DB_ALIAS)
+
+    def test_other_apps_are_not_routed(self):
+        self.assertEqual(router.db_for_read(User), DEFAULT_DB_ALIAS)
+
+    def test_read_alias_is_not_migrated(self):
+        self.assertFalse(router.allow_migrate(READ_ALIAS, 'hotels'))
+        self.assertTrue(router.allow_migrate(DEFAULT_DB_ALIAS, 'hotels'))
+
+
+class ConcurrentImportTest(SimpleTestCase):
+    """
+    Run a large import and concurrent API reads on a database file.
+
+    The test database lives in memory, so each thread connects its own aliases to a
+    temporary file instead (connections are per thread).
+    """
+
+    databases = {DEFAULT_DB_ALIAS, READ_ALIAS}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.name = str(Path(directory.name) / 'db.sqlite3')
+        self.run_in_thread(lambda: call_command('migrate', verbosity=0, stdout=StringIO())).join()
+
+    def connect(self):
+        """
+        Point the aliases of the current thread at the database file.
+        """
+        for alias in (DEFAULT_DB_ALIAS, READ_ALIAS):
+            settings_dict = {**connections.settings[alias], 'NAME': self.name}
+            connections[alias] = connections.create_connection(alias)
+            connections[alias].settings_dict = settings_dict
+
+    def disconnect(self):
+        for alias in (DEFAULT_DB_ALIAS, READ_ALIAS):
+            connections[alias].close()
+
+    def run_in_thread(self, func):
+        def target():
+            self.connect()
+            try:
+                func()
+            finally:
+                self.disconnect()
+        thread = threading.Thread(target=target)
+        thread.start()
+        return thread
+
+    def test_reads_are_not_blocked_by_import(self):
+        started, imported, read = threading.Event(), threading.Event(), threading.Event()
+        errors, reads = [], []
+        cities = ''.join(f'C{i:02d};City {i}\n' for i in range(50))
+        hotels = ''.join(f'C{i % 50:02d};H{i:04d};Hotel {i}\n' for i in range(IMPORT_SIZE))
+
+        def write():
+            command = ImportCommand(stdout=StringIO())
+            try:
+                # A page cache smaller than the import: the writer spills pages to the
+                # database before it commits, as a large import does.
+                with connections[DEFAULT_DB_ALIAS].cursor() as cursor:
+                    cursor.execute('PRAGMA cache_size = 16')
+                with transaction.atomic():
+                    command.import_cities_from_string(cities)
+                    started.set()
+                    command.import_hotels_from_string(hotels)
+                    imported.set()
+                    # Keep the transaction open until the reader has seen the finished import.
+                    read.wait(10)
+            except Exception as error:
+                errors.append(error)
+            finally:
+                started.set()
+                imported.set()
+
+        def read_during_import():
+            started.wait(10)
+            try:
+                while True:
+                    done = imported.is_set()
+                    begin = time.perf_counter()
+                    count = Hotel.objects.count()
+                    reads.append((time.perf_counter() - begin, count, router.db_for_read(Hotel)))
+                    if done:
+                        break
+            except Exception as error:
+                errors.append(error)
+            finally:
+                read.set()
+
+        threads = [self.run_in_thread(write), self.run_in_thread(read_during_import)]
+        for thread in threads:
+            thread.join(60)
+
+        self.assertEqual(errors, [])
+        self.assertGreater(len(reads), 1)
+        self.assertEqual({alias for _seconds, _count, alias in reads}, {READ_ALIAS})
+        self.assertEqual({count for _seconds, count, _alias in reads}, {0})
+        self.assertLess(max(seconds for seconds, _count, _alias in reads), MAX_READ_SECONDS)
+
+        counts = []
+        self.run_in_thread(lambda: counts.append(Hotel.objects.count())).join()
+        self.assertEqual(counts, [IMPORT_SIZE])
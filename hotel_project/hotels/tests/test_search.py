@@ -0,0 +1,77 @@
+"""
+Module: test_search
+
+This module contains unit tests for the city autocomplete index and its API endpoint.
+
+The tests ensure that:
+    - Matching is case- and accent-insensitive.
+    - Exact code matches rank first, then name prefixes, word prefixes and substrings.
+    - The index follows imports through the catalog data version.
+"""
+
+from django.test import SimpleTestCase, TestCase
+from django.urls import reverse
+from hotels import catalog
+from hotels.models import City
+from hotels.search import CitySearchIndex, fold
+
+
+class CitySearchIndexTest(SimpleTestCase):
+
+    def setUp(self):
+        # Rows are ordered by name, like the rows of the catalog CityTable.
+        self.codes = ['AMS', 'ANT', 'BCN', 'DAM', 'NYC', 'ZUR']
+        self.names = ['Amsterdam', 'Antwerpen', 'Barcelona', 'Damascus', 'New York', 'Zürich']
+        self.index = CitySearchIndex(self.codes, self.names)
+
+    def search(self, query, limit=10):
+        return [self.codes[row] for row in self.index.search(query, limit)]
+
+    def test_fold(self):
+        self.assertEqual(fold('  Zürich  Höngg '), 'zurich hongg')
+
+    def test_case_and_accent_insensitive(self):
+        self.assertEqual(self.search('ZUR'), ['ZUR'])
+        self.assertEqual(self.search('züri'), ['ZUR'])
+
+    def test_ranking(self):
+        # DAM: exact code, Damascus: name prefix, Amsterdam: substring.
+        self.assertEqual(self.search('dam'), ['DAM', 'AMS'])
+        self.assertEqual(self.search('a'), ['AMS', 'ANT'])
+
+    def test_word_prefix(self):
+        self.assertEqual(self.search('york'), ['NYC'])
+
+    def test_code_prefix(self):
+        self.assertEqual(self.search('ny'), ['NYC'])
+
+    def test_limit(self):
+        self.assertEqual(self.search('a', limit=1), ['AMS'])
+
+    def test_no_match(self):
+        self.assertEqual(self.search('xyz'), [])
+        self.assertEqual(self.search(''), [])
+
+
+class CitySearchApiTest(TestCase):
+
+    def setUp(self):
+        catalog.invalidate()
+        City.objects.create(code='AMS', name='Amsterdam')
+        City.objects.create(code='ANT', name='Antwerpen')
+
+    def test_search(self):
+        response = self.client.get(reverse('api_city_search'), {'q': 'amst'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), [{'code': 'AMS', 'name': 'Amsterdam'}])
+
+    def test_limit_is_clamped(self):
+        response = self.client.get(reverse('api_city_search'), {'q': 'a', 'limit': '0'})
+        self.assertEqual([city['code'] for city in response.json()], ['AMS'])
+
+    def test_index_follows_imports(self):
+        self.client.get(reverse('api_city_search'), {'q': 'a'})
+        City.objects.create(code='AAL', name='Aalborg')
+
+        response = self.client.get(reverse('api_city_search'), {'q': 'a'})
+        self.assertEqual([city['code'] for city in response.json()], ['AAL', 'AMS', 'ANT'])
@@ -0,0 +1,83 @@
+"""
+Module: test_summary
+
+This module contains unit tests for the per-city hotel counts and the city statistics
+endpoint.
+
+The tests ensure that:
+    - The counts follow inserts, deletes, bulk writes and hotels moving between cities.
+    - refresh() repairs counts that drifted from the hotels table.
+    - The endpoint returns the count per city and the totals without aggregating hotels.
+"""
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from hotels import summary
+from hotels.models import City, Hotel
+
+
+class SummaryTestCase(TestCase):
+
+    def setUp(self):
+        self.amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        self.paris = City.objects.create(code='PAR', name='Paris')
+        Hotel.objects.create(city=self.amsterdam, code='AMS01', name='Amstel Hotel')
+        Hotel.objects.create(city=self.amsterdam, code='AMS02', name='Canal House')
+        Hotel.objects.create(city=self.paris, code='PAR01', name='Ritz')
+
+    def counts(self):
+        return {code: count for code, _name, count in summary.city_counts()}
+
+
+class SummaryTest(SummaryTestCase):
+
+    def test_counts(self):
+        self.assertEqual(summary.city_counts(), [('AMS', 'Amsterdam', 2), ('PAR', 'Paris', 1)])
+
+    def test_total_hotels(self):
+        Hotel.objects.filter(code='AMS01').delete()
+        with self.assertNumQueries(1):
+            self.assertEqual(summary.total_hotels(), 2)
+
+    def test_new_city_has_no_hotels(self):
+        City.objects.create(code='BCN', name='Barcelona')
+        self.assertEqual(self.counts()['BCN'], 0)
+
+    def test_counts_follow_writes(self):
+        Hotel.objects.bulk_create([Hotel(city=self.paris, code=f'PAR0{i}', name=f'Hotel {i}') for i in (2, 3)])
+        Hotel.objects.filter(code='AMS01').delete()
+        self.assertEqual(self.counts(), {'AMS': 1, 'PAR': 3})
+
+    def test_counts_follow_moves(self):
+        Hotel.objects.filter(code='AMS01').update(city=self.paris)
+        self.assertEqual(self.counts(), {'AMS': 1, 'PAR': 2})
+
+    def test_city_delete(self):
+        self.paris.delete()
+        self.assertEqual(self.counts(), {'AMS': 2})
+
+    def test_refresh_repairs_drift(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f'UPDATE {summary.STATS_TABLE} SET hotel_count = 42')
+        summary.refresh()
+        self.assertEqual(self.counts(), {'AMS': 2, 'PAR': 1})
+
+
+class CityStatsApiTest(SummaryTestCase):
+
+    def test_stats(self):
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(reverse('api_city_stats'))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {
+            'cities': [
+                {'code': 'AMS', 'name': 'Amsterdam', 'hotels': 2},
+                {'code': 'PAR', 'name': 'Paris', 'hotels': 1},
+            ],
+            'total_cities': 2,
+            'total_hotels': 3,
+        })
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('GROUP BY', queries[0]['sql'])
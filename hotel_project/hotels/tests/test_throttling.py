@@ -0,0 +1,119 @@
+"""
+Module: test_throttling
+
+This module contains unit tests for the rate limiting and load shedding of the API.
+
+The tests ensure that:
+    - A token bucket lets a burst through, then one request per refilled token, and tells
+      how long to wait; the least recently seen clients are forgotten first.
+    - API requests over the rate of their client get a 429 with Retry-After, per client
+      address (or forwarded address), while the pages and other clients are served.
+    - Requests beyond the in-flight limit, or while the database latency is above its
+      threshold, get a 503, under WSGI and ASGI; the shedding on latency expires.
+    - The middleware is left out when every limit is disabled.
+"""
+
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from hotels import throttling
+from hotels.metrics import RequestStats
+
+UNLIMITED = {'HOTELS_THROTTLE_RATE': 0, 'HOTELS_SHED_MAX_IN_FLIGHT': 0, 'HOTELS_SHED_DB_SECONDS': None}
+
+
+class TokenBucketsTest(SimpleTestCase):
+
+    def test_take(self):
+        buckets = throttling.TokenBuckets(rate=2, burst=3)
+        self.assertEqual([buckets.take('a', now=0) for _ in range(3)], [0, 0, 0])
+        self.assertEqual(buckets.take('a', now=0), 0.5)
+        self.assertEqual(buckets.take('b', now=0), 0)
+        self.assertEqual(buckets.take('a', now=0.5), 0)
+        self.assertAlmostEqual(buckets.take('a', now=0.75), 0.25)
+        # A bucket never holds more than the burst.
+        self.assertEqual([buckets.take('a', now=100) for _ in range(4)], [0, 0, 0, 0.5])
+
+    def test_forget(self):
+        buckets = throttling.TokenBuckets(rate=1, burst=1, max_clients=2)
+        for client in ('a', 'b', 'a', 'c'):
+            buckets.take(client, now=0)
+        self.assertEqual(list(buckets.buckets), ['a', 'c'])
+
+
+@override_settings(HOTELS_THROTTLE_RATE=1, HOTELS_THROTTLE_BURST=2)
+class RateLimitTest(TestCase):
+
+    def test_rate_limit(self):
+        statuses = [self.client.get('/hotels/api/cities/').status_code for _ in range(3)]
+        self.assertEqual(statuses, [200, 200, 429])
+        response = self.client.get('/hotels/api/cities/')
+        self.assertEqual(response['Retry-After'], '1')
+        self.assertEqual(response.json(), {'detail': 'Request was throttled. Expected available in 1 second.'})
+        self.assertEqual(self.client.get('/hotels/api/cities/', REMOTE_ADDR='10.0.0.2').status_code, 200)
+        self.assertEqual(self.client.get('/hotels/').status_code, 200)
+
+    @override_settings(HOTELS_THROTTLE_CLIENT_HEADER='HTTP_X_FORWARDED_FOR')
+    def test_forwarded_client(self):
+        for _ in range(2):
+            self.client.get('/hotels/api/cities/', HTTP_X_FORWARDED_FOR='spoofed, 10.0.0.1')
+        self.assertEqual(self.client.get('/hotels/api/cities/', HTTP_X_FORWARDED_FOR='10.0.0.1').status_code, 429)
+        self.assertEqual(self.client.get('/hotels/api/cities/', HTTP_X_FORWARDED_FOR='10.0.0.2').status_code, 200)
+
+
+@override_settings(**UNLIMITED)
+class LoadSheddingTest(SimpleTestCase):
+
+    def setUp(self):
+        self.request_factory = RequestFactory()
+
+    def request(self):
+        return self.request_factory.get('/hotels/api/cities/')
+
+    @override_settings(HOTELS_SHED_MAX_IN_FLIGHT=1)
+    def test_in_flight(self):
+        nested = []
+
+        def get_response(request):
+            # A second request while the first one is served.
+            nested.append(middleware(self.request()))
+            return HttpResponse()
+
+        middleware = throttling.LoadSheddingMiddleware(get_response)
+        self.assertEqual(middleware(self.request()).status_code, 200)
+        self.assertEqual(nested[0].status_code, 503)
+        self.assertEqual(nested[0]['Retry-After'], '1')
+        self.assertEqual(middleware.in_flight, 0)
+
+    @override_settings(HOTELS_SHED_MAX_IN_FLIGHT=1)
+    def test_in_flight_async(self):
+        nested = []
+
+        async def get_response(request):
+            nested.append(await middleware(self.request()))
+            return HttpResponse()
+
+        middleware = throttling.LoadSheddingMiddleware(get_response)
+        self.assertEqual(async_to_sync(middleware)(self.request()).status_code, 200)
+        self.assertEqual(nested[0].status_code, 503)
+        self.assertEqual(middleware.in_flight, 0)
+
+    @override_settings(HOTELS_SHED_DB_SECONDS=0.1, HOTELS_SHED_DB_WINDOW=0.05)
+    def test_db_latency(self):
+        stats = RequestStats()
+        stats.queries, stats.db_seconds = 2, 0.5
+        middleware = throttling.LoadSheddingMiddleware(lambda request: HttpResponse())
+        with mock.patch('hotels.metrics.request_stats', return_value=stats):
+            self.assertEqual(middleware(self.request()).status_code, 200)
+        self.assertEqual(middleware.db_latency, 0.25)
+        self.assertEqual(middleware(self.request()).status_code, 503)
+        time.sleep(0.05)
+        self.assertEqual(middleware(self.request()).status_code, 200)
+
+    def test_unused(self):
+        with self.assertRaises(MiddlewareNotUsed):
+            throttling.LoadSheddingMiddleware(lambda request: HttpResponse())
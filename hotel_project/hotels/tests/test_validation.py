@@ -0,0 +1,110 @@
+"""
+Module: test_validation
+
+This module contains unit tests for the normalisation and validation of City and Hotel rows.
+
+The tests ensure that:
+    - Codes are stripped and upper-cased, names stripped, and lengths enforced.
+    - Model clean() runs without queries.
+    - Batch validation rejects unknown cities and taken codes and names, including
+      duplicates within the batch, with a fixed number of queries per batch.
+    - The importers look up the cities of a batch once instead of once per row.
+"""
+
+from io import StringIO
+
+from django.core.exceptions import ValidationError
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from hotels.management.commands.import_csv import Command as ImportCommand
+from hotels.models import City, Hotel
+from hotels.validation import batches, clean_city_rows, clean_hotel_rows, normalize_city, normalize_hotel
+
+
+class NormalizeTest(TestCase):
+
+    def test_city(self):
+        self.assertEqual(normalize_city(' ams ', ' Amsterdam '), ('AMS', 'Amsterdam'))
+
+    def test_hotel(self):
+        self.assertEqual(normalize_hotel('ams01 ', 'Amstel Hotel '), ('AMS01', 'Amstel Hotel'))
+
+    def test_invalid(self):
+        for code, name, message in (
+            ('AMST', 'Amsterdam', 'The city code must be 3 characters long'),
+            ('AMS', '  ', 'The city name cannot be empty'),
+            ('AMS', 'A' * 101, 'The city name must be at most 100 characters long'),
+        ):
+            with self.assertRaisesMessage(ValidationError, message):
+                normalize_city(code, name)
+        with self.assertRaisesMessage(ValidationError, 'The hotel code must be 5 characters long'):
+            normalize_hotel('AMS1', 'Amstel Hotel')
+
+    def test_model_clean_runs_no_queries(self):
+        hotel = Hotel(city=City.objects.create(code='AMS', name='Amsterdam'), code=' ams01', name='Amstel ')
+        with self.assertNumQueries(0):
+            hotel.clean()
+        self.assertEqual((hotel.code, hotel.name), ('AMS01', 'Amstel'))
+
+    def test_model_clean_requires_city(self):
+        with self.assertRaisesMessage(ValidationError, 'The hotel must belong to a city'):
+            Hotel(code='AMS01', name='Amstel').clean()
+
+
+class BatchTest(TestCase):
+
+    def setUp(self):
+        self.amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        Hotel.objects.create(city=self.amsterdam, code='AMS01', name='Amstel Hotel')
+
+    def test_cities(self):
+        with self.assertNumQueries(1):
+            valid, rejected = clean_city_rows([
+                (1, 'bcn', 'Barcelona'),
+                (2, 'AMS', 'Amsterdam Noord'),
+                (3, 'ANS', 'Amsterdam'),
+                (4, 'BCN', 'Barcelona 2'),
+                (5, 'PA', 'Paris'),
+            ])
+        self.assertEqual(valid, [(1, 'BCN', 'Barcelona')])
+        self.assertEqual(rejected, [
+            (2, 'City code AMS already exists'),
+            (3, 'City name Amsterdam already exists'),
+            (4, 'City code BCN already exists'),
+            (5, 'The city code must be 3 characters long'),
+        ])
+
+    def test_hotels(self):
+        with self.assertNumQueries(2):
+            valid, rejected = clean_hotel_rows([
+                (1, 'ams', 'ams02', ' Canal House'),
+                (2, 'PAR', 'PAR01', 'Ritz'),
+                (3, 'AMS', 'AMS01', 'Amstel'),
+                (4, 'AMS', 'AMS02', 'Canal House 2'),
+                (5, 'AMS', 'AMS03', ''),
+            ])
+        self.assertEqual(valid, [(1, self.amsterdam, 'AMS02', 'Canal House')])
+        self.assertEqual(rejected, [
+            (2, 'City PAR not found'),
+            (3, 'Hotel code AMS01 already exists'),
+            (4, 'Hotel code AMS02 already exists'),
+            (5, 'The hotel name cannot be empty'),
+        ])
+
+    def test_invalid_batch_runs_no_uniqueness_query(self):
+        with self.assertNumQueries(0):
+            self.assertEqual(clean_city_rows([(1, 'AM', 'Amsterdam')])[0], [])
+
+    def test_batches(self):
+        self.assertEqual(list(batches(range(5), 2)), [[0, 1], [2, 3], [4]])
+
+    def test_importer_looks_up_cities_once_per_batch(self):
+        command = ImportCommand(stdout=StringIO())
+        rows = ''.join(f'AMS;A{i:04d};Hotel {i}\n' for i in range(50))
+        with CaptureQueriesContext(connection) as queries:
+            command.import_hotels_from_string(rows)
+        city_lookups = [query for query in queries.captured_queries
+                        if query['sql'].startswith('SELECT') and 'FROM "hotels_city"' in query['sql']]
+        self.assertEqual(len(city_lookups), 1)
+        self.assertEqual(Hotel.objects.count(), 51)
@@ -0,0 +1,79 @@
+"""
+Module: test_views
+
+This module contains unit tests for the server-rendered city and hotel pages.
+
+The tests ensure that:
+    - The pages list the cities, all hotels and the hotels of a city, and paginate them.
+    - Unknown cities and pages are not found.
+    - Once the catalog is loaded a page runs no query, and its rendered list is cached
+      until the data changes.
+"""
+
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.cache.utils import make_template_fragment_key
+from django.test import TestCase
+from django.urls import reverse
+from hotels import catalog, views
+from hotels.models import City, Hotel
+
+
+class PageTest(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        catalog.invalidate()
+        self.amsterdam = City.objects.create(code='AMS', name='Amsterdam')
+        self.paris = City.objects.create(code='PAR', name='Paris')
+        Hotel.objects.create(city=self.amsterdam, code='AMS01', name='Amstel Hotel')
+        Hotel.objects.create(city=self.amsterdam, code='AMS02', name='Canal House')
+        Hotel.objects.create(city=self.paris, code='PAR01', name='Ritz')
+
+    def test_city_list(self):
+        response = self.client.get(reverse('city_list'))
+        self.assertContains(response, f'<a href="{reverse("hotel_in_city")}?city=PAR">Paris</a>', html=True)
+        self.assertContains(response, 'Amsterdam')
+
+    def test_hotel_list(self):
+        response = self.client.get(reverse('hotel_list'))
+        for name in ('Amstel Hotel', 'Canal House', 'Ritz'):
+            self.assertContains(response, name)
+
+    def test_hotels_in_city(self):
+        response = self.client.get(reverse('hotel_in_city'), {'city': 'ams'})
+        self.assertContains(response, '<h1>Hotels in Amsterdam</h1>', html=True)
+        self.assertContains(response, 'Canal House (AMS02)')
+        self.assertNotContains(response, 'Ritz')
+
+    def test_unknown_city(self):
+        self.assertEqual(self.client.get(reverse('hotel_in_city'), {'city': 'XXX'}).status_code, 404)
+
+    @mock.patch.object(views, 'PAGE_SIZE', 2)
+    def test_pagination(self):
+        response = self.client.get(reverse('hotel_list'), {'page': 2})
+        self.assertContains(response, 'Ritz')
+        self.assertNotContains(response, 'Amstel Hotel')
+        self.assertContains(response, '<a href="?page=1" rel="prev">Previous</a>', html=True)
+        response = self.client.get(reverse('hotel_in_city'), {'city': 'AMS'})
+        self.assertNotContains(response, 'rel="next"')
+        self.assertEqual(self.client.get(reverse('hotel_list'), {'page': 3}).status_code, 404)
+        self.assertEqual(self.client.get(reverse('hotel_list'), {'page': 'last'}).status_code, 404)
+
+    def test_cached_page_runs_no_query(self):
+        url = reverse('hotel_in_city') + '?city=AMS'
+        self.client.get(url)
+        with self.assertNumQueries(0):
+            self.client.get(url)
+        key = make_template_fragment_key('hotel_list', ['AMS', 1, catalog.get_data_version()])
+        self.assertIn('Canal House', cache.get(key))
+
+    def test_write_refreshes_pages(self):
+        url = reverse('hotel_in_city') + '?city=AMS'
+        self.client.get(url)
+        Hotel.objects.filter(code='AMS02').update(name='Canal Lodge')
+        catalog.bump_data_version()
+        response = self.client.get(url)
+        self.assertContains(response, 'Canal Lodge')
+        self.assertNotContains(response, 'Canal House')
@@ -0,0 +1,80 @@
+"""
+Module: test_warmup
+
+This module contains unit tests for the warm-up run when the application is loaded.
+
+The tests ensure that:
+    - After the warm-up the read API answers from the warm catalog without any query, and the
+      bodies of the busiest cities are rendered and compressed.
+    - The cities warmed are the ones with the most hotels, or the configured ones.
+    - Without connect, no connection is opened for the requests.
+    - The steps left when the time budget is spent are skipped.
+    - A step that fails is logged, and the steps after it still run.
+"""
+
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from hotels import catalog, warmup
+from hotels.models import City, Hotel
+from hotels.querybudget import QueryBudget
+
+
+class WarmupTest(TestCase):
+
+    def setUp(self):
+        # The replica mirrors the test database, which is locked by the test transaction.
+        patcher = mock.patch.object(warmup.connections, 'all', return_value=[connection])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        catalog.invalidate()
+        for i, count in enumerate((3, 30, 10)):
+            city = City.objects.create(code=f'C{i:02d}', name=f'City {i}')
+            Hotel.objects.bulk_create(
+                Hotel(city=city, city_code=city.code, code=f'H{i}{j:03d}', name=f'Hotel {i} {j}')
+                for j in range(count)
+            )
+        catalog.bump_data_version()
+
+    def test_warm_up(self):
+        durations = warmup.warm_up()
+        self.assertEqual(list(durations), ['connections', 'routes', 'catalog', 'templates', 'bodies'])
+        self.assertTrue(all(seconds is not None for seconds in durations.values()))
+        snapshot = catalog.get_catalog()
+        self.assertEqual(set(snapshot._hotels_json), {'C00', 'C01', 'C02'})
+        self.assertTrue(snapshot.hotels_json('C01').has_variant('gzip'))
+        with QueryBudget(0, label='warm API'):
+            for path in ('/hotels/api/cities/', '/hotels/api/cities/search?q=city', '/hotels/api/hotels/C01'):
+                self.assertEqual(self.client.get(path, HTTP_ACCEPT_ENCODING='gzip').status_code, 200)
+
+    def test_warm_up_without_connect(self):
+        open_connections = mock.Mock()
+        with mock.patch('hotels.warmup.STEPS', (('connections', open_connections), *warmup.STEPS[1:])):
+            durations = warmup.warm_up(connect=False)
+        open_connections.assert_not_called()
+        self.assertEqual(list(durations), ['routes', 'catalog', 'templates', 'bodies'])
+        self.assertIn('C01', catalog.get_catalog()._hotels_json)
+
+    def test_warmup_cities(self):
+        snapshot = catalog.get_catalog()
+        with override_settings(HOTELS_WARMUP_CITY_COUNT=2):
+            self.assertEqual(warmup.warmup_cities(snapshot), ['C01', 'C02'])
+        with override_settings(HOTELS_WARMUP_CITIES=['C00', 'XXX']):
+            self.assertEqual(warmup.warmup_cities(snapshot), ['C00'])
+
+    def test_budget_spent(self):
+        with self.assertLogs('hotels.warmup', 'WARNING') as logs:
+            durations = warmup.warm_up(seconds=-1)
+        self.assertEqual(set(durations.values()), {None})
+        self.assertIn('skipping connections', logs.output[0])
+        self.assertEqual(catalog.get_catalog()._hotels_json, {})
+
+    def test_failing_step(self):
+        steps = (('routes', mock.Mock(side_effect=RuntimeError('broken'))), *warmup.STEPS[2:])
+        with mock.patch('hotels.warmup.STEPS', steps), self.assertLogs('hotels.warmup', 'ERROR') as logs:
+            durations = warmup.warm_up()
+        self.assertIn('Warm-up step routes failed', logs.output[0])
+        self.assertIsNone(durations['routes'])
+        self.assertIsNotNone(durations['bodies'])
+        self.assertIn('C01', catalog.get_catalog()._hotels_json)
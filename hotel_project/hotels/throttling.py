@@ -0,0 +1,225 @@
+"""
+Module: throttling
+
+Rate limiting and load shedding of the API, before a request reaches its view.
+
+``LoadSheddingMiddleware`` guards the paths under HOTELS_THROTTLE_PATHS (the API) and
+answers in microseconds, without touching the database, when a request should not be served:
+    - 429 Too Many Requests when the client exceeds its rate. Every client has a token bucket
+      (``TokenBuckets``) holding up to HOTELS_THROTTLE_BURST tokens and refilled with
+      HOTELS_THROTTLE_RATE tokens per second; a request takes one token. ``Retry-After`` is
+      the time until the next token.
+    - 503 Service Unavailable when the process already serves HOTELS_SHED_MAX_IN_FLIGHT
+      requests, or when the recent database latency (the mean duration of a query, averaged
+      over the last requests that sent queries) is above HOTELS_SHED_DB_SECONDS.
+      ``Retry-After`` is one second.
+
+A runaway client is thus turned away by its own bucket, and a burst beyond what the process
+can serve is rejected at once instead of queueing behind the requests in progress, so the
+requests that are admitted keep their usual latency.
+
+Clients are told apart by their address (``REMOTE_ADDR``). Behind a reverse proxy, set
+HOTELS_THROTTLE_CLIENT_HEADER to the ``request.META`` key of the header carrying the client
+address, e.g. ``HTTP_X_FORWARDED_FOR``: its last entry, the one added by the proxy, is used.
+
+The buckets and counters live in the memory of each process, like the Django local-memory
+cache, which would add no sharing and could not update a bucket atomically: with N worker
+processes a client may get up to N times its rate, and the in-flight limit is per process.
+A request counts as in flight until its response is returned (for a streamed response, until
+its first chunk). The database latency is read from the query statistics of
+``MetricsMiddleware`` (see ``hotels.metrics``), and only counts for HOTELS_SHED_DB_WINDOW
+seconds after the request that measured it, so that the shedding stops by itself once no
+request measures it any more. Catalog reloads run long queries by design: keep the
+threshold above their duration, or leave it unset.
+
+Settings:
+    - HOTELS_THROTTLE_PATHS: Path prefixes guarded by the middleware (default the API).
+    - HOTELS_THROTTLE_RATE: Requests per second and client; 0 disables the rate limit (default 20).
+    - HOTELS_THROTTLE_BURST: Requests a client may send at once (default twice the rate).
+    - HOTELS_THROTTLE_CLIENT_HEADER: ``request.META`` key of the client address behind a proxy.
+    - HOTELS_SHED_MAX_IN_FLIGHT: Requests served at once per process; 0 disables (default 64).
+    - HOTELS_SHED_DB_SECONDS: Mean query duration above which requests are shed (default None).
+    - HOTELS_SHED_DB_WINDOW: Seconds a measured database latency counts (default 1).
+
+Classes:
+    - TokenBuckets: A token bucket per client.
+    - LoadSheddingMiddleware: Middleware rejecting throttled and excess requests.
+"""
+
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.http import JsonResponse
+
+from . import metrics
+
+THROTTLE_PATHS = ('/hotels/api/',)
+THROTTLE_RATE = 20
+MAX_IN_FLIGHT = 64
+DB_WINDOW = 1
+# Buckets kept per process; the least recently seen clients are forgotten first.
+MAX_CLIENTS = 10000
+# Weight of the latest request in the database latency average.
+DB_LATENCY_WEIGHT = 0.3
+SHED_RETRY_AFTER = 1
+
+
+def _rejection(status, detail, retry_after):
+    response = JsonResponse({'detail': detail}, status=status, headers={'Retry-After': str(retry_after)})
+    # Django logs every 4xx and 5xx response as a warning; under overload that would be a line
+    # per rejected request. The rejections are counted by the metrics (see hotels.metrics).
+    response._has_been_logged = True
+    return response
+
+
+class TokenBuckets:
+    """
+    A token bucket per client, in the memory of the process.
+
+    Args:
+        rate (float): Tokens added per second.
+        burst (int): Capacity of a bucket; a new client starts with a full bucket.
+        max_clients (int): Buckets kept; forgetting one gives its client a full bucket.
+    """
+
+    def __init__(self, rate, burst, max_clients=MAX_CLIENTS):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        # Client: (tokens, time of the last update), least recently seen first.
+        self.buckets = OrderedDict()
+        self.lock = threading.Lock()
+
+    def take(self, client, now=None):
+        """
+        Take a token from the bucket of a client.
+
+        Returns:
+            float: 0 if a token was taken, otherwise the seconds until one is available.
+        """
+        if now is None:
+            now = time.monotonic()
+        with self.lock:
+            tokens, updated = self.buckets.pop(client, (self.burst, now))
+            tokens = min(self.burst, tokens + (now - updated) * self.rate)
+            wait = 0 if tokens >= 1 else (1 - tokens) / self.rate
+            if not wait:
+                tokens -= 1
+            self.buckets[client] = (tokens, now)
+            if len(self.buckets) > self.max_clients:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class LoadSheddingMiddleware:
+    """
+    Reject the API requests of clients over their rate (429), and the requests beyond what
+    the process can serve (503).
+
+    Put it after ``CorsMiddleware``, so the rejections carry the CORS headers the frontend
+    needs to read them. Works under WSGI and ASGI.
+
+    Raises:
+        MiddlewareNotUsed: If the rate limit and both shedding thresholds are disabled.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.paths = tuple(getattr(settings, 'HOTELS_THROTTLE_PATHS', THROTTLE_PATHS))
+        rate = getattr(settings, 'HOTELS_THROTTLE_RATE', THROTTLE_RATE)
+        burst = getattr(settings, 'HOTELS_THROTTLE_BURST', None) or max(1, 2 * rate)
+        self.buckets = TokenBuckets(rate, burst) if rate else None
+        self.client_header = getattr(settings, 'HOTELS_THROTTLE_CLIENT_HEADER', None)
+        self.max_in_flight = getattr(settings, 'HOTELS_SHED_MAX_IN_FLIGHT', MAX_IN_FLIGHT)
+        self.db_seconds = getattr(settings, 'HOTELS_SHED_DB_SECONDS', None)
+        self.db_window = getattr(settings, 'HOTELS_SHED_DB_WINDOW', DB_WINDOW)
+        if self.buckets is None and not self.max_in_flight and self.db_seconds is None:
+            raise MiddlewareNotUsed
+        self.in_flight = 0
+        # Mean query duration of the last requests that sent queries, and when it was measured.
+        self.db_latency = 0.0
+        self.db_measured = -math.inf
+        self.lock = threading.Lock()
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if not request.path_info.startswith(self.paths):
+            return self.get_response(request)
+        rejection = self.admit(request)
+        if rejection is not None:
+            return rejection
+        try:
+            return self.get_response(request)
+        finally:
+            self.release()
+
+    async def __acall__(self, request):
+        if not request.path_info.startswith(self.paths):
+            return await self.get_response(request)
+        rejection = self.admit(request)
+        if rejection is not None:
+            return rejection
+        try:
+            return await self.get_response(request)
+        finally:
+            self.release()
+
+    def client(self, request):
+        """
+        Return the address identifying the client of a request.
+        """
+        if self.client_header:
+            forwarded = request.META.get(self.client_header)
+            if forwarded:
+                return forwarded.rsplit(',', 1)[-1].strip()
+        return request.META.get('REMOTE_ADDR', '')
+
+    def admit(self, request):
+        """
+        Count the request as in flight, or return the response rejecting it.
+        """
+        if self.buckets is not None:
+            wait = self.buckets.take(self.client(request))
+            if wait:
+                seconds = math.ceil(wait)
+                plural = 's' if seconds > 1 else ''
+                return _rejection(429, f'Request was throttled. Expected available in {seconds} second{plural}.', seconds)
+        now = time.monotonic()
+        with self.lock:
+            overloaded = (
+                self.max_in_flight and self.in_flight >= self.max_in_flight
+                or self.db_seconds is not None and self.db_latency > self.db_seconds
+                and now - self.db_measured < self.db_window
+            )
+            if not overloaded:
+                self.in_flight += 1
+        if overloaded:
+            return _rejection(503, 'The server is overloaded, try again later.', SHED_RETRY_AFTER)
+        return None
+
+    def release(self):
+        """
+        Count the request out, and add its query latency to the database latency.
+        """
+        stats = metrics.request_stats()
+        with self.lock:
+            self.in_flight -= 1
+            if stats is None or not stats.queries:
+                return
+            latency = stats.db_seconds / stats.queries
+            now = time.monotonic()
+            if now - self.db_measured >= self.db_window:
+                self.db_latency = latency
+            else:
+                self.db_latency += DB_LATENCY_WEIGHT * (latency - self.db_latency)
+            self.db_measured = now
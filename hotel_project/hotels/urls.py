@@ -1,8 +1,28 @@
+from django.conf import settings
 from django.urls import path
-from .api_views import city_list, hotel_list
-from .views import CityView, HotelInCityView
+from .api_views import ingest
+from .views import CityView, HotelInCityView, HotelView
+
+# ASGI deployments serve the read API from native async views (see hotels.async_views).
+if settings.HOTELS_ASYNC_API:
+    from . import async_views as api
+else:
+    from . import api_views as api
 
 urlpatterns = [
-    path('api/cities/', city_list, name='api_city_list'),
-    path('api/hotels/<str:code>', hotel_list, name='api_hotel_list'),
-]
\ No newline at end of file
+    # Server-rendered pages for crawlers and clients without JavaScript (see hotels.views).
+    path('', CityView.as_view(), name='city_list'),
+    path('all/', HotelView.as_view(), name='hotel_list'),
+    path('city/', HotelInCityView.as_view(), name='hotel_in_city'),
+    path('api/cities/', api.city_list, name='api_city_list'),
+    path('api/cities/search', api.city_search, name='api_city_search'),
+    path('api/cities/stats', api.city_stats, name='api_city_stats'),
+    path('api/changes', api.changes, name='api_changes'),
+    path('api/hotels/', api.hotel_batch, name='api_hotel_batch'),
+    # City codes have at most 3 characters, so "export" and "search" can never shadow a city.
+    path('api/hotels/export', api.hotel_export, name='api_hotel_export'),
+    path('api/hotels/search', api.hotel_search, name='api_hotel_search'),
+    path('api/hotels/<str:code>', api.hotel_list, name='api_hotel_list'),
+    # Bulk writes for partners; a sync view under ASGI as well (see hotels.ingest).
+    path('api/ingest', ingest, name='api_ingest'),
+]
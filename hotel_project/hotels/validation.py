@@ -0,0 +1,252 @@
+"""
+Module: validation
+
+Normalisation and validation of City and Hotel rows, shared by the model ``clean()``
+methods (admin forms), import_csv and the admin CSV uploads.
+
+The per-row rules are pure Python and run on plain values: codes are stripped and
+upper-cased, names stripped, and lengths checked. The rules that need the database (the
+city of a hotel exists, codes and names are not taken yet) are checked for a whole batch of
+rows at once, with one query per batch instead of one per row. The valid rows of a batch are
+then written with one statement (the triggers keep the derived tables in sync, see
+``hotels.denormalize``), and the hotels of a batch are indexed for full-text search at once
+(see ``hotels.fulltext``).
+
+Functions:
+    - normalize_code: Normalise a city or hotel code.
+    - normalize_city: Normalise and validate the fields of a city.
+    - normalize_hotel: Normalise and validate the fields of a hotel.
+    - clean_city_rows: Validate a batch of city rows, including uniqueness.
+    - clean_hotel_rows: Validate a batch of hotel rows, resolving their cities.
+    - insert_city_rows: Write a batch of validated city rows.
+    - insert_hotel_rows: Write a batch of validated hotel rows.
+    - batches: Split rows into batches.
+"""
+
+from itertools import islice
+
+from django.core.exceptions import ValidationError
+from django.db import connections, router, transaction
+from django.db.models import Q
+
+CITY_CODE_LENGTH = 3
+CITY_NAME_MAX_LENGTH = 100
+HOTEL_CODE_LENGTH = 5
+HOTEL_NAME_MAX_LENGTH = 50
+
+# Rows validated (and written) per batch by the importers.
+BATCH_SIZE = 1000
+
+
+def normalize_code(code):
+    """
+    Normalise a city or hotel code as it is stored, e.g. to look it up.
+
+    Args:
+        code (str): The code, or None.
+
+    Returns:
+        str: The stripped, upper-cased code.
+    """
+    return (code or '').strip().upper()
+
+
+def _normalize(kind, code, name, code_length, name_max_length):
+    code = normalize_code(code)
+    name = (name or '').strip()
+    if len(code) != code_length:
+        raise ValidationError(f'The {kind} code must be {code_length} characters long')
+    if not name:
+        raise ValidationError(f'The {kind} name cannot be empty')
+    if len(name) > name_max_length:
+        raise ValidationError(f'The {kind} name must be at most {name_max_length} characters long')
+    return code, name
+
+
+def normalize_city(code, name):
+    """
+    Normalise and validate the fields of a city.
+
+    Args:
+        code (str): The city code.
+        name (str): The city name.
+
+    Returns:
+        tuple: The normalised (code, name).
+
+    Raises:
+        ValidationError: If a field is invalid.
+    """
+    return _normalize('city', code, name, CITY_CODE_LENGTH, CITY_NAME_MAX_LENGTH)
+
+
+def normalize_hotel(code, name):
+    """
+    Normalise and validate the fields of a hotel.
+
+    Args:
+        code (str): The hotel code.
+        name (str): The hotel name.
+
+    Returns:
+        tuple: The normalised (code, name).
+
+    Raises:
+        ValidationError: If a field is invalid.
+    """
+    return _normalize('hotel', code, name, HOTEL_CODE_LENGTH, HOTEL_NAME_MAX_LENGTH)
+
+
+def clean_city_rows(rows, using=None):
+    """
+    Normalise and validate a batch of city rows.
+
+    Codes and names that already exist, in the database or earlier in the batch, are
+    rejected. The database is queried once for the whole batch.
+
+    Args:
+        rows (list): (row number, code, name) tuples.
+        using (str): The database alias. Defaults to the alias cities are written to.
+
+    Returns:
+        tuple: The valid rows as (row number, code, name) tuples, and the rejected rows as
+            (row number, message) tuples, both in input order.
+    """
+    from .models import City
+
+    valid, rejected = [], []
+    for number, code, name in rows:
+        try:
+            code, name = normalize_city(code, name)
+        except ValidationError as error:
+            rejected.append((number, error.messages[0]))
+            continue
+        valid.append((number, code, name))
+    if not valid:
+        return valid, rejected
+
+    using = using or router.db_for_write(City)
+    existing = City.objects.using(using).filter(
+        Q(code__in={code for _number, code, _name in valid}) | Q(name__in={name for _number, _code, name in valid})
+    ).order_by().values_list('code', 'name')
+    codes, names = set(), set()
+    for code, name in existing:
+        codes.add(code)
+        names.add(name)
+    accepted = []
+    for number, code, name in valid:
+        if code in codes:
+            rejected.append((number, f'City code {code} already exists'))
+        elif name in names:
+            rejected.append((number, f'City name {name} already exists'))
+        else:
+            codes.add(code)
+            names.add(name)
+            accepted.append((number, code, name))
+    rejected.sort()
+    return accepted, rejected
+
+
+def clean_hotel_rows(rows, using=None):
+    """
+    Normalise and validate a batch of hotel rows, resolving the city of every hotel.
+
+    Rows whose city does not exist, and hotel codes that already exist (in the database or
+    earlier in the batch), are rejected. The database is queried twice for the whole batch.
+
+    Args:
+        rows (list): (row number, city code, hotel code, name) tuples.
+        using (str): The database alias. Defaults to the alias hotels are written to.
+
+    Returns:
+        tuple: The valid rows as (row number, City, hotel code, name) tuples, and the
+            rejected rows as (row number, message) tuples, both in input order.
+    """
+    from .models import City, Hotel
+
+    using = using or router.db_for_write(Hotel)
+    rows = [(number, (city_code or '').strip().upper(), code, name) for number, city_code, code, name in rows]
+    cities = City.objects.using(using).order_by().in_bulk({city_code for _number, city_code, _code, _name in rows}, field_name='code')
+
+    valid, rejected = [], []
+    for number, city_code, code, name in rows:
+        city = cities.get(city_code)
+        if city is None:
+            rejected.append((number, f'City {city_code} not found'))
+            continue
+        try:
+            code, name = normalize_hotel(code, name)
+        except ValidationError as error:
+            rejected.append((number, error.messages[0]))
+            continue
+        valid.append((number, city, code, name))
+    if not valid:
+        return valid, rejected
+
+    codes = set(Hotel.objects.using(using).filter(
+        code__in={code for _number, _city, code, _name in valid}
+    ).order_by().values_list('code', flat=True))
+    accepted = []
+    for number, city, code, name in valid:
+        if code in codes:
+            rejected.append((number, f'Hotel code {code} already exists'))
+        else:
+            codes.add(code)
+            accepted.append((number, city, code, name))
+    rejected.sort()
+    return accepted, rejected
+
+
+def insert_city_rows(rows, using=None):
+    """
+    Write a batch of city rows validated by clean_city_rows(), in one transaction.
+
+    Args:
+        rows (list): The valid (row number, code, name) tuples.
+        using (str): The database alias. Defaults to the alias cities are written to.
+    """
+    from . import catalog
+    from .models import City
+
+    using = using or router.db_for_write(City)
+    with transaction.atomic(using=using):
+        City.objects.using(using).bulk_create(City(code=code, name=name) for _number, code, name in rows)
+    # bulk_create() sends no post_save signal.
+    if rows:
+        catalog.bump_data_version()
+
+
+def insert_hotel_rows(rows, using=None):
+    """
+    Write a batch of hotel rows validated by clean_hotel_rows(), in one transaction, and
+    index them for full-text search with one statement.
+
+    Args:
+        rows (list): The valid (row number, City, hotel code, name) tuples.
+        using (str): The database alias. Defaults to the alias hotels are written to.
+    """
+    from . import catalog, fulltext
+    from .models import Hotel
+
+    if not rows:
+        return
+    using = using or router.db_for_write(Hotel)
+    # executemany() rather than bulk_create(), which builds a model instance and prepares
+    # every field of every row, in more time than the INSERT itself takes.
+    connection = connections[using]
+    table = connection.ops.quote_name(Hotel._meta.db_table)
+    with transaction.atomic(using=using), fulltext.deferred_indexing(using), connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {table} (city_id, city_code, code, name) VALUES (%s, %s, %s, %s)',
+            [(city.pk, city.code, code, name) for _number, city, code, name in rows],
+        )
+    catalog.bump_data_version()
+
+
+def batches(rows, size=BATCH_SIZE):
+    """
+    Split an iterable of rows into lists of at most ``size`` rows.
+    """
+    rows = iter(rows)
+    while batch := list(islice(rows, size)):
+        yield batch
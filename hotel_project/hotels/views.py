@@ -1,50 +1,117 @@
-from django.shortcuts import render
+"""
+Module: views
+
+Server-rendered city and hotel pages: a fallback to the React app for crawlers and clients
+without JavaScript.
+
+The pages are slices of the in-memory catalog (see ``hotels.catalog``), like the read API,
+so serving a page runs no query once the catalog is loaded. The rendered list of a page is
+kept in Django's cache as a template fragment (``{% cache %}``) keyed by the city, the page
+number and the catalog data version, so a write makes every cached page stale at once and
+an unchanged page is only rendered once per data version.
+
+Settings:
+    - HOTELS_PAGE_CACHE_TIMEOUT: Seconds a rendered fragment is kept (default 3600, 0 disables).
+
+Classes:
+    - CityView: All cities, linking to their hotels.
+    - HotelView: All hotels with their city.
+    - HotelInCityView: The hotels of the city given as ``?city=<code>``, or all hotels.
+"""
+
+from django.conf import settings
+from django.core.paginator import InvalidPage, Paginator
+from django.http import Http404
 from django.views.generic import TemplateView
-from .models import Hotel, City
 
-# Create your views here.
+from .catalog import get_catalog
+
+PAGE_SIZE = 100
+PAGE_CACHE_TIMEOUT = 3600
+
+
+class CatalogPageMixin:
+    """
+    Paginate rows of the catalog snapshot and add the fragment cache parameters.
+    """
+
+    def paginate(self, rows):
+        """
+        Return the requested page of a sequence of catalog rows.
+
+        Raises:
+            Http404: If the page does not exist.
+        """
+        try:
+            return Paginator(rows, PAGE_SIZE).page(self.request.GET.get('page', 1))
+        except InvalidPage as error:
+            raise Http404(str(error))
 
-# City view
-class CityView(TemplateView):
-    template_name = 'hotels/city_list.html'
-    
     def get_context_data(self, **kwargs):
         context = super().get_context_data(**kwargs)
-        context['cities'] = City.objects.all()  # Instead of values()
+        self.catalog = get_catalog()
+        context['cache_timeout'] = getattr(settings, 'HOTELS_PAGE_CACHE_TIMEOUT', PAGE_CACHE_TIMEOUT)
+        context['data_version'] = '%d.%d' % self.catalog.versions
         return context
 
 
+# City view
+class CityView(CatalogPageMixin, TemplateView):
+    template_name = 'hotels/city_list.html'
+
+    def get_context_data(self, **kwargs):
+        context = super().get_context_data(**kwargs)
+        cities = self.catalog.cities
+        context['page_obj'] = page = self.paginate(range(len(cities)))
+        # A generator: it only runs when the cached fragment has to be rendered.
+        context['cities'] = ({'code': cities.codes[row], 'name': cities.names[row]} for row in page.object_list)
+        return context
 
 
 # Hotel view
-class HotelView(TemplateView):
+class HotelView(CatalogPageMixin, TemplateView):
     template_name = 'hotels/hotel_list.html'
-    
+
+    def hotel_rows(self):
+        """
+        Return the catalog rows of the hotels to list.
+        """
+        return range(len(self.catalog.hotels))
+
     def get_context_data(self, **kwargs):
-        # Get the default context data from the parent class.
         context = super().get_context_data(**kwargs)
-        # Query all hotels from the database.
-        context['hotels'] = Hotel.objects.all()
+        cities, hotels = self.catalog.cities, self.catalog.hotels
+        context['page_obj'] = page = self.paginate(self.hotel_rows())
+        context['hotels'] = (
+            {
+                'code': hotels.codes[row],
+                'name': hotels.names[row],
+                'city_code': cities.codes[hotels.city_rows[row]],
+                'city_name': cities.names[hotels.city_rows[row]],
+            }
+            for row in page.object_list
+        )
         return context
-    
+
 
 # View to display hotels for selected city
-class HotelInCityView(TemplateView):
-    template_name = 'hotels/hotel_list.html'
-    
+class HotelInCityView(HotelView):
+
     def get_context_data(self, **kwargs):
-        context = super().get_context_data(**kwargs)
-        print(self.request.GET)  # Debugging print statement
         # Get the city code from the URL parameter.
-        city = self.request.GET.get('city')
-        
-        if city:
-            # Filter hotels by the related City's code.
-            context['hotels'] = Hotel.objects.filter(city__code=city)
-            context['selected_city'] = City.objects.filter(code=city).first()
-        else:
-            # Show all hotels if no city is provided.
-            context['hotels'] = Hotel.objects.all()
-            context['selected_city'] = None  # or assign a default value if desired
+        self.city_code = self.request.GET.get('city', '').strip().upper()
+        context = super().get_context_data(**kwargs)
+        context['selected_city'] = None
+        if self.city_code:
+            cities = self.catalog.cities
+            row = cities.row_by_code[self.city_code]
+            context['selected_city'] = {'code': self.city_code, 'name': cities.names[row]}
         return context
 
+    def hotel_rows(self):
+        if not self.city_code:
+            # Show all hotels if no city is provided.
+            return super().hotel_rows()
+        if self.city_code not in self.catalog.cities.row_by_code:
+            raise Http404(f'City {self.city_code} not found')
+        return self.catalog.hotel_rows(self.city_code)
@@ -0,0 +1,190 @@
+"""
+Module: warmup
+
+Warm the caches of a process before it serves its first request.
+
+A fresh worker pays for everything the read path builds lazily: the database connections
+(and their PRAGMAs, see ``hotels.pragmas``), the URL resolver, the in-memory catalog and its
+city search index (see ``hotels.catalog``), the rendered and compressed JSON bodies, and the
+compiled templates. Without a warm-up the first requests after a deploy or a worker recycle
+pay it, which shows as p99 spikes. ``warm_up()`` is called when ``hotel_project/wsgi.py`` and
+``asgi.py`` load the application, and runs these steps in order:
+    - connections: Open a connection per database alias, for the thread that runs the
+      warm-up (skipped with ``connect=False``).
+    - routes: Resolve the URL of every page and read API endpoint.
+    - catalog: Load the catalog snapshot and build the city search index.
+    - templates: Compile the templates of the pages.
+    - bodies: Render the city list and the hotel lists of the most requested cities, with
+      their compressed variants at the strongest settings (requests use fast settings,
+      see ``hotels.renderers``).
+
+The steps stop when the time budget is spent, so a large catalog never delays the start by
+more than the budget (plus the step that was running). A step that fails is logged and
+skipped: a worker that cannot warm up still starts, and pays the costs on first use.
+
+Prefork servers: with gunicorn's ``preload_app`` (see ``gunicorn.conf.py``) the application,
+and so the warm-up, is loaded once in the master process, and the workers inherit the warm
+catalog and bodies through copy-on-write memory. The master freezes the garbage collector
+before forking so that collections in the workers do not write to (and copy) the shared
+pages. It also closes its connections before forking, since a SQLite connection must not be
+carried into another process. Connections are per thread: the request threads of the
+threaded worker each connect on their first request, and then keep the connection
+(``CONN_MAX_AGE``). uvicorn starts its workers without
+forking, so each of them warms up on its own. It loads the application inside its event
+loop, where Django refuses database queries, so ``asgi.py`` warms up in a thread of its own
+that never serves a request: that warm-up leaves out the connections step, since the
+connections of the serving threads cannot be opened from another thread, and closes the
+connections the catalog step opened once it is done.
+
+Settings:
+    - HOTELS_WARMUP: Whether to warm up when the application is loaded (default True).
+    - HOTELS_WARMUP_SECONDS: Time budget of the warm-up (default 5).
+    - HOTELS_WARMUP_CITIES: City codes whose hotel lists are rendered. Defaults to the
+      HOTELS_WARMUP_CITY_COUNT (default 50) cities with the most hotels.
+
+Functions:
+    - warm_up: Run the warm-up steps within a time budget.
+    - open_connections: Open a connection per database alias.
+    - close_connections: Close the connections of the current thread.
+"""
+
+import functools
+import logging
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.template.loader import get_template
+from django.urls import resolve, reverse
+
+from . import catalog
+from .renderers import COMPRESS_MIN_SIZE, ENCODINGS, CachedBody
+
+logger = logging.getLogger(__name__)
+
+WARMUP_SECONDS = 5
+WARMUP_CITY_COUNT = 50
+
+# URL names resolved by the routes step, with the arguments of their URL.
+ROUTES = (
+    ('city_list', ()),
+    ('hotel_list', ()),
+    ('hotel_in_city', ()),
+    ('api_city_list', ()),
+    ('api_city_search', ()),
+    ('api_city_stats', ()),
+    ('api_changes', ()),
+    ('api_hotel_batch', ()),
+    ('api_hotel_export', ()),
+    ('api_hotel_search', ()),
+    ('api_hotel_list', ('AMS',)),
+)
+TEMPLATES = ('hotels/city_list.html', 'hotels/hotel_list.html')
+
+
+def open_connections():
+    """
+    Open a connection per database alias, so the first request does not connect.
+    """
+    for connection in connections.all():
+        connection.ensure_connection()
+
+
+def close_connections():
+    """
+    Close the connections of the current thread, e.g. in a prefork master before it forks.
+    """
+    for connection in connections.all():
+        connection.close()
+
+
+def warm_routes():
+    for name, args in ROUTES:
+        resolve(reverse(name, args=args))
+
+
+def warm_catalog():
+    # The search index is built on first use; building it here keeps it out of the first search.
+    catalog.get_catalog().cities.search_index
+
+
+def warm_templates():
+    for name in TEMPLATES:
+        get_template(name)
+
+
+def warmup_cities(snapshot):
+    """
+    Return the codes of the cities whose hotel lists are rendered by the warm-up.
+    """
+    codes = getattr(settings, 'HOTELS_WARMUP_CITIES', None)
+    if codes is not None:
+        return [code for code in codes if code in snapshot.cities.row_by_code]
+    count = getattr(settings, 'HOTELS_WARMUP_CITY_COUNT', WARMUP_CITY_COUNT)
+    hotels = snapshot.hotels
+    rows = sorted(range(len(snapshot.cities)), key=lambda row: hotels.ends[row] - hotels.starts[row], reverse=True)
+    return [snapshot.cities.codes[row] for row in rows[:count]]
+
+
+def warm_bodies(deadline):
+    """
+    Render the city list and the hotel lists of the warm-up cities until the deadline.
+
+    Returns:
+        bool: False if the deadline stopped the rendering.
+    """
+    snapshot = catalog.get_catalog()
+    bodies = [snapshot.cities_json]
+    bodies.extend(lambda code=code: snapshot.hotels_json(code) for code in warmup_cities(snapshot))
+    for render in bodies:
+        if time.monotonic() > deadline:
+            return False
+        body = render()
+        if isinstance(body, CachedBody) and len(body) >= COMPRESS_MIN_SIZE:
+            for encoding in ENCODINGS:
+                body.variant(encoding, best=True)
+    return True
+
+
+STEPS = (
+    ('connections', open_connections),
+    ('routes', warm_routes),
+    ('catalog', warm_catalog),
+    ('templates', warm_templates),
+)
+
+
+def warm_up(seconds=None, connect=True):
+    """
+    Warm the caches of this process within a time budget.
+
+    Args:
+        seconds (float): The time budget. Defaults to HOTELS_WARMUP_SECONDS.
+        connect (bool): Whether to open the connections of the current thread; pass False
+            when the current thread will not serve requests.
+
+    Returns:
+        dict: Maps each step to its duration in seconds, or None if it was skipped or failed.
+    """
+    if seconds is None:
+        seconds = getattr(settings, 'HOTELS_WARMUP_SECONDS', WARMUP_SECONDS)
+    started = time.monotonic()
+    deadline = started + seconds
+    durations = {}
+    steps = STEPS if connect else [(name, step) for name, step in STEPS if name != 'connections']
+    for name, step in (*steps, ('bodies', functools.partial(warm_bodies, deadline))):
+        durations[name] = None
+        if time.monotonic() > deadline:
+            logger.warning('Warm-up budget of %.1fs spent, skipping %s', seconds, name)
+            continue
+        step_started = time.monotonic()
+        try:
+            finished = step()
+        except Exception:
+            logger.exception('Warm-up step %s failed', name)
+            continue
+        durations[name] = time.monotonic() - step_started
+        if finished is False:
+            logger.warning('Warm-up budget of %.1fs spent during %s', seconds, name)
+    logger.info('Warmed up in %.2fs: %s', time.monotonic() - started, durations)
+    return durations